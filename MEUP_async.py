@@ -0,0 +1,596 @@
+import sys
+import time
+import random
+import asyncio
+from lunar_packet import LunarPacket, LunarBatchPacket, LunarParityPacket, LunarCompactPacket, BATCH_PACKET_TYPE, \
+    PARITY_PACKET_TYPE, COMPACT_PACKET_TYPE, READING_BATTERY, READING_SYSTEM_TEMP, packet_type_of, pack_system_status, unpack_system_status
+from env_variables import *
+from sequence_window import DuplicateFilter, SEQUENCE_MODULO, seq_next
+from fec import FecDecoder
+from telemetry_archive import TelemetryArchive
+from meup_commands import COMMANDS, encode_command, parse_command, encode_ack, parse_ack, encode_done, parse_done
+from rover_executor import CommandQueue, DONE, INTERRUPTED, CANCELLED
+from rtt_estimator import RttTable
+import channel_simulation as channel
+from meup_log import get_logger, ORANGE, PURPLE, YELLOW, BLUE
+from meup_metrics import metrics
+import meup_metrics
+import meup_clock
+
+server_log = get_logger("SERVER")
+client_log = get_logger("CLIENT")
+rover_log = get_logger("ROVER")
+scan_log = get_logger("SCANNER")
+
+MULTI_READING_PARSERS = {BATCH_PACKET_TYPE: LunarBatchPacket.parse, COMPACT_PACKET_TYPE: LunarCompactPacket.parse}
+
+
+class MEUP_async_server(asyncio.DatagramProtocol):
+    """asyncio version of MEUP_server: one protocol per endpoint, all endpoints on one event loop.
+
+        > role="data"     -> receive_packet (telemetry from lunar)
+        > role="commands" -> listen_for_commands (movement from earth)
+        > role="scans"    -> listen_for_scans (P2P discovery and trades)
+    """
+
+    def __init__(self, role="data", archive=None):
+        self.role = role
+        self.archive = archive  # optional TelemetryArchive for received readings
+        self.transport = None
+        self.received_packets = DuplicateFilter()  # per-stream sliding windows of seen packet IDs
+        self.fec = FecDecoder()  # rebuilds lost telemetry from parity packets
+        self.commands = CommandQueue()  # ACKed commands, released in sequence order
+        self.commands_ready = asyncio.Event()
+        self.movement = None  # task of the command being executed (STOP cancels it)
+        self.command_task = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        ip, port = transport.get_extra_info("sockname")[:2]
+        if self.role == "commands":
+            # commands run one after another without blocking the loop
+            self.command_task = asyncio.get_running_loop().create_task(self.run_commands())
+            server_log.info("[ROVER] Command server ready on UDP port %s", port, extra=PURPLE)
+        elif self.role == "scans":
+            server_log.info("[ROVER] Scanning server ready on UDP port %s:%s", ip, port, extra=YELLOW)
+        else:
+            server_log.info("[SERVER] Listening for incoming UDP packets...\n\n")
+
+    def connection_lost(self, exc):
+        if self.command_task:
+            self.command_task.cancel()
+
+    def datagram_received(self, data, addr):
+        try:
+            if self.role == "commands":
+                self.handle_command(data, addr)
+            elif self.role == "scans":
+                self.handle_scan(data, addr)
+            else:
+                self.handle_packet(data, addr)
+        except Exception as e:
+            server_log.error("[ERROR] Failed to receive packet: %s", e)
+
+    def close(self):
+        """Close UDP transport."""
+
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+
+    def return_ack(self, packet_id, address):
+        """Return ACK for LunarPacket w/ random loss."""
+
+        ack_message = str(packet_id).encode()
+        try:
+            not_dropped = channel.send_w_delay_loss_async(self.transport, ack_message, address, packet_id)
+        except channel.LinkBackpressure:
+            server_log.debug("[SERVER] ID=%s *ACK BACKPRESSURE* -> not sent", packet_id)
+            return
+        metrics.inc("acks_sent")
+        if not_dropped:
+            server_log.debug("[SERVER] ID=%s *ACK Sent*", packet_id)
+        else:
+            server_log.debug("[SERVER] ID=%s *ACK LOST*", packet_id)
+
+    def parse_system_status(self, data):
+        """Extract battery and system temperature from a LunarPacket."""
+
+        return unpack_system_status(data)
+
+    def decode_timestamp(self, timestamp):
+        """Convert Unix timestamp to human-readable format."""
+
+        return time.strftime('%Y-%m-%d %H:%M:%S GMT', time.gmtime(timestamp))
+
+    def print_reading(self, packet_id, packet_type, data_value, timestamp):
+        """Print one decoded telemetry reading."""
+
+        timestamp_str = self.decode_timestamp(timestamp)
+        # PRINT ORANGE
+        if packet_type == 0:
+            server_log.info("\n[SERVER] ID=%s *RECVD* \nTemperature: %.2f°C., Timestamp: %s", packet_id, data_value, timestamp_str, extra=ORANGE)
+        elif packet_type == 1:
+            battery, sys_temp = self.parse_system_status(data_value)
+            server_log.info("\n[SERVER] ID=%s *RECVD* \nSystem Status - Battery: %s%%, System Temp: %.2f°C., Timestamp: %s", packet_id, battery, sys_temp, timestamp_str, extra=ORANGE)
+        # system status sent as separate readings (compact packets)
+        elif packet_type == READING_BATTERY:
+            server_log.info("\n[SERVER] ID=%s *RECVD* \nBattery: %.2f%%, Timestamp: %s", packet_id, data_value, timestamp_str, extra=ORANGE)
+        elif packet_type == READING_SYSTEM_TEMP:
+            server_log.info("\n[SERVER] ID=%s *RECVD* \nSystem Temp: %.2f°C., Timestamp: %s", packet_id, data_value, timestamp_str, extra=ORANGE)
+
+    # lunar to earth (telemetry)
+    def handle_packet(self, data, address, recovered=False):
+        """Same behaviour as MEUP_server.handle_frame for one datagram."""
+
+        packet_type = packet_type_of(data)
+        if packet_type == PARITY_PACKET_TYPE:
+            parity = LunarParityPacket.parse(data)
+            if parity is None:
+                server_log.debug("[SERVER] *PARITY INVALID* -> skipping")
+                return
+            for packet_id, frame in self.fec.add_parity((address, parity["src_port"]), parity):
+                self.handle_packet(frame, address, recovered=True)
+            return
+        # batch and compact packets carry many readings under one packet ID
+        is_batch = packet_type in MULTI_READING_PARSERS
+        parsed_packet = MULTI_READING_PARSERS[packet_type](data) if is_batch else LunarPacket.parse(data)
+        if parsed_packet is None:
+            server_log.debug("[SERVER] *CHECKSUM INVALID* -> skipping")
+            metrics.inc("fec_failed" if recovered else "packets_corrupted")
+            return
+        packet_id = parsed_packet["packet_id"]
+        packet_type = parsed_packet["packet_type"]
+        stream = (address, parsed_packet["src_port"])
+        if recovered:
+            server_log.debug("[SERVER] ID=%s *REBUILT FROM PARITY*", packet_id)
+            metrics.inc("fec_recovered")
+        # stream = sender address + rover port, IDs compared with serial arithmetic
+        new = self.received_packets.is_new(stream, packet_id)
+        if new is None:
+            # behind the duplicate window: a straggler, or a restarted rover not recognised yet -> no ACK
+            server_log.debug("[SERVER] ID=%s *BEHIND WINDOW* -> IGNORED", packet_id)
+            metrics.inc("packets_stale")
+            return
+        if new:
+            metrics.inc("packets_received")
+            if is_batch:
+                readings = parsed_packet["readings"]
+            else:
+                readings = [(packet_type, parsed_packet["timestamp"], parsed_packet["data"])]
+            for reading_type, timestamp, data_value in readings:
+                self.print_reading(packet_id, reading_type, data_value, timestamp)
+                if self.archive is not None:
+                    self.archive.append(timestamp, reading_type, data_value, packet_id, parsed_packet["src_port"])
+        else:
+            server_log.debug("\n[SERVER] ID=%s *DUPLICATE* -> IGNORED", packet_id)
+            metrics.inc("packets_duplicate")
+        # return ACK back to client regardless of wether it was already received or not
+        self.return_ack(packet_id, address)
+        if not recovered:
+            for _, frame in self.fec.add_frame(stream, packet_id, data):
+                self.handle_packet(frame, address, recovered=True)
+
+    # commands
+    def handle_command(self, data, addr):
+        """ACK a command from Earth on receipt and queue it for execution (STOP jumps the queue)."""
+
+        if addr[0] != EARTH_IP:
+            return
+        seq, cmd = parse_command(data)
+        if cmd is None:
+            return
+        duplicate = seq is not None and self.received_packets.seen(addr, seq)
+        if duplicate is None:
+            # behind the duplicate window -> no ACK (the mark counts it towards a restarted Earth's run)
+            self.received_packets.is_new(addr, seq)
+            rover_log.debug("[ROVER] %s (seq %s) behind the window -> ignored", cmd, seq, extra=PURPLE)
+            return
+        if not duplicate and cmd != "STOP" and not self.commands.has_room():
+            # queue full -> no ACK, Earth retransmits once commands have drained
+            rover_log.info("[ROVER] Command queue full -> %s (seq %s) not accepted", cmd, seq, extra=PURPLE)
+            return
+        # a duplicate is always ACKed again (it was queued already, only its ACK got lost)
+        try:
+            channel.send_w_delay_loss_async(self.transport, encode_ack(seq, cmd), addr, 999 if seq is None else seq)
+            rover_log.debug("[ROVER] ACK Sent for %s (seq %s)", cmd, seq, extra=PURPLE)
+        except channel.LinkBackpressure:
+            rover_log.debug("[ROVER] ACK for %s *BACKPRESSURE* -> not sent", cmd, extra=PURPLE)
+        if duplicate or (seq is not None and not self.received_packets.is_new(addr, seq)):
+            return  # retransmission of a command already queued
+        rover_log.info("[ROVER] Received command: %s", cmd, extra=PURPLE)
+        for cancelled in self.commands.put(seq, cmd, addr) or ():
+            self.report_command(*cancelled[:2], CANCELLED, cancelled[2])
+        if cmd == "STOP" and self.movement is not None:
+            self.movement.cancel()
+        self.commands_ready.set()
+
+    def report_command(self, seq, command, status, address):
+        """Completion status of a command back to Earth ("DONE <seq> <command> <status>")."""
+        rover_log.info("[ROVER] %s (seq %s) -> %s", command, seq, status, extra=PURPLE)
+        try:
+            channel.send_w_delay_loss_async(self.transport, encode_done(seq, command, status), address,
+                                            999 if seq is None else seq)
+        except channel.LinkBackpressure:
+            rover_log.debug("[ROVER] DONE for %s *BACKPRESSURE* -> not sent", command, extra=PURPLE)
+
+    async def execute_movement(self, command):
+        """Simulate executing movement commands (loop timer instead of sleep)."""
+
+        # PRINT PURPLE
+        rover_log.info("[ROVER] Executing Command: %s", command, extra=PURPLE)
+        if command in ("FWD", "FORWARD"):
+            rover_log.info("[ROVER] Moving forward...", extra=PURPLE)
+            await asyncio.sleep(2)
+        elif command == "BACK":
+            rover_log.info("[ROVER] Moving backward...", extra=PURPLE)
+            await asyncio.sleep(2)
+        elif command == "LEFT":
+            rover_log.info("[ROVER] Turning left...", extra=PURPLE)
+            await asyncio.sleep(1)
+        elif command == "RIGHT":
+            rover_log.info("[ROVER] Turning right...", extra=PURPLE)
+            await asyncio.sleep(1)
+        elif command == "STOP":
+            rover_log.info("[ROVER] Stopping...", extra=PURPLE)
+
+    async def run_commands(self):
+        """Execute queued commands in order (already ACKed by handle_command) and report each one."""
+
+        while True:
+            entry, wait = self.commands.get()
+            if entry is None:
+                self.commands_ready.clear()
+                try:
+                    await asyncio.wait_for(self.commands_ready.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            seq, cmd, addr = entry
+            self.movement = asyncio.ensure_future(self.execute_movement(cmd))
+            await asyncio.wait([self.movement])
+            movement, self.movement = self.movement, None
+            if movement.cancelled():
+                self.report_command(seq, cmd, INTERRUPTED, addr)
+            elif movement.exception() is not None:
+                rover_log.error("[ROVER] Command error: %s", movement.exception(), extra=PURPLE)
+            else:
+                self.report_command(seq, cmd, DONE, addr)
+
+    # scanning
+    def handle_scan(self, data, addr):
+        """Same behaviour as MEUP_server.listen_for_scans for one datagram."""
+
+        message = data.decode('utf-8', errors='ignore')
+        scan_log.debug("[SERVER] Received raw data: %s from %s", data, addr, extra=YELLOW)
+        if message == "server_check":
+            self.transport.sendto(b"server_active", addr)
+            scan_log.debug("[SERVER] Responded to scan from %s", addr, extra=YELLOW)
+        elif message == "Would you like to share data? (y/n)":
+            if random.random() < 0.7:  # 70% chance to accept
+                self.transport.sendto(b"y", addr)
+                scan_log.info("[SERVER] Accepted trade proposal from %s", addr)
+            else:
+                self.transport.sendto(b"n", addr)
+                scan_log.info("[SERVER] Declined trade proposal from %s", addr)
+        elif len(data) == 23:  # Size of LunarPacket
+            packet_data = LunarPacket.parse(data)
+            if packet_data and packet_data["packet_type"] == 2:  # Type 2 is for traded data
+                scan_log.info("[SERVER] Received trade data from %s: %s", addr, packet_data['data'])
+                self.transport.sendto(str(packet_data["packet_id"]).encode(), addr)
+                scan_log.debug("[SERVER] Sent ACK for packet ID %s", packet_data['packet_id'])
+
+
+class MEUP_async_client(asyncio.DatagramProtocol):
+    """asyncio version of MEUP_client: retransmits are loop timers and ACKs resolve futures.
+
+        > reduced scope: single-reading telemetry, commands, scans and trades only; the batch / compact packets,
+          FEC parity, peer directory and CIDR scan targets of MEUP_client are not implemented here
+    """
+
+    def __init__(self, client_port=5000, server_ip="127.0.0.1", server_port=5001):
+        self.client_port = client_port
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.transport = None
+        self.acknowledged_packets = set()
+        self.in_flight = {}  # packet_id -> future resolved by its ACK
+        self.replies = {}  # address -> future resolved by the next datagram from it
+        self.command_slots = None  # COMMAND_WINDOW semaphore, created on the loop by send_command
+        self.sequence = random.randrange(SEQUENCE_MODULO)  # same packet ID scheme as MEUP_client
+        self.rtt = RttTable()  # same adaptive timeouts as MEUP_client
+
+    def connection_made(self, transport):
+        self.transport = transport
+        ip, port = transport.get_extra_info("sockname")[:2]
+        client_log.info("[CLIENT] Socket initialized on %s:%s", ip, port)
+
+    def next_packet_id(self):
+        """Next packet ID (serial number, wraps at 2^16)."""
+
+        packet_id = self.sequence
+        self.sequence = seq_next(packet_id)
+        return packet_id
+
+    def datagram_received(self, data, addr):
+        # scan / trade replies are matched by source address
+        waiter = self.replies.pop(addr, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(data)
+            return
+        command_ack = parse_ack(data)
+        if command_ack is not None:
+            # "ACK <seq> <command>" -> command IDs come from the same sequence as packet IDs
+            future = self.in_flight.get(command_ack[0])
+            if future is not None and not future.done():
+                future.set_result(True)
+                client_log.info("[ACK] Received: ACK %s %s", *command_ack, extra=PURPLE)
+            return
+        command_done = parse_done(data)
+        if command_done is not None:
+            client_log.info("[ROVER DONE] %s (seq %s) -> %s", command_done[1], command_done[0], command_done[2],
+                            extra=PURPLE)
+            return
+        try:
+            ack_id = int(data.decode().strip())
+        except (UnicodeDecodeError, ValueError):
+            client_log.debug("[CLIENT] *CORRUPTED ACK RECVD*")
+            metrics.inc("acks_corrupted")
+            return
+        self.acknowledged_packets.add(ack_id)
+        future = self.in_flight.get(ack_id)
+        if future is not None and not future.done():
+            future.set_result(True)
+            metrics.inc("acks_received")
+            client_log.debug("[CLIENT] ID=%s *ACK RECVD*\n", ack_id)
+
+    def close(self):
+        """Close the UDP transport."""
+
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+            client_log.info("[CLIENT] Socket closed")
+
+    def send_packet(self, packet, address):
+        """Send a LunarPacket through the simulated channel, returns retry_after if the link refused it."""
+
+        try:
+            not_lost = channel.send_w_delay_loss_async(self.transport, packet.build(), address, packet.packet_id)
+        except channel.LinkBackpressure as e:
+            # not sent -> send_reliable waits retry_after and tries again
+            client_log.debug("[CLIENT] ID=%s *BACKPRESSURE* -> retry in %.2fs", packet.packet_id, e.retry_after)
+            return e.retry_after
+        metrics.inc("packets_sent")
+        if not_lost:
+            client_log.debug("[CLIENT] ID=%s *SENT*", packet.packet_id)
+        else:
+            client_log.debug("[CLIENT] Packet ID=%s *LOST*", packet.packet_id)
+
+    async def send_reliable(self, packet_id, address, slots, transmit):
+        """Call transmit() inside the window, again on a loop timer until packet_id is ACKed.
+
+            > transmit() returns None once sent, or the seconds to wait if the link refused it (backpressure)
+        """
+
+        loop = asyncio.get_running_loop()
+        async with slots:
+            future = loop.create_future()
+            self.in_flight[packet_id] = future
+            try:
+                timeout = self.rtt.rto(address)
+                attempt = 0
+                while attempt < MAX_RETRIES:
+                    retry_after = transmit()
+                    if retry_after is None:
+                        attempt += 1
+                        sent_at = meup_clock.monotonic()
+                        if attempt > 1:
+                            client_log.debug("[CLIENT] ID=%s *NO ACK* -> resent, ATTEMPT=%s\n", packet_id, attempt - 1)
+                            metrics.inc("retransmits")
+                    try:
+                        # link full -> nothing was sent: wait for a free slot without using up an attempt
+                        result = await asyncio.wait_for(asyncio.shield(future),
+                                                        timeout if retry_after is None else retry_after)
+                    except asyncio.TimeoutError:
+                        if retry_after is not None:
+                            continue
+                        metrics.inc("ack_timeouts")
+                        # back the destination off once per timeout, not once per packet of the same burst
+                        rto = self.rtt.rto(address)
+                        if timeout >= rto:
+                            rto = self.rtt.backoff(address)
+                        timeout = rto
+                        continue
+                    if attempt == 1:
+                        # Karn's rule: an ACK after a resend could belong to either copy -> no sample
+                        rtt = meup_clock.monotonic() - sent_at
+                        self.rtt.sample(address, rtt)
+                        metrics.observe("rtt", rtt, f"{address[0]}:{address[1]}")
+                    return result
+                client_log.info("[CLIENT] ID=%s *MAX RETRIES REACHED* - ABORTING\n", packet_id)
+                metrics.inc("packets_aborted")
+                return False
+            finally:
+                self.in_flight.pop(packet_id, None)
+
+    async def send_window(self, packets, address):
+        """Selective-repeat window: up to WINDOW_SIZE packets in flight, returns ACKed IDs."""
+
+        slots = asyncio.Semaphore(WINDOW_SIZE)
+        results = await asyncio.gather(*(self.send_reliable(p.packet_id, address, slots,
+                                                            lambda p=p: self.send_packet(p, address))
+                                         for p in packets))
+        return {p.packet_id for p, ok in zip(packets, results) if ok}
+
+    def build_temperature(self, packet_id):
+        """Build temperature data packet."""
+
+        temp_data = round(random.uniform(-150, 130), 2)
+        return LunarPacket(src_port=self.client_port, dest_port=self.server_port,
+                           packet_id=packet_id, packet_type=0, data=temp_data)
+
+    def build_system_status(self, packet_id):
+        """Package lunar rover status data (battery percentage, system temperature)."""
+
+        battery = round(random.uniform(10, 100), 2)
+        sys_temp = round(random.uniform(-40, 80), 2)
+        return LunarPacket(src_port=self.client_port, dest_port=self.server_port,
+                           packet_id=packet_id, packet_type=1, data=pack_system_status(battery, sys_temp))
+
+    async def send_data(self):
+        """Continuously send temperature and system status packets."""
+
+        address = (self.server_ip, self.server_port)
+        while True:
+            packets = [self.build_temperature(self.next_packet_id()),
+                       self.build_system_status(self.next_packet_id())]
+            await self.send_window(packets, address)
+            await asyncio.sleep(DATA_DELAY)
+
+    async def request(self, message, address, timeout=1):
+        """Send a raw datagram and wait for the reply from that address."""
+
+        future = asyncio.get_running_loop().create_future()
+        self.replies[address] = future
+        self.transport.sendto(message, address)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if self.replies.get(address) is future:
+                del self.replies[address]
+
+    async def send_command(self, command):
+        """Send one sequence-numbered command, True once the rover ACKs it (up to COMMAND_WINDOW in flight)."""
+
+        if self.command_slots is None:
+            self.command_slots = asyncio.Semaphore(COMMAND_WINDOW)
+        seq = self.next_packet_id()
+        address = (self.server_ip, self.server_port)
+
+        def transmit():
+            try:
+                channel.send_w_delay_loss_async(self.transport, encode_command(seq, command), address, seq)
+            except channel.LinkBackpressure as e:
+                client_log.error("[ERROR] Command delayed: %s", e, extra=PURPLE)
+                return e.retry_after
+            client_log.info("[EARTH] Sent %s (seq %s)", command, seq, extra=PURPLE)
+
+        acked = await self.send_reliable(seq, address, self.command_slots, transmit)
+        if not acked:
+            client_log.info("[EARTH] No ACK for %s (seq %s) - command may have been lost", command, seq, extra=PURPLE)
+        return acked
+
+    async def send_commands(self, prompt=input):
+        """Send commands to Moon; input() runs in an executor so the loop keeps serving.
+
+            > several commands on one line are queued as a plan and pipelined, ACKs are logged as they arrive
+        """
+
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(2)
+        client_log.info("[EARTH] Command client ready to send to %s:%s", self.server_ip, self.server_port, extra=PURPLE)
+        pending = set()
+        while True:
+            line = (await loop.run_in_executor(None, prompt, "\033[95mCommand (FWD/BACK/LEFT/RIGHT/STOP, several = plan): \033[0m")).upper()
+            for cmd in line.split():
+                if cmd in COMMANDS:
+                    task = asyncio.ensure_future(self.send_command(cmd))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+
+    async def scan_ips(self, ip_list, port_list):
+        """Scan ip_list for trade partners; every probe is in flight at once."""
+
+        targets = [(ip, port) for ip in ip_list for port in port_list]
+        replies = await asyncio.gather(*(self.request(b"server_check", t) for t in targets))
+        valid_servers = []
+        for target, reply in zip(targets, replies):
+            if reply is None:
+                scan_log.debug("[SCANNER] %s:%s did not respond.", target[0], target[1], extra=YELLOW)
+            else:
+                scan_log.debug("[SCANNER] %s:%s responded.", target[0], target[1], extra=YELLOW)
+                valid_servers.append(target)
+        scan_log.info("[SCANNER] These are all possible Servers: %s", valid_servers, extra=YELLOW)
+
+        question = "Would you like to share data? (y/n)".encode('utf-8')
+        answers = await asyncio.gather(*(self.request(question, t) for t in valid_servers))
+        traders = []
+        for (ip, port), answer in zip(valid_servers, answers):
+            if answer is None:
+                scan_log.debug("[SCANNER] %s:%s did not respond.", ip, port, extra=BLUE)
+            elif answer == b"y":
+                scan_log.info("[SCANNER] %s:%s accepted trade.", ip, port, extra=BLUE)
+                traders.append((ip, port))
+            elif answer == b"n":
+                scan_log.info("[SCANNER] %s:%s declined trade.", ip, port, extra=BLUE)
+
+        packets = []
+        for ip, port in traders:
+            packet = LunarPacket(src_port=self.client_port, dest_port=port,
+                                 packet_id=self.next_packet_id(), packet_type=2,
+                                 data=round(random.uniform(0, 100), 2))
+            scan_log.info("[TRADER] Sending data packet to %s:%s", ip, port, extra=BLUE)
+            packets.append(self.send_window([packet], (ip, port)))
+        await asyncio.gather(*packets)
+        await asyncio.sleep(SCANNING_DELAY)
+
+
+async def open_server(ip, port, role, archive=None):
+    """Bind a MEUP_async_server endpoint on the running loop."""
+
+    loop = asyncio.get_running_loop()
+    _, protocol = await loop.create_datagram_endpoint(lambda: MEUP_async_server(role, archive), local_addr=(ip, port))
+    return protocol
+
+
+async def open_client(client_ip, client_port, server_ip, server_port):
+    """Bind a MEUP_async_client endpoint on the running loop."""
+
+    loop = asyncio.get_running_loop()
+    _, protocol = await loop.create_datagram_endpoint(
+        lambda: MEUP_async_client(client_port, server_ip, server_port), local_addr=(client_ip, client_port))
+    return protocol
+
+
+async def run_lunar():
+    """All lunar roles (telemetry, commands, scan send/receive) on one event loop."""
+
+    telemetry = await open_client(LUNAR_IP, LUNAR_SEND_PORT, EARTH_IP, EARTH_RECEIVE_PORT)
+    await open_server(LUNAR_IP, LUNAR_RECEIVE_PORT, "commands")
+    await open_server(LUNAR_IP, LUNAR_SR_PORT, "scans")
+    scanner = await open_client(LUNAR_IP, LUNAR_SS_PORT, LUNAR_IP, LUNAR_SR_PORT)
+
+    async def keep_scanning():
+        while True:
+            await scanner.scan_ips(ip_list=LUNAR_IP_RANGE, port_list=LUNAR_PORT_RANGE)
+
+    await asyncio.gather(telemetry.send_data(), keep_scanning())
+
+
+async def run_earth():
+    """Earth telemetry server and command client on one event loop."""
+
+    archive = None
+    if TELEMETRY_ARCHIVE_PATH:
+        try:
+            archive = TelemetryArchive(TELEMETRY_ARCHIVE_PATH)
+        except ImportError as e:
+            server_log.info("[EARTH] Telemetry archive disabled: %s", e)
+    await open_server(EARTH_IP, EARTH_RECEIVE_PORT, "data", archive)
+    commands = await open_client(EARTH_IP, EARTH_COMMAND_PORT, LUNAR_IP, LUNAR_RECEIVE_PORT)
+    await commands.send_commands()
+
+
+if __name__ == "__main__":
+    # python MEUP_async.py lunar | earth
+    node = sys.argv[1] if len(sys.argv) > 1 else "lunar"
+    if METRICS_ENABLED:
+        meup_metrics.start(EARTH_METRICS_PORT if node == "earth" else LUNAR_METRICS_PORT,
+                           METRICS_DUMP_PATH and METRICS_DUMP_PATH.format(node=node))
+    try:
+        asyncio.run(run_earth() if node == "earth" else run_lunar())
+    except KeyboardInterrupt:
+        pass
@@ -2,13 +2,28 @@ import socket
 import time
 import random
 import threading
-from lunar_packet import LunarPacket
+import ipaddress
+from lunar_packet import LunarPacket, LunarBatchPacket, LunarCompactPacket, pack_system_status, \
+    READING_TEMPERATURE, READING_SYSTEM_STATUS, READING_BATTERY, READING_SYSTEM_TEMP
 from env_variables import *
+from peer_directory import PeerDirectory
+from rtt_estimator import RttTable
+from fec import FecEncoder
+from receive_engine import tune_socket
+from meup_commands import CommandSender, COMMANDS
+from sequence_window import SEQUENCE_MODULO, seq_next
 import channel_simulation as channel
+import meup_clock
+from meup_log import get_logger, PURPLE, YELLOW, BLUE
+from meup_metrics import metrics
+
+log = get_logger("CLIENT")
+scan_log = get_logger("SCANNER")
 
 class MEUP_client:
-    def __init__(self, client_ip="127.0.0.1", client_port=5000, server_ip="127.0.0.1", server_port=5001):
-        """Initialize the Sender."""
+    def __init__(self, client_ip="127.0.0.1", client_port=5000, server_ip="127.0.0.1", server_port=5001, peer_directory=None,
+                 sock=None):
+        """Initialize the Sender (sock: an already bound socket, e.g. a MEUP_endpoint stream)."""
 
         self.client_ip = client_ip
         self.client_port = client_port
@@ -17,16 +32,26 @@ class MEUP_client:
         self.UDP_SOCKET = None
         self.acknowledged_packets = set()
         self.lock = threading.Lock()
+        self.peer_directory = peer_directory if peer_directory is not None else PeerDirectory()
+        self.rtt = RttTable()  # per-destination SRTT/RTTVAR -> retransmission timeouts
+        self.fec_group_size = FEC_GROUP_SIZE  # default redundancy, set_fec() overrides it per destination
+        self.fec_encoders = {}  # destination -> FecEncoder
+        # one 16-bit sequence for every packet this client sends; random start so a
+        # restarted rover does not collide with the server's window for its old run
+        self.sequence = random.randrange(SEQUENCE_MODULO)
 
         # receiving socket
         try:
-            self.UDP_SOCKET = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.UDP_SOCKET.bind((self.client_ip, self.client_port))
+            if sock is not None:
+                self.UDP_SOCKET = sock
+            else:
+                self.UDP_SOCKET = tune_socket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
+                self.UDP_SOCKET.bind((self.client_ip, self.client_port))
             # Set timeout for ACK reception
             self.UDP_SOCKET.settimeout(1)
-            print(f"[CLIENT] Socket initialized on {self.client_ip}:{self.client_port}")
+            log.info("[CLIENT] Socket initialized on %s:%s", self.client_ip, self.client_port)
         except Exception as e:
-            print(f"[CLIENT ERROR] Socket initialization failed: {e}")
+            log.error("[CLIENT ERROR] Socket initialization failed: %s", e)
             self.close()
             raise
             
@@ -36,175 +61,406 @@ class MEUP_client:
         if self.UDP_SOCKET:
             self.UDP_SOCKET.close()
             self.UDP_SOCKET = None
-            print("[CLIENT] Socket closed")
+            log.info("[CLIENT] Socket closed")
 
-    def send_packet(self, packet, address):
-        """Send a LunarPacket using UDP."""
+    def send_packet(self, packet, address, sock=None):
+        """Send a LunarPacket using UDP.
+
+            > returns None once sent, or the seconds to wait if the link pushed back (queue full) and it was not
+        """
 
         try:
             packet_data = packet.build()
-            not_lost = channel.send_w_delay_loss(self.UDP_SOCKET, packet_data, address, packet.packet_id)
+            not_lost = channel.send_w_delay_loss(sock or self.UDP_SOCKET, packet_data, address, packet.packet_id)
+            metrics.inc("packets_sent")
             if not_lost:
-                print(f"[CLIENT] ID={packet.packet_id} *SENT*")
+                log.debug("[CLIENT] ID=%s *SENT*", packet.packet_id)
             else:
-                print(f"[CLIENT] Packet ID={packet.packet_id} *LOST*")
+                log.debug("[CLIENT] Packet ID=%s *LOST*", packet.packet_id)
+        except channel.LinkBackpressure as e:
+            log.debug("[CLIENT] ID=%s *BACKPRESSURE* -> retry in %.2fs", packet.packet_id, e.retry_after)
+            return e.retry_after
         except socket.error as e:
-            print(f"[ERROR] Failed to send packet: {e}")
+            log.error("[ERROR] Failed to send packet: %s", e)
+        return None
 
 
-    def send_packet_with_ack(self, packet, address, attempt=1):
-        """Send a packet and wait for an ACK on the same connection."""
+    def set_fec(self, address, group_size):
+        """Send one parity packet per group_size packets to address (0 = no FEC on that stream)."""
 
-        if attempt > MAX_RETRIES:
-            print(f"[CLIENT] ID={packet.packet_id} *MAX RETRIES REACHED* - ABORTING\n")
-            return  
+        with self.lock:
+            self.fec_encoders[address] = FecEncoder(self.client_port, address[1], group_size)
 
-        self.send_packet(packet, address)
-        start_time = time.time()
-        # wait for ACK with 5 second timeout
-        while time.time() - start_time < 5:
-            try:
-                ack_data, _ = self.UDP_SOCKET.recvfrom(1024)
+
+    def send_parity(self, address, packet=None, sock=None):
+        """Feed a first transmission to the destination's FEC group (packet=None closes the group)."""
+
+        with self.lock:
+            encoder = self.fec_encoders.get(address)
+            if encoder is None:
+                encoder = self.fec_encoders[address] = FecEncoder(self.client_port, address[1], self.fec_group_size)
+            if encoder.group_size < 2:
+                return
+            parity = encoder.flush() if packet is None else encoder.add(packet.packet_id, packet.build())
+        if parity is None:
+            return
+        first_id = encoder.first_id
+        try:
+            # best effort: parity is never ACKed or resent
+            channel.send_w_delay_loss(sock or self.UDP_SOCKET, parity, address, first_id)
+            metrics.inc("fec_parity_sent")
+            log.debug("[CLIENT] PARITY for ID=%s.. *SENT*", first_id)
+        except channel.LinkBackpressure:
+            log.debug("[CLIENT] PARITY for ID=%s.. *BACKPRESSURE* -> skipped", first_id)
+        except socket.error as e:
+            log.error("[ERROR] Failed to send parity: %s", e)
+
+
+    def send_window(self, packets, address, sock=None):
+        """Send packets using a selective-repeat sliding window.
+
+            > Up to WINDOW_SIZE packets are in flight at once, each with its own retransmit timer
+            > Every ACK is matched against the whole window, so one loss only resends that packet
+            > Timers follow the destination's measured RTT and double on every timeout
+            > With FEC on, a parity packet follows every group of first transmissions (and the last partial group)
+            > sock: socket to send on and read ACKs from (default: the client's own)
+        """
+        sock = sock or self.UDP_SOCKET
+        pending = list(packets)
+        next_index = 0
+        in_flight = {}  # packet_id -> [packet, last send time, attempt, timeout, no resend before]
+        acked = set()
+        peer = f"{address[0]}:{address[1]}"
+
+        try:
+            while next_index < len(pending) or in_flight:
+                blocked_until = 0
+                # fill the window (until the link pushes back)
+                while next_index < len(pending) and len(in_flight) < WINDOW_SIZE:
+                    packet = pending[next_index]
+                    retry_after = self.send_packet(packet, address, sock)
+                    if retry_after is not None:
+                        blocked_until = meup_clock.monotonic() + retry_after
+                        break
+                    next_index += 1
+                    sent_at = meup_clock.monotonic()
+                    in_flight[packet.packet_id] = [packet, sent_at, 1, self.rtt.rto(address), sent_at]
+                    self.send_parity(address, packet, sock)
+                    if next_index == len(pending):
+                        self.send_parity(address, sock=sock)  # protect the tail too, no more packets to group it with
+
+                # resend (or give up on) packets whose timer expired
+                now = meup_clock.monotonic()
+                for packet_id, entry in list(in_flight.items()):
+                    packet, sent_at, attempt, timeout, not_before = entry
+                    if now - sent_at < timeout or now < not_before:
+                        continue
+                    if attempt >= MAX_RETRIES:
+                        log.info("[CLIENT] ID=%s *MAX RETRIES REACHED* - ABORTING\n", packet_id)
+                        metrics.inc("ack_timeouts")
+                        metrics.inc("packets_aborted")
+                        del in_flight[packet_id]
+                        continue
+                    retry_after = self.send_packet(packet, address, sock)
+                    if retry_after is not None:
+                        # not sent -> keep the attempt and its send time (RTT samples), retry once the link drains
+                        entry[4] = meup_clock.monotonic() + retry_after
+                        continue
+                    log.debug("[CLIENT] ID=%s *NO ACK* -> resend, ATTEMPT=%s\n", packet_id, attempt)
+                    metrics.inc("ack_timeouts")
+                    metrics.inc("retransmits")
+                    # back the destination off once per timeout, not once per packet of the same burst
+                    rto = self.rtt.rto(address)
+                    if timeout >= rto:
+                        rto = self.rtt.backoff(address)
+                    entry[1] = entry[4] = meup_clock.monotonic()
+                    entry[2] = attempt + 1
+                    entry[3] = rto
+
+                if not in_flight:
+                    if blocked_until:
+                        # nothing to wait for except the link draining
+                        time.sleep(max(0.01, blocked_until - meup_clock.monotonic()))
+                    continue
+
+                # wait for an ACK until the earliest timer expires
+                next_deadline = min(max(entry[1] + entry[3], entry[4]) for entry in in_flight.values())
+                if blocked_until:
+                    next_deadline = min(next_deadline, blocked_until)
+                sock.settimeout(max(0.01, next_deadline - meup_clock.monotonic()))
+                try:
+                    ack_data, _ = sock.recvfrom(1024)
+                except socket.timeout:
+                    continue
                 try:
                     ack_id = int(ack_data.decode().strip())
-                    with self.lock:
-                        self.acknowledged_packets.add(ack_id)
-                    if ack_id == packet.packet_id:
-                        print(f"[CLIENT] ID={packet.packet_id} *ACK RECVD*\n")
-                        return
-                except (UnicodeDecodeError, ValueError) as e:
-                    # handle receipt of corrupted ACKs, if resend and try to get ACK
-                    print(f"[CLIENT] ID={packet.packet_id} *CORRUPTED ACK RECVD*")
-            except socket.timeout:
-                pass
-        # Resend original packet if no ACK received 
-        print(f"[CLIENT] ID={packet.packet_id} *NO ACK* -> resend, ATTEMPT={attempt}\n")
-        self.send_packet_with_ack(packet, address, attempt+1)
+                except (UnicodeDecodeError, ValueError):
+                    # corrupted ACK -> packet stays in window and its timer resends it
+                    log.debug("[CLIENT] *CORRUPTED ACK RECVD*")
+                    metrics.inc("acks_corrupted")
+                    continue
+                with self.lock:
+                    self.acknowledged_packets.add(ack_id)
+                if ack_id in in_flight:
+                    packet, sent_at, attempt, _, _ = in_flight.pop(ack_id)
+                    acked.add(ack_id)
+                    metrics.inc("acks_received")
+                    if attempt == 1:
+                        # Karn's rule: an ACK after a resend could belong to either copy -> no sample
+                        rtt = meup_clock.monotonic() - sent_at
+                        self.rtt.sample(address, rtt)
+                        metrics.observe("rtt", rtt, peer)
+                    log.debug("[CLIENT] ID=%s *ACK RECVD*\n", ack_id)
+        finally:
+            if self.UDP_SOCKET:
+                sock.settimeout(1)
+        return acked
+
+
+    def send_packet_with_ack(self, packet, address, sock=None):
+        """Send a packet and wait for an ACK on the same connection."""
+
+        return packet.packet_id in self.send_window([packet], address, sock)
+
+
+    def next_packet_id(self):
+        """Next packet ID (serial number, wraps at 2^16)."""
+
+        with self.lock:
+            packet_id = self.sequence
+            self.sequence = seq_next(packet_id)
+        return packet_id
+
+
+    def sample_temperature(self):
+        """Read the temperature sensor (Celsius)."""
+
+        return round(random.uniform(-150, 130), 2)
+
+
+    def sample_status(self):
+        """Read battery percentage and system temperature (Celsius)."""
+
+        battery = round(random.uniform(10, 100), 2)
+        sys_temp = round(random.uniform(-40, 80), 2)
+        return battery, sys_temp
+
+
+    def sample_system_status(self):
+        """Read battery percentage and system temperature packed into one float (0.1 resolution)."""
+
+        return pack_system_status(*self.sample_status())
+
+
+    def build_temperature(self, packet_id):
+        """Build temperature data packet."""
+
+        return LunarPacket(src_port=self.client_port, dest_port=self.server_port,
+                           packet_id=packet_id, packet_type=0, data=self.sample_temperature())
+
+
+    def build_system_status(self, packet_id):
+        """Package lunar rover status data (battery percentage, system temperature, any errors)."""
+
+        return LunarPacket(src_port=self.client_port, dest_port=self.server_port,
+                           packet_id=packet_id, packet_type=1, data=self.sample_system_status())
+
+
+    def build_batches(self, readings):
+        """Pack (type, value, timestamp) readings into as few batch packets as PACKET_SIZE_LIMIT allows."""
+
+        batches = []
+        for reading_type, value, timestamp in readings:
+            if not batches or batches[-1].is_full(PACKET_SIZE_LIMIT) or not batches[-1].covers(timestamp):
+                batches.append(LunarBatchPacket(src_port=self.client_port, dest_port=self.server_port,
+                                                packet_id=self.next_packet_id(), timestamp=timestamp))
+            batches[-1].add_reading(reading_type, value, timestamp)
+        return batches
+
+
+    def build_compact(self, readings):
+        """Pack (type, value, timestamp) readings into delta-coded compact packets under PACKET_SIZE_LIMIT."""
+
+        packets = []
+        for reading_type, value, timestamp in readings:
+            if not packets or not packets[-1].add_reading(reading_type, value, timestamp, PACKET_SIZE_LIMIT):
+                packets.append(LunarCompactPacket(src_port=self.client_port, dest_port=self.server_port,
+                                                  packet_id=self.next_packet_id(), timestamp=timestamp))
+                packets[-1].add_reading(reading_type, value, timestamp, PACKET_SIZE_LIMIT)
+        return packets
 
 
     def send_temperature(self, packet_id, address):
         """Send temperature data packet."""
 
-        # temperature in Celsius
-        temp_data = round(random.uniform(-150, 130), 2)
-        packet = LunarPacket(src_port=self.client_port, dest_port=self.server_port, 
-                            packet_id=packet_id, packet_type=0, data=temp_data)
-        self.send_packet_with_ack(packet, address)
+        self.send_packet_with_ack(self.build_temperature(packet_id), address)
 
 
     def send_system_status(self, packet_id, address):
-        """Package lunar rover status data (battery percentage, system temperature, any errors)."""
-        
-        # Battery %, system temp in Celsius 
-        battery = round(random.uniform(10, 100), 2)
-        sys_temp = round(random.uniform(-40, 80), 2) 
-        status_data = battery + (sys_temp / 1000) 
-        packet = LunarPacket(src_port=self.client_port, dest_port=self.server_port, 
-                            packet_id=packet_id, packet_type=1, data=status_data)
-        self.send_packet_with_ack(packet, address)
+        """Send lunar rover status data packet."""
+
+        self.send_packet_with_ack(self.build_system_status(packet_id), address)
 
 
     def send_data(self):
         """Continuously send temperature and system status packets."""
 
-        temp_packet_id = 0
-        status_packet_id = 1000
+        if TELEMETRY_BATCHING:
+            return self.send_data_batched()
+
         address = (self.server_ip, self.server_port)
         while True:
-            self.send_temperature(temp_packet_id, address)
-            self.send_system_status(status_packet_id, address)
-            temp_packet_id += 1
-            status_packet_id += 1
-            if temp_packet_id > 1000:
-                temp_packet_id = 0
-            if status_packet_id > 2000:
-                status_packet_id = 1000
+            # both readings share one window -> one RTT per cycle instead of two
+            packets = [self.build_temperature(self.next_packet_id()),
+                       self.build_system_status(self.next_packet_id())]
+            self.send_window(packets, address)
             time.sleep(DATA_DELAY)
 
 
+    def send_data_batched(self):
+        """Sample readings every SAMPLE_DELAY and send them as batch (or compact) packets every DATA_DELAY."""
+
+        address = (self.server_ip, self.server_port)
+        readings = []
+        next_send = time.time() + DATA_DELAY
+        while True:
+            now = time.time()
+            readings.append((READING_TEMPERATURE, self.sample_temperature(), now))
+            if TELEMETRY_COMPACT:
+                # full precision: battery and system temperature as their own readings
+                battery, sys_temp = self.sample_status()
+                readings.append((READING_BATTERY, battery, now))
+                readings.append((READING_SYSTEM_TEMP, sys_temp, now))
+            else:
+                readings.append((READING_SYSTEM_STATUS, self.sample_system_status(), now))
+            if now + SAMPLE_DELAY >= next_send:
+                batches = self.build_compact(readings) if TELEMETRY_COMPACT else self.build_batches(readings)
+                readings = []
+                self.send_window(batches, address)
+                next_send = time.time() + DATA_DELAY
+            time.sleep(max(0, min(SAMPLE_DELAY, next_send - time.time())))
+
+
     def send_commands(self):
-        """Send commands to Moon via UDP."""
+        """Send commands to Moon via UDP (pipelined: typing several commands queues them as a plan)."""
 
         # Wait for Moon to initialize
         time.sleep(2)
-        print(f"\033[95m[EARTH] Command client ready to send to {self.server_ip}:{self.server_port}\033[0m")
+        sender = CommandSender(self)
+        log.info("[EARTH] Command client ready to send to %s:%s", self.server_ip, self.server_port, extra=PURPLE)
         while True:
-            cmd = input("\033[95mCommand (FWD/BACK/LEFT/RIGHT/STOP): \033[0m").upper()
-            if cmd in ["FWD", "BACK", "LEFT", "RIGHT", "STOP"]:
+            line = input("\033[95mCommand (FWD/BACK/LEFT/RIGHT/STOP, several = plan): \033[0m").upper()
+            plan = [cmd for cmd in line.split() if cmd in COMMANDS]
+            # ACKs are reported by the sender thread, the prompt comes straight back
+            sender.submit_plan(plan)
+
+
+    def expand_targets(self, ip_list, port_list):
+        """(ip, port) pairs to probe; entries of ip_list may be single IPs or CIDR ranges ("172.20.10.0/28")."""
+
+        targets = []
+        for entry in ip_list:
+            if "/" in entry:
+                hosts = [str(host) for host in ipaddress.ip_network(entry, strict=False).hosts()]
+            else:
+                hosts = [entry]
+            for ip in hosts:
+                for port in port_list:
+                    if (ip, port) not in targets:
+                        targets.append((ip, port))
+        return targets
+
+
+    def probe_all(self, targets, message, timeout=SCAN_TIMEOUT):
+        """Send message to every target at once and collect replies until the deadline.
+
+            > Replies are matched to targets by source address, anything else is ignored
+            > Returns {(ip, port): (reply bytes, rtt seconds)} for targets that answered
+        """
+        waiting = {}  # target -> send time
+        for target in targets:
+            try:
+                self.UDP_SOCKET.sendto(message, target)
+                waiting[target] = meup_clock.monotonic()
+            except OSError as e:
+                scan_log.error("[SCANNER] Error checking %s:%s: %s", target[0], target[1], e, extra=YELLOW)
+
+        replies = {}
+        deadline = meup_clock.monotonic() + timeout
+        try:
+            while waiting and meup_clock.monotonic() < deadline:
+                self.UDP_SOCKET.settimeout(max(0.01, deadline - meup_clock.monotonic()))
                 try:
-                    channel.send_w_delay_loss(self.UDP_SOCKET, cmd.encode(), (self.server_ip, self.server_port), 999)
-                    print(f"\033[95m[EARTH] Sent {cmd}\033[0m")
-                    # Wait for ACK
-                    self.UDP_SOCKET.settimeout(2)
-                    try:
-                        ack_data, _ = self.UDP_SOCKET.recvfrom(1024)
-                        ack_message = ack_data.decode()
-                        if ack_message.startswith("ACK"):
-                            print(f"\033[95m[ACK] Received: {ack_message}\033[0m")
-                        else:
-                            print(f"\033[95m[ERROR] Unexpected ACK format: {ack_message}\033[0m")
-                    except socket.timeout:
-                        print("\033[95m[EARTH] No ACK received - command may have been lost\033[0m")
-                except Exception as e:
-                    print(f"\033[95m[ERROR] Command failed: {e}\033[0m")
+                    data, addr = self.UDP_SOCKET.recvfrom(1024)
+                except socket.timeout:
+                    break
+                except ConnectionResetError:
+                    # ICMP port unreachable reported on some platforms -> keep listening
+                    continue
+                target = (addr[0], addr[1])
+                if target in waiting:
+                    replies[target] = (data, meup_clock.monotonic() - waiting.pop(target))
+        finally:
+            if self.UDP_SOCKET:
+                self.UDP_SOCKET.settimeout(1)
+        return replies
 
 
     def scan_ips(self, ip_list, port_list):
         """Scan ip_list for potential data trade partners
 
             > Does not use channel simulation as communication is local and reliable
+            > Every target is probed at once, so a scan takes about SCAN_TIMEOUT regardless of its size
         """
-        valid_servers = []
-        traders = []
-        
+        directory = self.peer_directory
+
         # Check list of ips for potential traders on set number of ports
-        for ip in ip_list:
-            # check necessary ports
-            for port in port_list:
-                time.sleep(1)
-                try:
-                    message = "server_check"
-                    data = message.encode('utf-8')
-                    self.UDP_SOCKET.sendto(data, (ip, port))
-                    try:
-                        data, _ = self.UDP_SOCKET.recvfrom(1024) 
-                        # PRINT YELLOW
-                        print(f"\033[93m[SCANNER] {ip}:{port} responded.\033[0m")
-                        valid_servers.append(ip)
-                    except socket.timeout:
-                        print(f"\033[93m[SCANNER] {ip}:{port} did not respond.\033[0m")
-                except Exception as e:
-                    print(f"\033[93m[SCANNER] Error checking {ip}:{port}: {e}\033[0m")
+        # -> only targets whose directory entry expired are probed again
+        targets = self.expand_targets(ip_list, port_list)
+        to_probe = directory.stale(targets)
+        replies = self.probe_all(to_probe, "server_check".encode('utf-8'))
+        for ip, port in to_probe:
+            if (ip, port) in replies:
+                # PRINT YELLOW
+                scan_log.debug("[SCANNER] %s:%s responded.", ip, port, extra=YELLOW)
+                directory.record_probe((ip, port), True, replies[(ip, port)][1])
+            else:
+                scan_log.debug("[SCANNER] %s:%s did not respond.", ip, port, extra=YELLOW)
+                directory.record_probe((ip, port), False)
+        valid_servers = [target for target in targets if directory.is_alive(target)]
 
         # Servers that are active
-        print(f"\033[93m[SCANNER] These are all possible Servers: {valid_servers}\033[0m")
+        scan_log.info("[SCANNER] These are all possible Servers: %s (%s cached)", valid_servers, len(targets) - len(to_probe), extra=YELLOW)
 
-        # Find out if servers want to trade
-        for ip in valid_servers:
-            message = "Would you like to share data? (y/n)"
-            data = message.encode('utf-8')
-            self.UDP_SOCKET.sendto(data, (ip, port))
-            try:
-                data, _ = self.UDP_SOCKET.recvfrom(1024) 
-                print(f"\033[34m[SCANNER] {ip}:{port} responded.\033[0m")
-                if data.decode() == "y":
-                    print(f"\033[34m[SCANNER] {ip}:{port} accepted trade.\033[0m")
-                    traders.append((ip, port))
-                elif data.decode() == "n":
-                    print(f"\033[34m[SCANNER] {ip}:{port} declined trade.\033[0m")
-                # print(f"[SCANNER] {ip} is a possible Server candidate (all ports responded).")
-            except socket.timeout:
-                print(f"\033[34m[SCANNER] {ip}:{port} did not respond.\033[0m")
+        # Find out if servers want to trade (cached answers are reused until they expire)
+        to_ask = directory.needs_trade_decision(valid_servers)
+        answers = self.probe_all(to_ask, "Would you like to share data? (y/n)".encode('utf-8'))
+        for ip, port in to_ask:
+            if (ip, port) not in answers:
+                scan_log.debug("[SCANNER] %s:%s did not respond.", ip, port, extra=BLUE)
+                directory.invalidate((ip, port))
+                continue
+            data, rtt = answers[(ip, port)]
+            scan_log.debug("[SCANNER] %s:%s responded.", ip, port, extra=BLUE)
+            if data == b"y":
+                scan_log.info("[SCANNER] %s:%s accepted trade.", ip, port, extra=BLUE)
+                directory.record_trade((ip, port), True)
+            elif data == b"n":
+                scan_log.info("[SCANNER] %s:%s declined trade.", ip, port, extra=BLUE)
+                directory.record_trade((ip, port), False)
+        traders = directory.traders(valid_servers)
 
         trade_threads = []
         # Create a new thread for trading with every trade partner
         for trader_ip, trader_port in traders:
             def trade_with_partner(partner_ip, partner_port):
+                # on a MEUP_endpoint every partner gets its own view of the socket -> threads never take each other's ACKs
+                partner_socket = None
+                if hasattr(self.UDP_SOCKET, "open_peer"):
+                    partner_socket = self.UDP_SOCKET.open_peer((partner_ip, partner_port))
                 try:
                     # Generate a packet ID for this trade
-                    trade_packet_id = 2000
-                    if trade_packet_id > 3000:
-                        trade_packet_id = 2000
+                    trade_packet_id = self.next_packet_id()
                     # Example data packet - random for illustrative purposes
                     trade_data = round(random.uniform(0, 100), 2)
                     
@@ -219,11 +475,17 @@ class MEUP_client:
                     
                     # Send the packet with acknowledgment
                     partner_address = (partner_ip, partner_port)
-                    print(f"\033[34m[TRADER] Sending data packet to {partner_ip}:{partner_port}\033[0m")
-                    self.send_packet_with_ack(packet, partner_address)
-                    print(f"\033[34m[TRADER] Completed data exchange with {partner_ip}:{partner_port}\033[0m")
+                    scan_log.info("[TRADER] Sending data packet to %s:%s", partner_ip, partner_port, extra=BLUE)
+                    if self.send_packet_with_ack(packet, partner_address, partner_socket):
+                        scan_log.info("[TRADER] Completed data exchange with %s:%s", partner_ip, partner_port, extra=BLUE)
+                    else:
+                        # partner went quiet -> re-probe it next cycle
+                        self.peer_directory.invalidate(partner_address)
                 except Exception as e:
-                    print(f"\033[34m[TRADER ERROR] Failed to trade with {partner_ip}:{partner_port}: {e}\033[0m")
+                    scan_log.error("[TRADER ERROR] Failed to trade with %s:%s: %s", partner_ip, partner_port, e, extra=BLUE)
+                finally:
+                    if partner_socket is not None:
+                        partner_socket.close()
             
             # Create and start a new thread for each trading IP
             thread = threading.Thread(
@@ -234,7 +496,7 @@ class MEUP_client:
             thread.daemon = True  # Make thread daemon so it exits when main program exits
             thread.start()
             trade_threads.append(thread)
-            print(f"\033[34m[SCANNER] Started trading thread with {trader_ip}:{trader_port}\033[0m")
+            scan_log.info("[SCANNER] Started trading thread with %s:%s", trader_ip, trader_port, extra=BLUE)
         
         # Wait for all trading threads to complete before next scan cycle
         for thread in trade_threads:
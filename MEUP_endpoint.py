@@ -0,0 +1,239 @@
+import queue
+import socket
+import struct
+import threading
+from lunar_packet import PACKET_SIZE, packet_type_of
+from env_variables import STREAM_QUEUE_LIMIT, RECEIVE_ENGINE
+from receive_engine import ReceiveEngine, tune_socket
+from meup_log import get_logger
+from meup_metrics import metrics
+
+log = get_logger("SERVER")
+
+# One UDP socket per node, shared by every role through streams
+#   > MEUP nodes frame each datagram with MUX_HEADER: magic, version, stream ID -> routed straight to that stream
+#   > unframed datagrams (scans, trades with other teams' rovers) are routed by content: the first stream whose
+#     accepts(data) is true, then a stream opened for the sender's address, then the default unframed stream
+#   > a stream either calls its handler(data, address) on the receive thread or queues for recvfrom()
+#   > the channel simulation only sees the payload: the header is added below it, like a link-layer header
+
+MUX_MAGIC = b"MUX"
+MUX_VERSION = 1
+MUX_HEADER = struct.Struct('!3sBH')  # magic, version, stream
+MUX_HEADER_SIZE = MUX_HEADER.size
+MUX_BUFFER = 65535
+
+STREAM_TELEMETRY = 1  # lunar telemetry -> earth, ACKs back
+STREAM_COMMANDS = 2  # earth commands -> lunar, ACK / DONE back
+
+TRADE_PACKET_TYPE = 2
+SCAN_REQUESTS = (b"server_check", b"Would you like to share data? (y/n)")
+
+
+def is_scan_request(data):
+    """Datagrams a scan server answers: probes, trade proposals and traded LunarPackets."""
+    return data in SCAN_REQUESTS or (len(data) == PACKET_SIZE and packet_type_of(data) == TRADE_PACKET_TYPE)
+
+
+class StreamSocket:
+    """Socket-like view of one stream (sendto / recvfrom / settimeout), usable as a client's or server's UDP_SOCKET."""
+
+    def __init__(self, endpoint, stream=None, handler=None, accepts=None, peer=None):
+        self.endpoint = endpoint
+        self.stream = stream  # None = unframed
+        self.handler = handler
+        self.accepts = accepts
+        self.peer = peer  # unframed replies from this address only
+        self.header = b"" if stream is None else MUX_HEADER.pack(MUX_MAGIC, MUX_VERSION, stream)
+        self.queue = queue.Queue(STREAM_QUEUE_LIMIT)
+        self.timeout = None
+        self.closed = False
+
+    def sendto(self, data, address):
+        # no closed check: the channel scheduler sends delayed datagrams after the stream may have closed, and they
+        # were in flight already -> they still leave through the shared endpoint socket
+        return self.endpoint.UDP_SOCKET.sendto(self.header + data, address) - len(self.header)
+
+    def recvfrom(self, bufsize):
+        if self.closed:
+            raise OSError("stream closed")
+        try:
+            data, address = self.queue.get(timeout=self.timeout)
+        except queue.Empty:
+            raise socket.timeout("timed out")
+        if data is None:
+            raise OSError("stream closed")
+        return data[:bufsize], address
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def getsockname(self):
+        return self.endpoint.UDP_SOCKET.getsockname()
+
+    def open_peer(self, address):
+        """Unframed stream for replies from one address (e.g. one trade partner), so threads never share replies."""
+        return self.endpoint.open_peer(address)
+
+    def serve(self, handler):
+        """Hand datagrams to handler(data, address) on the receive thread from now on (queued ones first)."""
+        self.handler = handler
+        while True:
+            try:
+                data, address = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            if data is not None:
+                self.deliver(data, address)
+
+    def deliver(self, data, address):
+        if self.handler is not None:
+            try:
+                self.handler(data, address)
+            except Exception as e:
+                log.error("[ENDPOINT] Stream %s handler error: %s", self.stream, e)
+            return
+        try:
+            self.queue.put_nowait((data, address))
+        except queue.Full:
+            metrics.inc("endpoint_queue_full")
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.endpoint.unregister(self)
+            try:
+                self.queue.put_nowait((None, None))  # wake a blocked recvfrom
+            except queue.Full:
+                pass
+
+
+class MEUP_endpoint:
+    """One bound UDP socket and one receive thread, dispatching datagrams to registered streams."""
+
+    def __init__(self, ip="127.0.0.1", port=5001):
+        self.ip = ip
+        self.port = port
+        self.streams = {}  # stream ID -> StreamSocket
+        self.unframed = []  # StreamSockets with an accepts() filter, in registration order
+        self.peers = {}  # address -> StreamSocket
+        self.default = None  # unframed datagrams nobody else took
+        self.lock = threading.Lock()
+        self.thread = None
+        self.UDP_SOCKET = None
+        try:
+            self.UDP_SOCKET = tune_socket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
+            self.UDP_SOCKET.bind((self.ip, self.port))
+        except Exception as e:
+            log.error("[ENDPOINT ERROR] %s ", e)
+            raise
+
+    def register(self, stream=None, handler=None, accepts=None):
+        """Socket for one stream.
+
+            > stream: ID carried in MUX_HEADER; None = unframed (talks to nodes without an endpoint)
+            > handler(data, address): called on the receive thread instead of queueing for recvfrom()
+            > accepts(data): unframed datagrams this stream takes; an unframed stream without it is the default
+        """
+        stream_socket = StreamSocket(self, stream, handler, accepts)
+        with self.lock:
+            if stream is not None:
+                if stream in self.streams:
+                    raise ValueError(f"stream {stream} already registered")
+                self.streams[stream] = stream_socket
+            elif accepts is not None:
+                self.unframed.append(stream_socket)
+            else:
+                self.default = stream_socket
+        return stream_socket
+
+    def open_peer(self, address):
+        stream_socket = StreamSocket(self, peer=address)
+        with self.lock:
+            previous = self.peers.get(address)
+            self.peers[address] = stream_socket
+        if previous is not None:
+            previous.close()
+        return stream_socket
+
+    def unregister(self, stream_socket):
+        with self.lock:
+            if stream_socket.stream is not None:
+                if self.streams.get(stream_socket.stream) is stream_socket:
+                    del self.streams[stream_socket.stream]
+            elif stream_socket.peer is not None:
+                if self.peers.get(stream_socket.peer) is stream_socket:
+                    del self.peers[stream_socket.peer]
+            elif stream_socket in self.unframed:
+                self.unframed.remove(stream_socket)
+            elif self.default is stream_socket:
+                self.default = None
+
+    def route(self, data, address):
+        """(StreamSocket, payload) for one datagram, (None, None) if no stream takes it."""
+        with self.lock:
+            if data[:len(MUX_MAGIC)] == MUX_MAGIC and len(data) >= MUX_HEADER_SIZE:
+                _, version, stream = MUX_HEADER.unpack_from(data)
+                if version != MUX_VERSION:
+                    return None, None
+                return self.streams.get(stream), data[MUX_HEADER_SIZE:]
+            for stream_socket in self.unframed:
+                if stream_socket.accepts(data):
+                    return stream_socket, data
+            return self.peers.get((address[0], address[1]), self.default), data
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name=f"Endpoint-{self.port}", daemon=True)
+            self.thread.start()
+        return self
+
+    def run(self):
+        """Receive loop: read the socket, hand every datagram to its stream."""
+        sock = self.UDP_SOCKET
+        log.info("[ENDPOINT] Listening on UDP %s:%s", *sock.getsockname()[:2])
+        if RECEIVE_ENGINE:
+            engine = ReceiveEngine()
+            engine.register(sock, self.dispatch)
+            engine.run()  # returns once close() has closed the socket
+            return
+        while sock is self.UDP_SOCKET:
+            try:
+                data, address = sock.recvfrom(MUX_BUFFER)
+            except ConnectionResetError:
+                continue  # ICMP port unreachable from an earlier send on some platforms
+            except OSError:
+                break  # socket closed
+            self.dispatch(data, address)
+
+    def dispatch(self, data, address):
+        """Hand one datagram to its stream."""
+        if not data:
+            return  # close() wake-up
+        stream_socket, payload = self.route(data, address)
+        if stream_socket is None:
+            log.debug("[ENDPOINT] No stream for datagram from %s -> dropped", address)
+            metrics.inc("endpoint_unroutable")
+            return
+        stream_socket.deliver(payload, address)
+
+    def close(self):
+        with self.lock:
+            stream_sockets = list(self.streams.values()) + self.unframed + list(self.peers.values())
+            if self.default is not None:
+                stream_sockets.append(self.default)
+        for stream_socket in stream_sockets:
+            stream_socket.close()
+        if self.UDP_SOCKET:
+            # a blocked recvfrom() is not woken by close() on every platform -> nudge it first
+            try:
+                self.UDP_SOCKET.sendto(b"", self.UDP_SOCKET.getsockname())
+            except OSError:
+                pass
+            sock, self.UDP_SOCKET = self.UDP_SOCKET, None
+            sock.close()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
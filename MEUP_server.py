@@ -1,24 +1,44 @@
 import socket
 import random
 import time
-from lunar_packet import LunarPacket
+from lunar_packet import LunarPacket, LunarBatchPacket, LunarParityPacket, LunarCompactPacket, BATCH_PACKET_TYPE, \
+    PARITY_PACKET_TYPE, COMPACT_PACKET_TYPE, READING_BATTERY, READING_SYSTEM_TEMP, packet_type_of, unpack_system_status
 from env_variables import *
+from sequence_window import DuplicateFilter
+from fec import FecDecoder
+from meup_commands import parse_command, encode_ack, encode_done
+from rover_executor import CommandExecutor
+from receive_engine import ReceiveEngine, tune_socket
 import channel_simulation as channel
+from meup_log import get_logger, ORANGE, PURPLE, YELLOW
+from meup_metrics import metrics
+
+log = get_logger("SERVER")
+rover_log = get_logger("ROVER")
+scan_log = get_logger("SCANNER")
+
+MULTI_READING_PARSERS = {BATCH_PACKET_TYPE: LunarBatchPacket.parse, COMPACT_PACKET_TYPE: LunarCompactPacket.parse}
 
 class MEUP_server:
 
-    def __init__(self, ip="127.0.0.1", port=5001):
-        """Initialize the Receiver."""
+    def __init__(self, ip="127.0.0.1", port=5001, peer_directory=None, archive=None, sock=None):
+        """Initialize the Receiver (sock: an already bound socket, e.g. a MEUP_endpoint stream)."""
 
         self.ip = ip
         self.port = port
-        self.received_packets = set()
-        self.UDP_SOCKET = None
+        self.peer_directory = peer_directory  # optional PeerDirectory refreshed by incoming scans
+        self.received_packets = DuplicateFilter()  # per-stream sliding windows of seen packet IDs
+        self.fec = FecDecoder()  # rebuilds lost telemetry from parity packets (when the sender uses FEC)
+        self.archive = archive  # optional TelemetryArchive every new reading is appended to
+        self.executor = None  # CommandExecutor, started by the first command
+        self.UDP_SOCKET = sock
+        if sock is not None:
+            return
         try:
-            self.UDP_SOCKET = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.UDP_SOCKET = tune_socket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
             self.UDP_SOCKET.bind((self.ip, self.port))
         except Exception as e:
-            print(f"[SERVER ERROR] {e} ")
+            log.error("[SERVER ERROR] %s ", e)
             raise
     
     def close(self):
@@ -32,173 +52,270 @@ class MEUP_server:
         """Return ACK for LunarPacket w/ random loss."""
 
         ack_message = str(packet_id).encode()
-        not_dropped = channel.send_w_delay_loss(self.UDP_SOCKET, ack_message, address, packet_id)  
+        try:
+            not_dropped = channel.send_w_delay_loss(self.UDP_SOCKET, ack_message, address, packet_id)
+        except channel.LinkBackpressure:
+            # link full -> the client's retransmit will ask for this ACK again
+            log.debug("[SERVER] ID=%s *ACK BACKPRESSURE* -> not sent", packet_id)
+            return
+        metrics.inc("acks_sent")
         if not_dropped:
-            print(f"[SERVER] ID={packet_id} *ACK Sent*")
+            log.debug("[SERVER] ID=%s *ACK Sent*", packet_id)
         else: 
-            print(f"[SERVER] ID={packet_id} *ACK LOST*")
+            log.debug("[SERVER] ID=%s *ACK LOST*", packet_id)
 
     # lunar to earth (telemetry)
     def parse_system_status(self, data):
         """Extract battery and system temperature from a LunarPacket."""
 
-        battery = int(data)  # Extract integer part as battery
-        sys_temp = (data - battery) * 1000 - 40  # Extract decimal part and shift back
-        return battery, sys_temp
+        return unpack_system_status(data)
 
     def decode_timestamp(self, timestamp):
         """Convert Unix timestamp to human-readable format."""
 
         return time.strftime('%Y-%m-%d %H:%M:%S GMT', time.gmtime(timestamp))
     
+    def print_reading(self, packet_id, packet_type, data_value, timestamp):
+        """Print one decoded telemetry reading."""
+
+        timestamp_str = self.decode_timestamp(timestamp)
+        # PRINT ORANGE
+        # temperature
+        if packet_type == 0:
+            log.info("\n[SERVER] ID=%s *RECVD* \nTemperature: %.2f°C., Timestamp: %s", packet_id, data_value, timestamp_str, extra=ORANGE)
+        # system status
+        elif packet_type == 1:
+            battery, sys_temp = self.parse_system_status(data_value)
+            log.info("\n[SERVER] ID=%s *RECVD* \nSystem Status - Battery: %s%%, System Temp: %.2f°C., Timestamp: %s", packet_id, battery, sys_temp, timestamp_str, extra=ORANGE)
+        # system status sent as separate readings (compact packets)
+        elif packet_type == READING_BATTERY:
+            log.info("\n[SERVER] ID=%s *RECVD* \nBattery: %.2f%%, Timestamp: %s", packet_id, data_value, timestamp_str, extra=ORANGE)
+        elif packet_type == READING_SYSTEM_TEMP:
+            log.info("\n[SERVER] ID=%s *RECVD* \nSystem Temp: %.2f°C., Timestamp: %s", packet_id, data_value, timestamp_str, extra=ORANGE)
+
     def receive_packet(self):
         """Receive Lunar Packets using UDP."""
 
-        print("[SERVER] Listening for incoming UDP packets...\n\n")
+        log.info("[SERVER] Listening for incoming UDP packets...\n\n")
+        sock = self.UDP_SOCKET
+        if RECEIVE_ENGINE and isinstance(sock, socket.socket):
+            # drain bursts from many rovers per wakeup instead of one blocking call per datagram
+            engine = ReceiveEngine()
+            engine.register(sock, self.handle_frame)
+            engine.run()
+            return
         while True:
             if not self.UDP_SOCKET:
-                print("[SERVER ERROR] Socket not initialised")
+                log.error("[SERVER ERROR] Socket not initialised")
                 # should it initialize ? 
                 return
             try: 
                 data, address = self.UDP_SOCKET.recvfrom(1024) 
-                parsed_packet = LunarPacket.parse(data) 
-                # parsed_packet is None if checksum error
-                if parsed_packet is None:
-                    print("[SERVER] ID={packet_id} *CHECKSUM INVALID* -> skipping")
-                    continue 
-                # Could throw error here 
-                packet_id = parsed_packet["packet_id"]
-                packet_type = parsed_packet["packet_type"]
-                data_value = parsed_packet["data"]
-                timestamp = parsed_packet["timestamp"]
-                timestamp_str = self.decode_timestamp(timestamp)
-                # if new packet, parse data 
-                if packet_id not in self.received_packets:
-                    self.received_packets.add(packet_id)
-                    # PRINT ORANGE
-                    # temperature
-                    if packet_type == 0:
-                        print(f"\n\033[38;5;214m[SERVER] ID={packet_id} *RECVD* \nTemperature: {data_value:.2f}°C., Timestamp: {timestamp_str}\033[0m")
-                        # clear if over
-                        if packet_id >= 1000: 
-                            self.received_packets.clear()
-                    # system status
-                    elif packet_type == 1:
-                        battery, sys_temp = self.parse_system_status(data_value)
-                        print(f"\n\033[38;5;214m[SERVER] ID={packet_id} *RECVD* \nSystem Status - Battery: {battery}%, System Temp: {sys_temp:.2f}°C., Timestamp: {timestamp_str}\033[0m")
-                        # clear if over 
-                        if packet_id >= 2000: 
-                            self.received_packets.clear()
-                else: 
-                    # ignore duplicate packets
-                    print(f"\n[SERVER] ID={packet_id} *DUPLICATE* -> IGNORED")
-                # return ACK back to client regardless of wether it was already received or not
-                self.return_ack(packet_id, address)  
+                self.handle_frame(data, address)
             except Exception as e:
-                print(f"[ERROR] Failed to receive packet: {e}")
+                log.error("[ERROR] Failed to receive packet: %s", e)
+
+    def handle_frame(self, data, address, recovered=False):
+        """Process one telemetry datagram (data, batch or parity packet) and ACK it."""
+
+        packet_type = packet_type_of(data)
+        if packet_type == PARITY_PACKET_TYPE:
+            parity = LunarParityPacket.parse(data)
+            if parity is None:
+                log.debug("[SERVER] *PARITY INVALID* -> skipping")
+                return
+            for packet_id, frame in self.fec.add_parity((address, parity["src_port"]), parity):
+                self.handle_frame(frame, address, recovered=True)
+            return
+        # batch and compact packets carry many readings under one packet ID
+        is_batch = packet_type in MULTI_READING_PARSERS
+        parsed_packet = MULTI_READING_PARSERS[packet_type](data) if is_batch else LunarPacket.parse(data)
+        # parsed_packet is None if checksum error
+        if parsed_packet is None:
+            log.debug("[SERVER] *CHECKSUM INVALID* -> skipping")
+            metrics.inc("fec_failed" if recovered else "packets_corrupted")
+            return
+        # Could throw error here 
+        packet_id = parsed_packet["packet_id"]
+        packet_type = parsed_packet["packet_type"]
+        stream = (address, parsed_packet["src_port"])
+        if recovered:
+            log.debug("[SERVER] ID=%s *REBUILT FROM PARITY*", packet_id)
+            metrics.inc("fec_recovered")
+        # if new packet, parse data 
+        # stream = sender address + rover port, IDs compared with serial arithmetic
+        new = self.received_packets.is_new(stream, packet_id)
+        if new is None:
+            # behind the duplicate window: a straggler, or a restarted rover not recognised yet -> no ACK
+            log.debug("[SERVER] ID=%s *BEHIND WINDOW* -> IGNORED", packet_id)
+            metrics.inc("packets_stale")
+            return
+        if new:
+            metrics.inc("packets_received")
+            if is_batch:
+                # batch -> every reading shares the packet ID (and its ACK)
+                readings = parsed_packet["readings"]
+            else:
+                readings = [(packet_type, parsed_packet["timestamp"], parsed_packet["data"])]
+            for reading_type, timestamp, data_value in readings:
+                self.print_reading(packet_id, reading_type, data_value, timestamp)
+                if self.archive is not None:
+                    self.archive.append(timestamp, reading_type, data_value, packet_id, parsed_packet["src_port"])
+        else: 
+            # ignore duplicate packets
+            log.debug("\n[SERVER] ID=%s *DUPLICATE* -> IGNORED", packet_id)
+            metrics.inc("packets_duplicate")
+        # return ACK back to client regardless of wether it was already received or not
+        # (a rebuilt packet is ACKed too, so the sender never retransmits it)
+        self.return_ack(packet_id, address)
+        if not recovered:
+            for _, frame in self.fec.add_frame(stream, packet_id, data):
+                self.handle_frame(frame, address, recovered=True)
 
     def listen_for_data(self):
         """Start receiving packets."""
 
         if not self.UDP_SOCKET:
-            print("[SERVER ERROR] Socket not initialized")
+            log.error("[SERVER ERROR] Socket not initialized")
             return
         try:
             self.receive_packet()
         except Exception as e:
-            print(f"[SERVER ERROR] {e}")
+            log.error("[SERVER ERROR] %s", e)
         finally:
             self.close()
 
     # commands
-    def execute_movement(self, command):
-        """Simulate executing movement commands."""
+    def execute_movement(self, command, interrupt=None):
+        """Simulate executing movement commands, False if interrupt (an Event set by STOP) cut it short."""
 
         # PRINT PURPLE
-        print(f"\033[95m[ROVER] Executing Command: {command}\033[0m")
-        if command == "FORWARD":
-            print("\033[95m[ROVER] Moving forward...\033[0m")
-            time.sleep(2)
+        rover_log.info("[ROVER] Executing Command: %s", command, extra=PURPLE)
+        duration = 0
+        if command in ("FWD", "FORWARD"):
+            rover_log.info("[ROVER] Moving forward...", extra=PURPLE)
+            duration = 2
         elif command == "BACK":
-            print("\033[95m[ROVER] Moving backward...\033[0m")
-            time.sleep(2)
+            rover_log.info("[ROVER] Moving backward...", extra=PURPLE)
+            duration = 2
         elif command == "LEFT":
-            print("\033[95m[ROVER] Turning left...\033[0m")
-            time.sleep(1)
+            rover_log.info("[ROVER] Turning left...", extra=PURPLE)
+            duration = 1
         elif command == "RIGHT":
-            print("\033[95m[ROVER] Turning right...\033[0m")
-            time.sleep(1)
+            rover_log.info("[ROVER] Turning right...", extra=PURPLE)
+            duration = 1
         elif command == "STOP":
-            print("\033[95m[ROVER] Stopping...\033[0m")
+            rover_log.info("[ROVER] Stopping...", extra=PURPLE)
+        if interrupt is None:
+            time.sleep(duration)
+            return True
+        return not interrupt.wait(duration)
+
+    def report_command(self, seq, command, status, address):
+        """Completion status of an executed command back to Earth ("DONE <seq> <command> <status>")."""
+        try:
+            channel.send_w_delay_loss(self.UDP_SOCKET, encode_done(seq, command, status), address,
+                                      999 if seq is None else seq)
+        except channel.LinkBackpressure:
+            rover_log.debug("[ROVER] DONE for %s *BACKPRESSURE* -> not sent", command, extra=PURPLE)
+
+    def handle_command(self, data, addr):
+        """ACK a command from Earth on receipt and queue it on the CommandExecutor."""
+
+        if addr[0] != EARTH_IP:
+            return
+        seq, cmd = parse_command(data)
+        if cmd is None:
+            return
+        if self.executor is None:
+            self.executor = CommandExecutor(self.execute_movement, self.report_command)
+        duplicate = seq is not None and self.received_packets.seen(addr, seq)
+        if duplicate is None:
+            # behind the duplicate window -> no ACK (the mark counts it towards a restarted Earth's run)
+            self.received_packets.is_new(addr, seq)
+            rover_log.debug("[ROVER] %s (seq %s) behind the window -> ignored", cmd, seq, extra=PURPLE)
+            return
+        if not duplicate and cmd != "STOP" and not self.executor.has_room():
+            # queue full -> no ACK, Earth retransmits once commands have drained
+            rover_log.info("[ROVER] Command queue full -> %s (seq %s) not accepted", cmd, seq, extra=PURPLE)
+            return
+        # ACK on receipt (by seq), so Earth can keep several commands in flight; a duplicate is always ACKed again
+        # (it was queued already, only its ACK got lost)
+        try:
+            channel.send_w_delay_loss(self.UDP_SOCKET, encode_ack(seq, cmd), (addr[0], addr[1]),
+                                      999 if seq is None else seq)
+            rover_log.debug("[ROVER] ACK Sent for %s (seq %s)", cmd, seq, extra=PURPLE)
+        except channel.LinkBackpressure:
+            rover_log.debug("[ROVER] ACK for %s *BACKPRESSURE* -> not sent", cmd, extra=PURPLE)
+        if duplicate or (seq is not None and not self.received_packets.is_new(addr, seq)):
+            return  # retransmission of a command already queued
+        rover_log.info("[ROVER] Received command: %s", cmd, extra=PURPLE)
+        self.executor.submit(seq, cmd, (addr[0], addr[1]))
 
     def listen_for_commands(self):
-        """Handle incoming commands via UDP."""
+        """Handle incoming commands via UDP: ACK on receipt, execution runs on a CommandExecutor thread."""
 
-        print(f"\033[95m[ROVER] Command server ready on UDP port {self.port}\033[0m")
+        rover_log.info("[ROVER] Command server ready on UDP port %s", self.port, extra=PURPLE)
         while True:
             try:
                 data, addr = self.UDP_SOCKET.recvfrom(1024)
-                if addr[0] != EARTH_IP:
-                    continue
-                cmd = data.decode().strip()
-                print(f"\033[95m[ROVER] Received command: {cmd}\033[0m")
-                self.execute_movement(cmd)
-
-                # Send ACK back to Earth -> use own function ??? 
-                ack_message = f"ACK {cmd}".encode()
-                channel.send_w_delay_loss(self.UDP_SOCKET, ack_message, (addr[0], addr[1]), 999)
-                print(f"\033[95m[ROVER] ACK Sent for {cmd}\033[0m")
-
+                self.handle_command(data, addr)
             except Exception as e:
-                print(f"\033[95m[ROVER] Command error: {e}\033[0m")
+                rover_log.error("[ROVER] Command error: %s", e, extra=PURPLE)
     
+    def handle_scan(self, data, addr):
+        """Answer one scan probe, trade proposal or traded LunarPacket."""
+
+        message = data.decode('utf-8', errors='ignore')  # Decode with error handling
+        scan_log.debug("[SERVER] Received raw data: %s from %s", data, addr, extra=YELLOW)  # Debug print
+        if self.peer_directory is not None:
+            # a host scanning / trading with us is alive -> no need to re-probe it
+            self.peer_directory.observe(addr[0])
+        
+        if message == "server_check":
+            # Active response -> gets added to "active" list for contact
+            self.UDP_SOCKET.sendto(b"server_active", addr)
+            scan_log.debug("[SERVER] Responded to scan from %s", addr, extra=YELLOW)
+            
+        elif message == "Would you like to share data? (y/n)":
+            # Decision to trade data -> this could be based on various factors,
+            # or offer various services
+            # For demonstration, we'll accept trades 70% of the time
+            if random.random() < 0.7:  # 70% chance to accept
+                self.UDP_SOCKET.sendto(b"y", addr)
+                scan_log.info("[SERVER] Accepted trade proposal from %s", addr)
+            else:
+                self.UDP_SOCKET.sendto(b"n", addr)
+                scan_log.info("[SERVER] Declined trade proposal from %s", addr)
+        
+        elif len(data) == 23:  # Size of LunarPacket
+            # might be a LunarPacket -> try to parse it
+            try:
+                packet_data = LunarPacket.parse(data)
+                if packet_data and packet_data["packet_type"] == 2:  # Type 2 is for traded data
+                    scan_log.info("[SERVER] Received trade data from %s: %s", addr, packet_data['data'])
+                    
+                    # Send an ACK for the received packet
+                    ack_message = str(packet_data["packet_id"]).encode()
+                    self.UDP_SOCKET.sendto(ack_message, addr)
+                    scan_log.debug("[SERVER] Sent ACK for packet ID %s", packet_data['packet_id'])
+                    
+                    # Process the data as needed
+                    # For example, store it, analyze it, etc.
+            except Exception as e:
+                scan_log.error("[SERVER] Error parsing packet: %s", e)
+
     def listen_for_scans(self): 
         """Handle incoming scan checks via UDP."""
 
         # PRINT YELLOW
-        print(f"\033[93m[ROVER] Scanning server ready on UDP port {self.ip}:{self.port}\033[0m")
+        scan_log.info("[ROVER] Scanning server ready on UDP port %s:%s", self.ip, self.port, extra=YELLOW)
         while True:
             try:
                 data, addr = self.UDP_SOCKET.recvfrom(1024)
-                message = data.decode('utf-8', errors='ignore')  # Decode with error handling
-                print(f"\033[93m[SERVER] Received raw data: {data} from {addr}\033[0m")  # Debug print
-                
-                if message == "server_check":
-                    # Active response -> gets added to "active" list for contact
-                    self.UDP_SOCKET.sendto(b"server_active", addr)
-                    print(f"\033[93m[SERVER] Responded to scan from {addr}\033[0m")
-                    
-                elif message == "Would you like to share data? (y/n)":
-                    # Decision to trade data -> this could be based on various factors,
-                    # or offer various services
-                    # For demonstration, we'll accept trades 70% of the time
-                    if random.random() < 0.7:  # 70% chance to accept
-                        self.UDP_SOCKET.sendto(b"y", addr)
-                        print(f"[SERVER] Accepted trade proposal from {addr}")
-                    else:
-                        self.UDP_SOCKET.sendto(b"n", addr)
-                        print(f"[SERVER] Declined trade proposal from {addr}")
-                
-                elif len(data) == 23:  # Size of LunarPacket
-                    # might be a LunarPacket -> try to parse it
-                    try:
-                        packet_data = LunarPacket.parse(data)
-                        if packet_data and packet_data["packet_type"] == 2:  # Type 2 is for traded data
-                            print(f"[SERVER] Received trade data from {addr}: {packet_data['data']}")
-                            
-                            # Send an ACK for the received packet
-                            ack_message = str(packet_data["packet_id"]).encode()
-                            self.UDP_SOCKET.sendto(ack_message, addr)
-                            print(f"[SERVER] Sent ACK for packet ID {packet_data['packet_id']}")
-                            
-                            # Process the data as needed
-                            # For example, store it, analyze it, etc.
-                    except Exception as e:
-                        print(f"[SERVER] Error parsing packet: {e}")
-                
+                self.handle_scan(data, addr)
             except Exception as e:
-                print(f"\033[93m[ROVER] Scanning error: {e}\033[0m")
+                scan_log.error("[ROVER] Scanning error: %s", e, extra=YELLOW)
 
 
 
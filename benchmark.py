@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import socket
+import random
+import argparse
+import platform
+import threading
+import subprocess
+import meup_log
+import channel_simulation as channel
+from lunar_packet import LunarPacket, LunarBatchPacket, LunarCompactPacket, np
+from MEUP_client import MEUP_client
+from MEUP_server import MEUP_server
+from env_variables import PACKET_SIZE_LIMIT, BER, MOON_TO_EARTH_LATENCY, LATENCY_JITTER_FACTOR, PACKET_LOSS_PROBABILITY, \
+    BANDWIDTH_LIMIT
+
+# Reproducible benchmarks for the MEUP hot paths
+#   > python benchmark.py -o results.json                   (run everything, write JSON)
+#   > python benchmark.py --quick --compare results.json    (flag throughput regressions against an earlier run)
+#   > every channel decision is seeded, so runs on the same commit see the same losses and corruptions
+#   > python benchmark.py --trace traces/ then --trace traces/ --replay: the end-to-end runs of a later commit see
+#     exactly the recorded losses, delays and corruptions, even if it sends different packets
+
+SEED = 1234
+
+# channel profiles for the end-to-end runs: ChannelModel arguments + packets sent
+PROFILES = {
+    "zero": {"model": dict(latency=0.0, jitter=0.0, loss=0.0, ber=0.0, bandwidth=None), "packets": 2000},
+    "lan": {"model": dict(latency=0.005, jitter=0.2, loss=0.02, ber=0.001, bandwidth=None), "packets": 500},
+    "lunar": {"model": dict(latency=MOON_TO_EARTH_LATENCY, jitter=LATENCY_JITTER_FACTOR, loss=PACKET_LOSS_PROBABILITY,
+                            ber=BER, bandwidth=BANDWIDTH_LIMIT), "packets": 40},
+}
+
+
+def measure(func, ops, repeat=5):
+    """Best of repeat timed calls of func(), which performs ops operations."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return {"ops": ops, "seconds": best, "ops_per_sec": ops / best, "ns_per_op": best / ops * 1e9}
+
+
+def percentiles(values):
+    """p50/p90/p99/max of a list of latencies (seconds)."""
+    if not values:
+        return {}
+    values = sorted(values)
+    pick = lambda fraction: values[min(len(values) - 1, int(fraction * len(values)))]
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": values[-1]}
+
+
+def bench_codec(scale):
+    """LunarPacket / LunarBatchPacket build and parse."""
+    rng = random.Random(SEED)
+    count = 10000 * scale
+    packets = [LunarPacket(5202, 5101, i & 0xFFFF, i & 1, rng.uniform(-150, 130)) for i in range(count)]
+    frames = [packet.build() for packet in packets]
+    batch = LunarBatchPacket(5202, 5101, 1)
+    while not batch.is_full(PACKET_SIZE_LIMIT):
+        batch.add_reading(0, rng.uniform(-150, 130))
+    batch_frame = batch.build()
+    compact = LunarCompactPacket(5202, 5101, 2, timestamp=batch.timestamp)
+    temperature = 20.0
+    while compact.add_reading(0, round(temperature, 2), compact.timestamp_ms / 1000 + len(compact.readings) * 3,
+                              PACKET_SIZE_LIMIT):
+        temperature += rng.uniform(-0.5, 0.5)
+    compact_frame = compact.build()
+    batches = 1000 * scale
+
+    results = {
+        "packet_build": measure(lambda: [packet.build() for packet in packets], count),
+        "packet_parse": measure(lambda: [LunarPacket.parse(frame) for frame in frames], count),
+        "batch_build": measure(lambda: [batch.build() for _ in range(batches)], batches),
+        "batch_parse": measure(lambda: [LunarBatchPacket.parse(batch_frame) for _ in range(batches)], batches),
+        "compact_build": measure(lambda: [compact.build() for _ in range(batches)], batches),
+        "compact_parse": measure(lambda: [LunarCompactPacket.parse(compact_frame) for _ in range(batches)], batches),
+        "build_many": measure(lambda: LunarPacket.build_many(packets), count),
+        "iter_decode": measure(lambda: list(LunarPacket.iter_decode(b"".join(frames))), count),
+    }
+    if np is not None:
+        buffer = b"".join(frames)
+        results["decode_many"] = measure(lambda: LunarPacket.decode_many(buffer), count)
+    return results
+
+
+def bench_channel(scale):
+    """corrupt_data, channel decisions and send_w_delay_loss at scale."""
+    count = 10000 * scale
+    small, large = bytes(23), bytes(PACKET_SIZE_LIMIT)
+    rng = random.Random(SEED)
+    model = channel.ChannelModel(seed=SEED, bandwidth=None)
+    results = {
+        "corrupt_data_23B": measure(lambda: [channel.corrupt_data(small, BER, rng) for _ in range(count)], count),
+        "corrupt_data_256B": measure(lambda: [channel.corrupt_data(large, BER, rng) for _ in range(count)], count),
+        "impair": measure(lambda: [model.impair(small) for _ in range(count)], count),
+        "impair_batch": measure(lambda: model.impair_batch([small] * count), count),
+    }
+
+    # send_w_delay_loss: hand datagrams to the scheduler, then time until it has delivered all of them
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = sink.getsockname()
+    model = channel.ChannelModel(latency=0.0, jitter=0.0, loss=0.0, ber=0.0, seed=SEED, bandwidth=None)
+    sends = min(count, 5000)  # stay below CHANNEL_QUEUE_LIMIT
+    try:
+        start = time.perf_counter()
+        for packet_id in range(sends):
+            channel.send_w_delay_loss(sender, small, target, packet_id, model=model)
+        queued = time.perf_counter() - start
+        while channel.queue_depth():
+            time.sleep(0.001)
+        drained = time.perf_counter() - start
+    finally:
+        sender.close()
+        sink.close()
+    results["send_w_delay_loss"] = {"ops": sends, "seconds": queued, "ops_per_sec": sends / queued,
+                                    "ns_per_op": queued / sends * 1e9, "delivered_per_sec": sends / drained}
+    return results
+
+
+class _TimedClient(MEUP_client):
+    """MEUP_client remembering when each packet ID was first sent."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.first_sent = {}
+
+    def send_packet(self, packet, address, sock=None):
+        self.first_sent.setdefault(packet.packet_id, time.perf_counter())
+        return super().send_packet(packet, address, sock)
+
+
+class _TimedServer(MEUP_server):
+    """MEUP_server remembering when each packet ID was first delivered."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delivered = {}
+
+    def print_reading(self, packet_id, packet_type, data_value, timestamp):
+        self.delivered.setdefault(packet_id, time.perf_counter())
+
+
+def bench_end_to_end(profile, packets, trace_dir=None, replay=False):
+    """MEUP_client -> MEUP_server over loopback through one channel profile (optionally recorded / replayed)."""
+    trace_path = os.path.join(trace_dir, f"{profile}.trace") if trace_dir else None
+    channel.set_channel(channel.open_channel(trace_path, "replay" if replay else "record", seed=SEED,
+                                             **PROFILES[profile]["model"]))
+    server = _TimedServer("127.0.0.1", 0)
+    address = server.UDP_SOCKET.getsockname()
+    threading.Thread(target=server.receive_packet, daemon=True).start()
+    client = _TimedClient("127.0.0.1", 0, *address)
+    model = channel.get_channel()
+    try:
+        batch = [client.build_temperature(client.next_packet_id()) for _ in range(packets)]
+        start = time.perf_counter()
+        acked = client.send_window(batch, address)
+        elapsed = time.perf_counter() - start
+        latencies = [server.delivered[i] - client.first_sent[i] for i in server.delivered if i in client.first_sent]
+    finally:
+        client.close()
+        server.close()
+        if isinstance(model, channel.RecordingChannel):
+            model.close()
+    return {"packets": packets, "acked": len(acked), "delivered": len(server.delivered), "seconds": elapsed,
+            "packets_per_sec": len(acked) / elapsed, "latency": percentiles(latencies)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print throughput changes against a baseline run, return the regressions."""
+    regressions = []
+    for group, benches in results["results"].items():
+        for name, result in benches.items():
+            before = baseline.get("results", {}).get(group, {}).get(name)
+            key = "packets_per_sec" if "packets_per_sec" in result else "ops_per_sec"
+            if not before or key not in before:
+                continue
+            change = result[key] / before[key] - 1
+            flag = " REGRESSION" if change < -threshold else ""
+            print(f"{group}.{name:<20} {before[key]:>14.1f} -> {result[key]:>14.1f} {key} ({change:+.1%}){flag}")
+            if flag:
+                regressions.append(f"{group}.{name}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MEUP codec, channel and end-to-end benchmarks")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file (default: stdout)")
+    parser.add_argument("--compare", help="earlier results JSON to compare throughput against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown that counts as a regression")
+    parser.add_argument("--quick", action="store_true", help="smaller runs, skip the lunar profile")
+    parser.add_argument("--profiles", default=None, help="comma separated end-to-end profiles " + str(list(PROFILES)))
+    parser.add_argument("--trace", help="directory of per-profile channel traces to record (or replay)")
+    parser.add_argument("--replay", action="store_true", help="replay the traces in --trace instead of recording")
+    args = parser.parse_args(argv)
+    if args.replay and not args.trace:
+        parser.error("--replay needs --trace")
+    if args.trace and not args.replay:
+        os.makedirs(args.trace, exist_ok=True)
+
+    for subsystem in meup_log.SUBSYSTEMS:
+        meup_log.set_level(subsystem, "OFF")
+    scale = 1 if args.quick else 5
+    profiles = args.profiles.split(",") if args.profiles else [p for p in PROFILES if not (args.quick and p == "lunar")]
+    default_channel = channel.get_channel()
+    try:
+        results = {
+            "codec": bench_codec(scale),
+            "channel": bench_channel(scale),
+            "end_to_end": {profile: bench_end_to_end(profile, PROFILES[profile]["packets"] * scale // 5,
+                                                    args.trace, args.replay)
+                           for profile in profiles},
+        }
+    finally:
+        channel.set_channel(default_channel)
+
+    report = {
+        "meta": {"commit": git_commit(), "time": time.time(), "python": platform.python_version(),
+                 "platform": platform.platform(), "numpy": np.__version__ if np is not None else None,
+                 "seed": SEED, "scale": scale, "trace": args.trace, "replay": args.replay},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as stream:
+            stream.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as stream:
+            if compare(report, json.load(stream), args.threshold):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,67 +1,518 @@
+import os
+import sys
+import atexit
+import struct
 import threading
-import time
+import meup_clock
 import socket
 import random
-from env_variables import MOON_TO_EARTH_LATENCY, LATENCY_JITTER_FACTOR, PACKET_LOSS_PROBABILITY, PACKET_LOSS_FACTOR, BER
+import heapq
+import itertools
+import multiprocessing
+import asyncio
+from collections import namedtuple, deque
+from env_variables import MOON_TO_EARTH_LATENCY, LATENCY_JITTER_FACTOR, PACKET_LOSS_PROBABILITY, PACKET_LOSS_FACTOR, BER, CHANNEL_QUEUE_LIMIT, CHANNEL_SEED, \
+    CHANNEL_TRACE_PATH, CHANNEL_TRACE_MODE, BANDWIDTH_LIMIT, BANDWIDTH_BURST, BANDWIDTH_SHAPING, LINK_QUEUE_LIMIT
+from meup_log import get_logger
+from meup_metrics import metrics
 
-def corrupt_data(data, BER):
+log = get_logger("CHANNEL")
+
+try:
+    import numpy as np  # optional: vectorised batch decisions in ChannelModel
+except ImportError:
+    np = None
+
+
+def flip_bits(data, bit_positions):
+    """Flip the given bit positions (byte * 8 + bit) of data with one XOR mask."""
+    if not bit_positions:
+        return data
+    length = len(data)
+    mask = 0
+    for position in bit_positions:
+        # bit b of byte i in a big-endian integer of the whole payload
+        mask ^= 1 << ((length - 1 - (position >> 3)) * 8 + (position & 7))
+    return (int.from_bytes(data, "big") ^ mask).to_bytes(length, "big")
+
+
+def corrupt_data(data, BER, rng=random):
     """Simlutaes bitwise data corruption in channel"""
     if not data:
         return data
-    
-    byte_array = bytearray(data)
-    length = len(byte_array)
 
-    num_corrupted_bytes = max(1, int(length * BER)) # calculate how many bytes will be corrupted
+    num_corrupted_bits = max(1, int(len(data) * BER)) # calculate how many bits will be flipped
+    # Select a random bit of a random byte for each flip
+    return flip_bits(data, [rng.randrange(len(data) * 8) for _ in range(num_corrupted_bits)])
 
-    for i in range(num_corrupted_bytes): #for each corrupted byte
-        # Select a random index
-        byte_index = random.randint(0, length - 1)
-        bit_index = random.randint(0, 7)
-        # Select a random bit index for that byte and create
-        # a bit mask to flip that bit
-        byte_array[byte_index] ^= (1 << bit_index)
-    
-    return bytes(byte_array)
 
+class ChannelScheduler:
+    """Single thread delivering delayed datagrams in deadline order (replaces one thread per packet)."""
 
+    def __init__(self, max_queue=CHANNEL_QUEUE_LIMIT):
+        self.max_queue = max_queue
+        self.queue = []  # heap of (deliver_at, seq, udp_socket, payload, address, packet_id, latency, corrupted)
+        self.sequence = itertools.count()  # tie-breaker so equal deadlines keep send order
+        self.condition = threading.Condition()
+        self.thread = None
 
-def send_w_delay_loss(udp_socket, data, target_address, packet_id):
-    """Send data after simulating transmission delay using a thread."""
-            
-    # Determine if packet will be lost
-    loss_jitter = random.uniform(-PACKET_LOSS_FACTOR, PACKET_LOSS_FACTOR) * PACKET_LOSS_PROBABILITY
-    actual_loss_probability = PACKET_LOSS_PROBABILITY + loss_jitter 
-    not_dropped = random.random() > actual_loss_probability
+    def queue_depth(self):
+        """Number of datagrams waiting for delivery."""
 
-    def send_or_drop_delayed():
-        # if not lost, simulate bit corruption and channel delay
-        if not_dropped:
-            
-            corrupted = False
-            send_data = data
-
-            if random.random() < BER:
-                send_data = corrupt_data(data, BER)
-                corrupted = True
-
-            send_jitter = random.uniform(-LATENCY_JITTER_FACTOR, LATENCY_JITTER_FACTOR) * MOON_TO_EARTH_LATENCY
-            total_latency = MOON_TO_EARTH_LATENCY + send_jitter
-            time.sleep(total_latency)
+        with self.condition:
+            return len(self.queue)
+
+    def schedule(self, deliver_at, udp_socket, payload, address, packet_id=None, latency=0.0, corrupted=False):
+        """Queue a datagram for delivery at deliver_at, False if the queue is full."""
+
+        with self.condition:
+            if len(self.queue) >= self.max_queue:
+                return False
+            seq = next(self.sequence)
+            heapq.heappush(self.queue, (deliver_at, seq, udp_socket, payload,
+                                        address, packet_id, latency, corrupted))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="ChannelScheduler")
+                self.thread.daemon = True  # Daemon threads exit when the main program exits
+                self.thread.start()
+            # wake the scheduler if this entry is now the earliest
+            if self.queue[0][1] == seq:
+                self.condition.notify()
+        return True
+
+    def run(self):
+        """Deliver each queued datagram once its deadline has passed."""
+
+        while True:
+            with self.condition:
+                while not self.queue or self.queue[0][0] > meup_clock.monotonic():
+                    timeout = self.queue[0][0] - meup_clock.monotonic() if self.queue else None
+                    self.condition.wait(timeout)
+                _, _, udp_socket, payload, address, packet_id, latency, corrupted = heapq.heappop(self.queue)
             try:
-                udp_socket.sendto(send_data, target_address)
+                udp_socket.sendto(payload, address)
                 if corrupted:
-                    print(f"[CHANNEL] ID={packet_id} *CORRUPTED*   {total_latency:.2f}s")
+                    log.debug("[CHANNEL] ID=%s *CORRUPTED*   %.2fs", packet_id, latency)
                 else:
-                    print(f"[CHANNEL] ID={packet_id} *SENT*        {total_latency:.2f}s")
-            except (socket.error) as e:
-                print(f"[CHANNEL ERROR] Failed to send delayed data: {e}")
-        else:
-            print(f"[CHANNEL] ID={packet_id} *LOST*                p:{actual_loss_probability:.2f}")
-    
-    # Start a new thread to handle the delayed sending
+                    log.debug("[CHANNEL] ID=%s *SENT*        %.2fs", packet_id, latency)
+            except (socket.error, OSError, AttributeError) as e:
+                log.error("[CHANNEL ERROR] Failed to send delayed data: %s", e)
+
+
+_scheduler = ChannelScheduler()
+
+
+def queue_depth():
+    """Number of datagrams currently held in the channel."""
+
+    return _scheduler.queue_depth()
+
+
+class LinkBackpressure(Exception):
+    """Raised when a link's transmit queue is full; retry_after is the wait (s) until a slot frees."""
+
+    def __init__(self, target_address, retry_after):
+        super().__init__(f"link to {target_address} is full, retry in {retry_after:.2f}s")
+        self.target_address = target_address
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token-bucket shaper for one link with a bounded transmit queue.
+
+        > rate bytes/s refill, up to burst bytes can leave back to back
+        > datagrams beyond the available tokens queue for their serialization delay
+    """
+
+    def __init__(self, rate=BANDWIDTH_LIMIT, burst=BANDWIDTH_BURST, max_queue=LINK_QUEUE_LIMIT):
+        if max_queue < 1:
+            raise ValueError(f"max_queue must be at least 1, got {max_queue}")  # 0 would refuse every datagram
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.tokens = burst
+        self.last_refill = meup_clock.monotonic()
+        self.departures = deque()  # departure times of datagrams still waiting for tokens
+        self.lock = threading.Lock()
+
+    def _drain(self, now):
+        while self.departures and self.departures[0] <= now:
+            self.departures.popleft()
+
+    def queue_depth(self, now=None):
+        """Datagrams waiting to leave the link."""
+        with self.lock:
+            self._drain(meup_clock.monotonic() if now is None else now)
+            return len(self.departures)
+
+    def reserve(self, nbytes, target_address=None, now=None):
+        """Departure time for a datagram of nbytes, raises LinkBackpressure if the queue is full."""
+        with self.lock:
+            now = meup_clock.monotonic() if now is None else now
+            self._drain(now)
+            if len(self.departures) >= self.max_queue:
+                raise LinkBackpressure(target_address, self.departures[0] - now)
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= nbytes
+            # negative tokens = bytes still to serialize ahead of (and including) this datagram
+            departure = now if self.tokens >= 0 else now - self.tokens / self.rate
+            if departure > now:
+                self.departures.append(departure)
+            return departure
+
+
+ChannelDecision = namedtuple("ChannelDecision",
+                             ["not_dropped", "send_data", "latency", "corrupted", "loss_probability", "flipped_bits"])
+
+
+class ChannelModel:
+    """Loss, jitter and corruption for one channel, drawn from its own seedable generator.
+
+        > Same seed + same sequence of impair / impair_batch calls -> same decisions
+          (impair_batch uses a NumPy generator when NumPy is installed, random.Random otherwise)
+        > impair_batch decides a whole batch of datagrams with vectorised draws
+    """
+
+    def __init__(self, latency=MOON_TO_EARTH_LATENCY, jitter=LATENCY_JITTER_FACTOR,
+                 loss=PACKET_LOSS_PROBABILITY, loss_factor=PACKET_LOSS_FACTOR, ber=BER, seed=CHANNEL_SEED,
+                 bandwidth=BANDWIDTH_LIMIT if BANDWIDTH_SHAPING else None, burst=BANDWIDTH_BURST,
+                 link_queue=LINK_QUEUE_LIMIT):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.loss_factor = loss_factor
+        self.ber = ber
+        self.seed = seed
+        self.bandwidth = bandwidth  # bytes/s per link, None = unshaped
+        self.burst = burst
+        self.link_queue = link_queue
+        self.shapers = {}  # target address -> TokenBucket
+        self.lock = threading.Lock()  # one generator shared by every sender on this channel
+        self.reseed(seed)
+
+    def departure_time(self, nbytes, target_address):
+        """When a datagram leaves the sender's side of the link (raises LinkBackpressure)."""
+        if self.bandwidth is None:
+            return meup_clock.monotonic()
+        with self.lock:
+            shaper = self.shapers.get(target_address)
+            if shaper is None:
+                shaper = self.shapers[target_address] = TokenBucket(self.bandwidth, self.burst, self.link_queue)
+        return shaper.reserve(nbytes, target_address)
+
+    def link_queue_depth(self, target_address=None):
+        """Datagrams waiting for bandwidth on one link (or all links)."""
+        shapers = [self.shapers.get(target_address)] if target_address is not None else list(self.shapers.values())
+        return sum(shaper.queue_depth() for shaper in shapers if shaper is not None)
+
+    def reseed(self, seed=None):
+        """Restart the decision sequence from seed."""
+        self.seed = seed
+        self.rng = random.Random(seed)  # scalar draws (impair)
+        self.np_rng = np.random.default_rng(seed) if np is not None else None  # vectorised draws (impair_batch)
+
+    def impair(self, data):
+        """Decide the fate of one datagram (scalar draws, cheaper than a batch of one)."""
+        with self.lock:
+            return self._impair_one(data)
+
+    def impair_batch(self, payloads):
+        """Decide loss, latency and corrupted bits for every payload at once."""
+        with self.lock:
+            if self.np_rng is not None:
+                return self._impair_numpy(payloads)
+            return self._impair_python(payloads)
+
+    def _impair_numpy(self, payloads):
+        count = len(payloads)
+        rng = self.np_rng
+        # Determine which packets will be lost
+        loss_probability = self.loss + rng.uniform(-self.loss_factor, self.loss_factor, count) * self.loss
+        not_dropped = rng.random(count) > loss_probability
+        # if not lost, simulate bit corruption and channel delay
+        corrupted = not_dropped & (rng.random(count) < self.ber)
+        latency = self.latency + rng.uniform(-self.jitter, self.jitter, count) * self.latency
+
+        # every flipped bit of the batch in one draw
+        lengths = np.fromiter(map(len, payloads), dtype=np.int64, count=count)
+        flips = np.where(corrupted & (lengths > 0), np.maximum(1, (lengths * self.ber).astype(np.int64)), 0)
+        positions = rng.integers(0, np.repeat(np.maximum(lengths, 1) * 8, flips)).tolist()
+
+        decisions = []
+        start = 0
+        for data, kept, bad, delay, probability, count_bits in zip(
+                payloads, not_dropped.tolist(), corrupted.tolist(), latency.tolist(),
+                loss_probability.tolist(), flips.tolist()):
+            if not kept:
+                decisions.append(ChannelDecision(False, None, 0.0, False, probability, ()))
+            elif bad:
+                bits = tuple(positions[start:start + count_bits])
+                start += count_bits
+                decisions.append(ChannelDecision(True, flip_bits(data, bits), delay, True, probability, bits))
+            else:
+                decisions.append(ChannelDecision(True, data, delay, False, probability, ()))
+        return decisions
+
+    def _impair_one(self, data):
+        rng = self.rng
+        # Determine if packet will be lost
+        loss_probability = self.loss + rng.uniform(-self.loss_factor, self.loss_factor) * self.loss
+        if rng.random() <= loss_probability:
+            return ChannelDecision(False, None, 0.0, False, loss_probability, ())
+        # if not lost, simulate bit corruption and channel delay
+        bits = ()
+        if rng.random() < self.ber and data:
+            bits = tuple(rng.randrange(len(data) * 8) for _ in range(max(1, int(len(data) * self.ber))))
+        latency = self.latency + rng.uniform(-self.jitter, self.jitter) * self.latency
+        return ChannelDecision(True, flip_bits(data, bits), latency, bool(bits), loss_probability, bits)
+
+    def _impair_python(self, payloads):
+        return [self._impair_one(data) for data in payloads]
+
+
+# Channel traces: every decision of a channel, in the order it was made
+#   > header: TRACE_HEADER (the recording channel's parameters)
+#   > per decision: TRACE_RECORD flags + loss probability, then the latency if kept,
+#     then the number of flipped bits and their positions if corrupted
+#   > replaying hands out the recorded decisions in order, whatever the payloads now are: bit positions past the
+#     end of a shorter payload wrap around, decisions beyond the end of the trace are drawn live (metrics "trace_exhausted")
+
+TRACE_MAGIC = b"MEUPCHT1"
+TRACE_HEADER = struct.Struct('<8s d d d d d')  # magic, latency, jitter, loss, loss factor, ber
+TRACE_RECORD = struct.Struct('<Bf')  # flags, loss probability
+TRACE_LATENCY = struct.Struct('<d')
+TRACE_BITS = struct.Struct('<H')  # number of flipped bits (each a '<I' position)
+TRACE_KEPT = 1
+TRACE_CORRUPTED = 2
+
+
+def read_trace(path):
+    """(parameters, iterator of ChannelDecision without send_data) of a channel trace file."""
+    with open(path, "rb") as stream:
+        data = stream.read()
+    magic, latency, jitter, loss, loss_factor, ber = TRACE_HEADER.unpack_from(data)
+    if magic != TRACE_MAGIC:
+        raise ValueError(f"{path} is not a channel trace")
+    parameters = dict(latency=latency, jitter=jitter, loss=loss, loss_factor=loss_factor, ber=ber)
+
+    def decisions():
+        offset = TRACE_HEADER.size
+        while offset + TRACE_RECORD.size <= len(data):
+            flags, loss_probability = TRACE_RECORD.unpack_from(data, offset)
+            offset += TRACE_RECORD.size
+            if not flags & TRACE_KEPT:
+                yield ChannelDecision(False, None, 0.0, False, loss_probability, ())
+                continue
+            total_latency, = TRACE_LATENCY.unpack_from(data, offset)
+            offset += TRACE_LATENCY.size
+            bits = ()
+            if flags & TRACE_CORRUPTED:
+                count, = TRACE_BITS.unpack_from(data, offset)
+                offset += TRACE_BITS.size
+                bits = struct.unpack_from(f"<{count}I", data, offset)
+                offset += 4 * count
+            yield ChannelDecision(True, None, total_latency, bool(flags & TRACE_CORRUPTED), loss_probability, bits)
+
+    return parameters, decisions()
+
+
+class RecordingChannel(ChannelModel):
+    """ChannelModel writing every decision it makes to a trace file (see read_trace)."""
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.stream = open(path, "wb")
+        self.stream.write(TRACE_HEADER.pack(TRACE_MAGIC, self.latency, self.jitter, self.loss, self.loss_factor,
+                                            self.ber))
+        self.records = 0
+        atexit.register(self.close)
+
+    def record(self, decisions):
+        chunks = []
+        for not_dropped, _, total_latency, corrupted, loss_probability, bits in decisions:
+            flags = (TRACE_KEPT if not_dropped else 0) | (TRACE_CORRUPTED if corrupted else 0)
+            chunks.append(TRACE_RECORD.pack(flags, loss_probability))
+            if not_dropped:
+                chunks.append(TRACE_LATENCY.pack(total_latency))
+            if corrupted:
+                chunks.append(TRACE_BITS.pack(len(bits)) + struct.pack(f"<{len(bits)}I", *bits))
+        if self.stream is not None:
+            self.stream.write(b"".join(chunks))
+        self.records += len(decisions)
+
+    def impair(self, data):
+        with self.lock:
+            decision = self._impair_one(data)
+            self.record((decision,))
+        return decision
+
+    def impair_batch(self, payloads):
+        with self.lock:
+            decisions = self._impair_numpy(payloads) if self.np_rng is not None else self._impair_python(payloads)
+            self.record(decisions)
+        return decisions
+
+    def close(self):
+        with self.lock:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+
+
+class ReplayChannel(ChannelModel):
+    """ChannelModel handing out the decisions of a recorded trace instead of drawing them.
+
+        > loss / latency / ber default to the recorded channel's; bandwidth shaping still happens live
+    """
+
+    def __init__(self, path, **kwargs):
+        parameters, self.decisions = read_trace(path)
+        parameters.update(kwargs)
+        super().__init__(**parameters)
+        self.path = path
+        self.replayed = 0
+        self.exhausted = 0  # decisions drawn live after the end of the trace
+
+    def _replay_one(self, data):
+        decision = next(self.decisions, None)
+        if decision is None:
+            if not self.exhausted:
+                log.info("[CHANNEL] Trace %s exhausted after %s decisions -> drawing live", self.path, self.replayed)
+            self.exhausted += 1
+            metrics.inc("trace_exhausted")
+            return self._impair_one(data)
+        self.replayed += 1
+        if not decision.not_dropped:
+            return decision
+        bits = decision.flipped_bits
+        if bits and data:
+            size = len(data) * 8
+            bits = tuple(position % size for position in bits)
+        return decision._replace(send_data=flip_bits(data, bits) if data else data, flipped_bits=bits)
+
+    def impair(self, data):
+        with self.lock:
+            return self._replay_one(data)
+
+    def impair_batch(self, payloads):
+        with self.lock:
+            return [self._replay_one(data) for data in payloads]
+
+
+def open_channel(trace_path=CHANNEL_TRACE_PATH, mode=CHANNEL_TRACE_MODE, **kwargs):
+    """ChannelModel(**kwargs), recording to or replaying from trace_path if one is given.
+
+        > "{program}" in trace_path is replaced by the running script's name, so every node keeps its own trace
+    """
+    if not trace_path:
+        return ChannelModel(**kwargs)
+    program = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+    trace_path = trace_path.format(program=program)
+    if mode == "replay":
+        log.info("[CHANNEL] Replaying channel trace %s", trace_path)
+        return ReplayChannel(trace_path, **kwargs)
+    if mode == "record":
+        log.info("[CHANNEL] Recording channel trace %s", trace_path)
+        return RecordingChannel(trace_path, **kwargs)
+    raise ValueError(f"unknown channel trace mode {mode!r}")
+
+
+_channel = None  # opened on first use, so importing this module never creates (or truncates) a trace file
+_channel_lock = threading.Lock()
+
+
+def get_channel():
+    """The ChannelModel used by send_w_delay_loss.
+
+        > only the main process records / replays CHANNEL_TRACE_PATH: worker processes (e.g. the ground station's)
+          get an untraced ChannelModel instead of truncating the main process's trace
+    """
+
+    global _channel
+    if _channel is None:
+        with _channel_lock:
+            if _channel is None:
+                _channel = open_channel() if multiprocessing.parent_process() is None else ChannelModel()
+    return _channel
+
+
+def set_channel(model):
+    """Replace the default ChannelModel (e.g. a seeded or zero-latency profile)."""
+
+    global _channel
+    _channel = model
+    return model
+
+
+def impair(data):
+    """Draw loss, corruption and latency for one datagram on the default channel."""
+
+    return get_channel().impair(data)
+
+
+def send_w_delay_loss(udp_socket, data, target_address, packet_id, model=None):
+    """Send data after simulating transmission delay on the channel scheduler.
+
+        > raises LinkBackpressure if the link's transmit queue is full (nothing is sent)
+    """
+
+    model = model or get_channel()
+    try:
+        departure = model.departure_time(len(data), target_address)
+    except LinkBackpressure:
+        metrics.inc("channel_backpressure")
+        raise
+    not_dropped, send_data, total_latency, corrupted, loss_probability, _ = model.impair(data)
+    if not not_dropped:
+        log.debug("[CHANNEL] ID=%s *LOST*                p:%.2f", packet_id, loss_probability)
+        metrics.inc("channel_lost")
+        return not_dropped
+    if corrupted:
+        metrics.inc("channel_corrupted")
+
+    # Hand the datagram to the scheduler thread
     # without sleeping entire program
-    thread = threading.Thread(target=send_or_drop_delayed)
-    thread.daemon = True  # Daemon threads exit when the main program exits
-    thread.start()
-    return not_dropped  # return not dropped
\ No newline at end of file
+    if not _scheduler.schedule(departure + total_latency, udp_socket, send_data,
+                               target_address, packet_id, total_latency, corrupted):
+        log.debug("[CHANNEL] ID=%s *QUEUE FULL* -> dropped", packet_id)
+        metrics.inc("channel_queue_full")
+        return False
+    return not_dropped  # return not dropped
+
+
+def send_w_delay_loss_async(transport, data, target_address, packet_id, loop=None, model=None):
+    """asyncio version of send_w_delay_loss: the channel delay is a loop timer on the transport."""
+
+    model = model or get_channel()
+    try:
+        departure = model.departure_time(len(data), target_address)
+    except LinkBackpressure:
+        metrics.inc("channel_backpressure")
+        raise
+    not_dropped, send_data, total_latency, corrupted, loss_probability, _ = model.impair(data)
+    if not not_dropped:
+        log.debug("[CHANNEL] ID=%s *LOST*                p:%.2f", packet_id, loss_probability)
+        metrics.inc("channel_lost")
+        return not_dropped
+    if corrupted:
+        metrics.inc("channel_corrupted")
+
+    def deliver():
+        if transport.is_closing():
+            return
+        transport.sendto(send_data, target_address)
+        if corrupted:
+            log.debug("[CHANNEL] ID=%s *CORRUPTED*   %.2fs", packet_id, total_latency)
+        else:
+            log.debug("[CHANNEL] ID=%s *SENT*        %.2fs", packet_id, total_latency)
+
+    loop = loop or asyncio.get_running_loop()
+    loop.call_later(max(0.0, departure - meup_clock.monotonic()) + total_latency, deliver)
+    return not_dropped
+
+
+# queue depths are read when a metrics snapshot is taken
+metrics.set_gauge("channel_queue_depth", queue_depth)
+metrics.set_gauge("link_queue_depth", lambda: get_channel().link_queue_depth())
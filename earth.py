@@ -1,8 +1,12 @@
 import time
 import threading
 from env_variables import *
+import meup_metrics
 from MEUP_server import MEUP_server
 from MEUP_client import MEUP_client
+from MEUP_endpoint import MEUP_endpoint, STREAM_TELEMETRY, STREAM_COMMANDS
+from telemetry_archive import TelemetryArchive
+from ground_station import GroundStation
 
 
 def telemetry_thread(server: MEUP_server):
@@ -26,18 +30,50 @@ if __name__ == "__main__":
     threads = []
     Telemetry = None
     Commands = None
+    Endpoint = None
+    Station = None
     # Scanning = None
     try:
+        if METRICS_ENABLED:
+            # counters, RTT histograms and queue depths on http://127.0.0.1:EARTH_METRICS_PORT/metrics
+            meup_metrics.start(EARTH_METRICS_PORT, METRICS_DUMP_PATH and METRICS_DUMP_PATH.format(node="earth"))
         # UDP socket
-        Telemetry = MEUP_server(EARTH_IP, EARTH_RECEIVE_PORT)
-        Commands = MEUP_client(EARTH_IP, EARTH_COMMAND_PORT, LUNAR_IP, LUNAR_RECEIVE_PORT)
-
-        # Create and start telemetry thread
-        t_thread = threading.Thread(target=telemetry_thread, args=(Telemetry,), daemon=True)
-        t_thread.start()
-        threads.append(t_thread)
-        # PRINT ORANGE
-        print("\033[38;5;214m[EARTH] Telemetry thread started\033[0m")
+        # received readings are kept in memory-mapped segment files, queried with archive.query(start, end)
+        archive = None
+        if TELEMETRY_ARCHIVE_PATH:
+            try:
+                archive = TelemetryArchive(TELEMETRY_ARCHIVE_PATH)
+            except ImportError as e:
+                print(f"[EARTH] Telemetry archive disabled: {e}")
+        if MULTIPLEX_ENDPOINT:
+            # one UDP socket: telemetry is handled on the endpoint's thread, command ACKs go to the command stream
+            Endpoint = MEUP_endpoint(EARTH_IP, EARTH_RECEIVE_PORT)
+            Telemetry = MEUP_server(EARTH_IP, EARTH_RECEIVE_PORT, archive=archive, sock=Endpoint.register(STREAM_TELEMETRY))
+            Telemetry.UDP_SOCKET.serve(Telemetry.handle_frame)
+            Commands = MEUP_client(EARTH_IP, EARTH_RECEIVE_PORT, LUNAR_IP, LUNAR_ENDPOINT_PORT,
+                                   sock=Endpoint.register(STREAM_COMMANDS))
+            Endpoint.start()
+            # PRINT ORANGE
+            print(f"\033[38;5;214m[EARTH] Endpoint on UDP port {EARTH_RECEIVE_PORT} (telemetry, commands)\033[0m")
+        elif GROUND_WORKERS > 1:
+            # telemetry parsed / ACKed by worker processes sharing the port, merged here by the aggregator thread
+            Station = GroundStation(EARTH_IP, EARTH_RECEIVE_PORT, GROUND_WORKERS, archive=archive).start()
+            Commands = MEUP_client(EARTH_IP, EARTH_COMMAND_PORT, LUNAR_IP, LUNAR_RECEIVE_PORT)
+            t_thread = threading.Thread(target=Station.run, daemon=True)
+            t_thread.start()
+            threads.append(t_thread)
+            # PRINT ORANGE
+            print(f"\033[38;5;214m[EARTH] Ground station started ({GROUND_WORKERS} workers)\033[0m")
+        else:
+            Telemetry = MEUP_server(EARTH_IP, EARTH_RECEIVE_PORT, archive=archive)
+            Commands = MEUP_client(EARTH_IP, EARTH_COMMAND_PORT, LUNAR_IP, LUNAR_RECEIVE_PORT)
+
+            # Create and start telemetry thread
+            t_thread = threading.Thread(target=telemetry_thread, args=(Telemetry,), daemon=True)
+            t_thread.start()
+            threads.append(t_thread)
+            # PRINT ORANGE
+            print("\033[38;5;214m[EARTH] Telemetry thread started\033[0m")
 
         # Create and start the command thread
         c_thread = threading.Thread(target=command_thread, args=(Commands,), daemon=True)
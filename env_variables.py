@@ -16,6 +16,12 @@ LUNAR_FRIEND_IP = "127.0.0.1"
 LUNAR_FRIEND_SCANNING_PORT = 5005 
 LUNAR_IP_RANGE = ["172.20.10.9", "172.20.10.8", "172.20.10.7", "172.20.10.6","172.20.10.5", "172.20.10.4", "172.20.10.3", "172.20.10.2", "172.20.10.1", LUNAR_FRIEND_IP] 
 LUNAR_PORT_RANGE = [LUNAR_SR_PORT, LUNAR_FRIEND_SCANNING_PORT]
+# entries of LUNAR_IP_RANGE may also be CIDR ranges, e.g. "172.20.10.0/24"
+SCAN_TIMEOUT = 1 # seconds to wait for all scan replies (whole sweep, not per target)
+PEER_TTL = 300 # seconds a responding peer is trusted before it is probed again
+PEER_DEAD_TTL = 90 # seconds before a silent target is probed again
+PEER_TRADE_TTL = 300 # seconds a peer's trade answer (y/n) is reused
+PEER_DIRECTORY_SIZE = 1024 # max peers remembered (least recently used evicted)
 
 
 
@@ -25,13 +31,79 @@ LATENCY_JITTER_FACTOR = 0.1 # Variation in travel time
 PACKET_LOSS_PROBABILITY = 0.1
 PACKET_LOSS_FACTOR = 0.1
 BER = 0.05
+CHANNEL_QUEUE_LIMIT = 10000 # max datagrams held in the channel at once
+CHANNEL_SEED = None # set an int to make channel decisions reproducible
+CHANNEL_TRACE_PATH = None # e.g. "channel_{program}.trace" -> record / replay every channel decision ({program} = earth, lunar, ...)
+CHANNEL_TRACE_MODE = "record" # "record" a new trace or "replay" an earlier one
 
 BANDWIDTH_LIMIT = 1024  # Bytes/second (simulating limited bandwidth)
+BANDWIDTH_BURST = 2048  # Bytes that may leave back to back before shaping kicks in
+BANDWIDTH_SHAPING = False  # enforce BANDWIDTH_LIMIT with a token bucket per link (slower sends, backpressure)
+LINK_QUEUE_LIMIT = 32  # datagrams waiting for bandwidth before senders get backpressure
 PACKET_SIZE_LIMIT = 256  # Max payload size in bytes
 
 # if UDP
 MAX_RETRIES = 3 
+WINDOW_SIZE = 8 # max packets in flight (selective repeat)
+ACK_TIMEOUT = 5 # initial retransmission timeout (s) before a destination's RTT is measured
+RTO_MIN = 0.2 # adaptive timeout bounds (s): SRTT + 4 * RTTVAR, doubled on every timeout
+RTO_MAX = 60
+DUPLICATE_WINDOW = 1024 # packet IDs remembered per stream for duplicate detection
+DUPLICATE_MAX_STREAMS = 4096 # senders tracked by a server (least recently used evicted)
+DUPLICATE_RESTART_RUN = 3 # increasing IDs behind the window, in a row, that mean the sender restarted
+COMMAND_WINDOW = 4 # Earth commands in flight at once (the rest queue up in order)
+COMMAND_QUEUE_LIMIT = 32 # commands a rover holds before it stops ACKing (Earth then retransmits)
+COMMAND_REORDER_TIMEOUT = 5 # seconds a rover waits for a missing command before skipping it
+COMMAND_SETTLE = 0.5 # seconds a sender's first command is held so commands reordered in flight still run in order
+FEC_GROUP_SIZE = 0 # telemetry packets per XOR parity packet (4 -> 25% redundancy), 0 = FEC off
+FEC_RECOVERY_WINDOW = 256 # recent frames / parity groups a server keeps per stream for rebuilding
 
 # sending data 
 DATA_DELAY = 30
-SCANNING_DELAY = 45
\ No newline at end of file
+SAMPLE_DELAY = 3 # seconds between sensor readings
+TELEMETRY_BATCHING = False # send readings as batch packets (type 3, one header/ACK per batch) -> Earth must parse them
+TELEMETRY_COMPACT = False # batches use the delta + varint encoding (type 5, about twice the readings per packet)
+SCANNING_DELAY = 45
+
+# telemetry archive (Earth): memory-mapped segments of fixed 24-byte records
+TELEMETRY_ARCHIVE_PATH = "telemetry_archive" # directory, None = do not archive
+ARCHIVE_SEGMENT_RECORDS = 65536 # readings per segment file (1.5 MiB)
+ARCHIVE_MAX_SEGMENTS = 64 # oldest segment deleted beyond this (0 = keep everything)
+ARCHIVE_MAX_RUNS = 16 # sorted runs per segment (late readings add one per query) before it is rewritten as one
+
+# logging (meup_log): per-packet tracing is DEBUG -> set a subsystem to "INFO" (or "OFF") to silence it
+LOG_LEVELS = {"CHANNEL": "DEBUG", "SERVER": "DEBUG", "CLIENT": "DEBUG", "ROVER": "DEBUG", "SCANNER": "DEBUG"}
+LOG_OUTPUT = "console" # "console", "jsonl" or "binary"
+LOG_PATH = None # file for jsonl / binary output (jsonl goes to stdout if None)
+LOG_QUEUE_SIZE = 10000 # records buffered for the sink thread before new ones are dropped
+
+# metrics (meup_metrics): JSON snapshots on http://127.0.0.1:<port>/metrics and/or a periodic file dump
+METRICS_ENABLED = True
+EARTH_METRICS_PORT = 5104 # None -> no HTTP endpoint
+LUNAR_METRICS_PORT = 5204
+METRICS_DUMP_PATH = None # e.g. "metrics_{node}.json" -> rewritten every METRICS_DUMP_INTERVAL
+METRICS_DUMP_INTERVAL = 10 # seconds
+
+# single-socket nodes (MEUP_endpoint): one port per node, datagrams routed to streams -> both nodes must enable it
+MULTIPLEX_ENDPOINT = False
+LUNAR_ENDPOINT_PORT = LUNAR_SR_PORT # commands, telemetry and scans all on the port other rovers scan
+STREAM_QUEUE_LIMIT = 1024 # datagrams buffered per stream before new ones are dropped
+
+# receive path (receive_engine): selector wakeups drain every ready datagram into preallocated buffers
+RECEIVE_ENGINE = True # False -> one blocking recvfrom() per datagram
+RECEIVE_BATCH = 64 # datagrams drained per socket per wakeup
+RECEIVE_BUFFER_SIZE = 2048 # bytes per preallocated buffer (largest datagram accepted)
+SOCKET_RCVBUF = 1 << 21 # requested SO_RCVBUF in bytes (None = kernel default, capped by net.core.rmem_max)
+SOCKET_SNDBUF = None # requested SO_SNDBUF in bytes
+
+# multi-process ground station (Earth): workers share EARTH_RECEIVE_PORT with SO_REUSEPORT
+GROUND_WORKERS = 1 # > 1 -> earth.py runs a GroundStation with this many receive processes
+GROUND_FLUSH_INTERVAL = 0.2 # seconds between a worker's batches to the aggregator
+GROUND_FLUSH_READINGS = 512 # readings that trigger an early batch
+
+# fleet load generator (fleet.py): virtual rovers sharing a few sockets on one event loop
+FLEET_FIRST_ID = 10000 # rover IDs (the src_port of their packets) start here
+FLEET_SOCKETS = 4 # UDP sockets the virtual rovers share
+
+# discrete-event simulation (simulation.py): whole topology on a virtual clock, datagrams in memory
+SIMULATION_SEED = 1234 # seeds the channel and the simulated readings
@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+from lunar_packet import LunarParityPacket, xor_frames
+from sequence_window import SEQUENCE_MODULO, seq_diff
+from env_variables import FEC_GROUP_SIZE, FEC_RECOVERY_WINDOW, DUPLICATE_MAX_STREAMS
+
+# Forward error correction for telemetry: one XOR parity packet after every `group_size` packets
+#   > the receiver rebuilds a single lost or corrupted packet of a group without waiting a round trip
+#   > redundancy = 1 / group_size extra packets; group_size 0 turns FEC off
+#   > groups are runs of consecutive packet IDs, so the parity header only names the first ID and the count
+
+
+class FecEncoder:
+    """Groups first transmissions to one destination and emits a parity frame per full group."""
+
+    def __init__(self, src_port, dest_port, group_size=FEC_GROUP_SIZE):
+        self.src_port = src_port
+        self.dest_port = dest_port
+        self.group_size = group_size
+        self.first_id = None
+        self.frames = []
+
+    def add(self, packet_id, frame):
+        """Record a first transmission, returns a parity frame to send when the group is complete."""
+        if self.group_size < 2:
+            return None
+        if self.frames and packet_id != (self.first_id + len(self.frames)) % SEQUENCE_MODULO:
+            self.frames = []  # gap in the IDs (e.g. another sender used the sequence) -> start a new group
+        if not self.frames:
+            self.first_id = packet_id
+        self.frames.append(frame)
+        if len(self.frames) < self.group_size:
+            return None
+        return self.flush()
+
+    def flush(self):
+        """Parity frame for the packets grouped so far (None if fewer than two)."""
+        frames, self.frames = self.frames, []
+        if len(frames) < 2:
+            return None
+        return LunarParityPacket(self.src_port, self.dest_port, self.first_id, frames).build()
+
+
+class _FecStream:
+    """Recent frames and pending parity groups of one sender."""
+
+    __slots__ = ("frames", "groups")
+
+    def __init__(self):
+        self.frames = OrderedDict()  # packet_id -> frame, last FEC_RECOVERY_WINDOW kept
+        self.groups = OrderedDict()  # first_id -> (count, length_xor, payload) not yet complete
+
+    def remember(self, packet_id, frame, window):
+        self.frames[packet_id] = frame
+        while len(self.frames) > window:
+            self.frames.popitem(last=False)
+
+    def recover(self, first_id):
+        """Rebuild the group's only missing frame: [(packet_id, frame)] or []."""
+        count, length_xor, payload = self.groups[first_id]
+        members = [(first_id + i) % SEQUENCE_MODULO for i in range(count)]
+        missing = [packet_id for packet_id in members if packet_id not in self.frames]
+        if len(missing) > 1:
+            return []  # two or more gone -> only a retransmit helps
+        del self.groups[first_id]
+        if not missing:
+            return []
+        present = [self.frames[packet_id] for packet_id in members if packet_id in self.frames]
+        length = length_xor
+        for frame in present:
+            length ^= len(frame)
+        if length > len(payload) or any(len(frame) > len(payload) for frame in present):
+            return []  # inconsistent group (e.g. IDs reused) -> leave it to retransmission
+        frame = xor_frames(present + [payload], len(payload))[:length]
+        return [(missing[0], frame)]
+
+
+class FecDecoder:
+    """Per-stream FEC state on the receiving side (streams = sender address + src_port, LRU evicted)."""
+
+    def __init__(self, window=FEC_RECOVERY_WINDOW, max_streams=DUPLICATE_MAX_STREAMS):
+        self.window = window
+        self.max_streams = max_streams
+        self.streams = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _stream(self, stream):
+        state = self.streams.get(stream)
+        if state is None:
+            state = self.streams[stream] = _FecStream()
+            if len(self.streams) > self.max_streams:
+                self.streams.popitem(last=False)
+        else:
+            self.streams.move_to_end(stream)
+        return state
+
+    def add_frame(self, stream, packet_id, frame):
+        """Store a valid data frame, returns frames of its group that became recoverable."""
+        with self.lock:
+            state = self._stream(stream)
+            if packet_id in state.frames:
+                return []
+            state.remember(packet_id, frame, self.window)
+            for first_id, (count, _, _) in list(state.groups.items()):
+                if 0 <= seq_diff(packet_id, first_id) < count:
+                    return state.recover(first_id)
+            return []
+
+    def add_parity(self, stream, parity):
+        """Store a parsed parity packet, returns [(packet_id, frame)] rebuilt from it."""
+        with self.lock:
+            state = self._stream(stream)
+            first_id = parity["packet_id"]
+            if first_id in state.groups:
+                return []
+            state.groups[first_id] = (parity["count"], parity["length_xor"], parity["payload"])
+            while len(state.groups) > self.window:
+                state.groups.popitem(last=False)
+            return state.recover(first_id)
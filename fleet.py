@@ -0,0 +1,161 @@
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import meup_log
+import channel_simulation as channel
+from lunar_packet import LunarPacket, pack_system_status
+from MEUP_async import open_client, open_server
+from benchmark import PROFILES, percentiles
+from env_variables import EARTH_IP, EARTH_RECEIVE_PORT, FLEET_FIRST_ID, FLEET_SOCKETS
+
+# Fleet load generator: many virtual rovers in one process, on one event loop
+#   > python fleet.py --rovers 500 --rate 200 --duration 20               (drive the Earth server in env_variables)
+#   > python fleet.py --local --rovers 500 --sweep 100,200,400,800,1600   (find where an in-process server saturates)
+#   > a rover's ID is the src_port of its packets, so the server keeps one duplicate / FEC stream per rover
+#   > rovers share a few sockets (MEUP_async clients); packet IDs come from the socket's sequence, so ACKs stay unique
+#   > the load is open loop: reports leave on schedule even if earlier ones are still waiting for ACKs
+#   > with --local the server shares the loop (and core) with the rovers: use it to compare changes, not as capacity
+
+
+class VirtualRover:
+    """One simulated rover: telemetry every `interval` seconds, sent like MEUP_async_client.send_data."""
+
+    def __init__(self, rover_id, client, interval, rng):
+        self.rover_id = rover_id
+        self.client = client  # shared MEUP_async_client (socket)
+        self.interval = interval
+        self.rng = rng
+        self.temperature = rng.uniform(-150, 130)
+        self.battery = rng.uniform(50, 100)
+
+    def build_report(self):
+        """Temperature + system status packets, both tagged with this rover's ID."""
+        client = self.client
+        self.temperature += self.rng.uniform(-0.5, 0.5)
+        self.battery = max(10.0, self.battery - self.rng.uniform(0, 0.05))
+        sys_temp = self.rng.uniform(-40, 80)
+        return [
+            LunarPacket(src_port=self.rover_id, dest_port=client.server_port, packet_id=client.next_packet_id(),
+                        packet_type=0, data=round(self.temperature, 2)),
+            LunarPacket(src_port=self.rover_id, dest_port=client.server_port, packet_id=client.next_packet_id(),
+                        packet_type=1, data=pack_system_status(round(self.battery, 2), round(sys_temp, 2))),
+        ]
+
+    async def run(self, stats, stop_at):
+        """Send a report every interval (random phase) until stop_at (loop time)."""
+        loop = asyncio.get_running_loop()
+        address = (self.client.server_ip, self.client.server_port)
+        next_at = loop.time() + self.rng.uniform(0, self.interval)
+        tasks = []
+        while next_at < stop_at:
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            tasks.append(asyncio.ensure_future(stats.report(self.client, self.build_report(), address)))
+            next_at += self.interval
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+class FleetStats:
+    """Counts and ACK latencies of one fleet run."""
+
+    def __init__(self):
+        self.reports = 0
+        self.packets = 0
+        self.acked = 0
+        self.latencies = []  # seconds from a report leaving to its last ACK
+
+    async def report(self, client, packets, address):
+        start = time.perf_counter()
+        self.reports += 1
+        self.packets += len(packets)
+        acked = await client.send_window(packets, address)
+        self.acked += len(acked)
+        if len(acked) == len(packets):
+            self.latencies.append(time.perf_counter() - start)
+
+    def summary(self, offered, duration, seconds):
+        """seconds includes waiting for the last ACKs after the duration of sending."""
+        return {"offered_reports_per_sec": offered, "reports": self.reports, "packets": self.packets,
+                "acked": self.acked, "lost": self.packets - self.acked, "duration": duration, "seconds": seconds,
+                "acked_per_sec": self.acked / seconds, "latency": percentiles(self.latencies)}
+
+
+async def run_fleet(server, rovers, sockets, rate, duration, seed=1234, first_id=FLEET_FIRST_ID):
+    """Drive server with `rovers` rovers sending `rate` reports/s in total, return a summary."""
+    rng = random.Random(seed)
+    clients = [await open_client("0.0.0.0", 0, server[0], server[1]) for _ in range(sockets)]
+    loop = asyncio.get_running_loop()
+    interval = rovers / rate  # each rover's own period
+    fleet = [VirtualRover(first_id + index, clients[index % sockets], interval, random.Random(rng.random()))
+             for index in range(rovers)]
+    stats = FleetStats()
+    start = loop.time()
+    try:
+        await asyncio.gather(*(rover.run(stats, start + duration) for rover in fleet))
+    finally:
+        for client in clients:
+            client.close()
+    return stats.summary(rate, duration, loop.time() - start)
+
+
+def saturated(result, fraction=0.95):
+    """The server stopped keeping up: packets given up on, or the run took much longer than its duration."""
+    return result["lost"] > 0 or result["duration"] < fraction * result["seconds"]
+
+
+async def main_async(args):
+    server = (args.server_ip, args.server_port)
+    if args.local:
+        local = await open_server("127.0.0.1", 0, "data")
+        server = local.transport.get_extra_info("sockname")[:2]
+    results = []
+    for rate in args.rates:
+        result = await run_fleet(server, args.rovers, args.sockets, rate, args.duration, args.seed)
+        results.append(result)
+        latency = result["latency"]
+        print(f"rate {rate:>8.1f} reports/s  acked {result['acked_per_sec']:>9.1f} packets/s  lost {result['lost']:>6}"
+              f"  p50 {latency.get('p50', float('nan')) * 1000:>8.1f} ms  p99 {latency.get('p99', float('nan')) * 1000:>8.1f} ms",
+              file=sys.stderr)
+        if saturated(result):
+            print(f"saturated at {rate} reports/s ({rate * 2} packets/s)", file=sys.stderr)
+            if args.sweep:
+                break
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a fleet of rovers against an Earth telemetry server")
+    parser.add_argument("--rovers", type=int, default=200, help="virtual rovers (IDs from FLEET_FIRST_ID)")
+    parser.add_argument("--sockets", type=int, default=FLEET_SOCKETS, help="UDP sockets the rovers share")
+    parser.add_argument("--rate", type=float, default=50, help="aggregate reports/s (2 packets each)")
+    parser.add_argument("--sweep", help="comma separated rates, run in turn until the server saturates")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    parser.add_argument("--server", default=f"{EARTH_IP}:{EARTH_RECEIVE_PORT}", help="target ip:port")
+    parser.add_argument("--local", action="store_true", help="start a MEUP_async data server in this process")
+    parser.add_argument("--profile", default="zero", choices=list(PROFILES), help="channel profile")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+    args.server_ip, port = args.server.rsplit(":", 1)
+    args.server_port = int(port)
+    args.rates = [float(rate) for rate in args.sweep.split(",")] if args.sweep else [args.rate]
+
+    for subsystem in meup_log.SUBSYSTEMS:
+        meup_log.set_level(subsystem, "OFF")
+    channel.set_channel(channel.ChannelModel(seed=args.seed, **PROFILES[args.profile]["model"]))
+    results = asyncio.run(main_async(args))
+    text = json.dumps({"rovers": args.rovers, "sockets": args.sockets, "profile": args.profile, "results": results},
+                      indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as stream:
+            stream.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import time
+import queue
+import socket
+import multiprocessing
+from env_variables import GROUND_WORKERS, GROUND_FLUSH_INTERVAL, GROUND_FLUSH_READINGS, LOG_LEVELS
+import meup_log
+from MEUP_server import MEUP_server
+from receive_engine import ReceiveEngine, tune_socket
+from meup_log import get_logger, ORANGE
+from meup_metrics import metrics
+
+log = get_logger("SERVER")
+
+# Multi-process Earth ground station
+#   > N worker processes bind the same UDP port with SO_REUSEPORT; the kernel hashes each rover's address onto one
+#     worker, so a worker's duplicate / FEC / ACK state always sees the whole stream of the rovers it owns
+#   > workers parse, deduplicate and ACK on their own core and ship new readings to the aggregator in batches
+#   > the aggregator (parent process) owns the telemetry archive and merges the workers' metrics: counters and
+#     histograms (per-peer RTTs) add up, gauges (queue depths) are served per worker as "<gauge>.worker<index>"
+#   > workers are spawned, not forked: the parent's channel scheduler and logging threads stay out of them
+
+HAS_REUSEPORT = hasattr(socket, "SO_REUSEPORT")
+
+
+def reuseport_socket(ip, port):
+    """UDP socket bound with SO_REUSEPORT, so several processes can share (ip, port)."""
+    sock = tune_socket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((ip, port))
+    return sock
+
+
+class _ReadingBatch:
+    """Stands in for the worker's TelemetryArchive: collects new readings until they are shipped."""
+
+    def __init__(self):
+        self.readings = []  # (timestamp, reading_type, value, packet_id, src_port)
+        self.sent_counters = {}  # counters already shipped to the aggregator
+        self.sent_histograms = {}  # histogram states already shipped
+        self.sent_gauges = {}
+        self.next_flush = time.monotonic() + GROUND_FLUSH_INTERVAL
+
+    def append(self, timestamp, reading_type, value, packet_id=0, src_port=0):
+        self.readings.append((timestamp, reading_type, value, packet_id, src_port))
+
+    def due(self):
+        return len(self.readings) >= GROUND_FLUSH_READINGS or time.monotonic() >= self.next_flush
+
+    def flush(self, results, index):
+        """Ship collected readings and metric changes (the queue is bounded: if full, keep them for next time)."""
+        self.next_flush = time.monotonic() + GROUND_FLUSH_INTERVAL
+        snapshot = metrics.snapshot()
+        counters = snapshot["counters"]
+        deltas = {name: value - self.sent_counters.get(name, 0) for name, value in counters.items()
+                  if value != self.sent_counters.get(name, 0)}
+        histograms = metrics.histogram_states()
+        histogram_deltas = {}
+        for name, series in histograms.items():
+            for label, (counts, count, total, max_value) in series.items():
+                sent = self.sent_histograms.get(name, {}).get(label)
+                if sent is not None:
+                    if count == sent[1]:
+                        continue
+                    counts = [now - before for now, before in zip(counts, sent[0])]
+                    count, total = count - sent[1], total - sent[2]
+                histogram_deltas.setdefault(name, {})[label] = (counts, count, total, max_value)
+        gauges = {name: value for name, value in snapshot["gauges"].items() if value != self.sent_gauges.get(name)}
+        if not self.readings and not deltas and not histogram_deltas and not gauges:
+            return
+        try:
+            results.put_nowait((index, self.readings, deltas, histogram_deltas, gauges))
+        except queue.Full:
+            return
+        self.readings = []
+        self.sent_counters = counters
+        self.sent_histograms = histograms
+        self.sent_gauges.update(gauges)
+
+
+def _worker(index, ip, port, results, stop, levels):
+    """Worker process: receive, parse, deduplicate and ACK on its own share of the port."""
+    meup_log.setup(levels=levels)
+    sock = reuseport_socket(ip, port)
+    batch = _ReadingBatch()
+    server = MEUP_server(ip, port, archive=batch, sock=sock)
+    engine = ReceiveEngine()
+    engine.register(sock, server.handle_frame)
+    log.info("[GROUND] Worker %s receiving on UDP %s:%s", index, ip, port, extra=ORANGE)
+    try:
+        while not stop.is_set():
+            engine.poll(GROUND_FLUSH_INTERVAL)
+            if batch.due():
+                batch.flush(results, index)
+        batch.flush(results, index)
+    finally:
+        sock.close()
+
+
+class GroundStation:
+    """Earth telemetry receiver sharded over worker processes; run() aggregates their results."""
+
+    def __init__(self, ip="127.0.0.1", port=5101, workers=GROUND_WORKERS, archive=None, levels=LOG_LEVELS):
+        if not HAS_REUSEPORT:
+            raise OSError("SO_REUSEPORT is not available on this platform")
+        self.ip = ip
+        self.port = port
+        self.workers = workers
+        self.archive = archive  # optional TelemetryArchive, written by the aggregator only
+        self.levels = levels
+        context = multiprocessing.get_context("spawn")
+        self.results = context.Queue(maxsize=workers * 64)
+        self.stop_event = context.Event()
+        self.processes = [context.Process(target=_worker, name=f"GroundWorker-{index}",
+                                          args=(index, ip, port, self.results, self.stop_event, levels), daemon=True)
+                          for index in range(workers)]
+        self.readings = [0] * workers  # new readings per worker (how evenly the kernel spreads rovers)
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        log.info("[GROUND] %s workers sharing UDP %s:%s", self.workers, self.ip, self.port, extra=ORANGE)
+        return self
+
+    def aggregate(self, timeout=None):
+        """Merge one batch from a worker, False if none arrived within timeout."""
+        try:
+            index, readings, deltas, histograms, gauges = self.results.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        self.readings[index] += len(readings)
+        if self.archive is not None:
+            for reading in readings:
+                self.archive.append(*reading)
+        for name, delta in deltas.items():
+            metrics.inc(name, delta)
+        for name, series in histograms.items():
+            for label, state in series.items():
+                metrics.merge_histogram(name, label, *state)
+        for name, value in gauges.items():
+            metrics.set_gauge(f"{name}.worker{index}", value)
+        metrics.inc("ground_readings", len(readings))
+        return True
+
+    def run(self):
+        """Aggregate until close() (or until every worker has exited)."""
+        while not self.stop_event.is_set():
+            if not self.aggregate(0.5) and not any(process.is_alive() for process in self.processes):
+                return
+
+    def close(self, timeout=5):
+        """Stop the workers, merging their last batches (a worker cannot exit while its queue writes are pending)."""
+        self.stop_event.set()
+        deadline = time.monotonic() + timeout
+        while any(process.is_alive() for process in self.processes) and time.monotonic() < deadline:
+            self.aggregate(0.1)
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        while self.aggregate(0):
+            pass
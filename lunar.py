@@ -1,8 +1,11 @@
 import time
 import threading
 from env_variables import *
+import meup_metrics
 from MEUP_client import MEUP_client
 from MEUP_server import MEUP_server
+from MEUP_endpoint import MEUP_endpoint, STREAM_TELEMETRY, STREAM_COMMANDS, is_scan_request
+from peer_directory import PeerDirectory
 
 
 def telemetry_thread(client: MEUP_client):
@@ -40,18 +43,46 @@ def receive_scanning_thread(server: MEUP_server):
         print(f"[RECEIVE - LUNAR SCANNING ERROR] {e}")
 
 
+def open_endpoint(peers):
+    """All lunar roles on one socket: commands and scan requests are handled by the endpoint's receive thread."""
+    endpoint = MEUP_endpoint(LUNAR_IP, LUNAR_ENDPOINT_PORT)
+    send_telemetry = MEUP_client(LUNAR_IP, LUNAR_ENDPOINT_PORT, EARTH_IP, EARTH_RECEIVE_PORT,
+                                 sock=endpoint.register(STREAM_TELEMETRY))
+    receive_commands = MEUP_server(LUNAR_IP, LUNAR_ENDPOINT_PORT, sock=endpoint.register(STREAM_COMMANDS))
+    receive_commands.UDP_SOCKET.serve(receive_commands.handle_command)
+    # scans and trades stay unframed so other teams' rovers can still talk to us
+    receive_scans = MEUP_server(LUNAR_IP, LUNAR_ENDPOINT_PORT, peer_directory=peers,
+                                sock=endpoint.register(accepts=is_scan_request))
+    receive_scans.UDP_SOCKET.serve(receive_scans.handle_scan)
+    send_scans = MEUP_client(LUNAR_IP, LUNAR_ENDPOINT_PORT, LUNAR_IP, LUNAR_ENDPOINT_PORT, peer_directory=peers,
+                             sock=endpoint.register())
+    endpoint.start()
+    return endpoint, send_telemetry, send_scans
+
+
 if __name__ == "__main__":
     threads = []
+    Endpoint = None
     SendTelemetry = None
     ReceiveCommands = None
     ReceiveScans = None
     SendScans = None
     try:
-        # UDP socket
-        SendTelemetry = MEUP_client(LUNAR_IP, LUNAR_SEND_PORT, EARTH_IP, EARTH_RECEIVE_PORT)
-        ReceiveCommands = MEUP_server(LUNAR_IP, LUNAR_RECEIVE_PORT)
-        ReceiveScans = MEUP_server(LUNAR_IP, LUNAR_SR_PORT)
-        SendScans = MEUP_client(LUNAR_IP, LUNAR_SS_PORT, LUNAR_IP, LUNAR_SR_PORT)
+        if METRICS_ENABLED:
+            # counters, RTT histograms and queue depths on http://127.0.0.1:LUNAR_METRICS_PORT/metrics
+            meup_metrics.start(LUNAR_METRICS_PORT, METRICS_DUMP_PATH and METRICS_DUMP_PATH.format(node="lunar"))
+        # scanner and scan server share what they learn about peers
+        peers = PeerDirectory()
+        if MULTIPLEX_ENDPOINT:
+            # one UDP socket: the endpoint's thread serves commands and scans, no receive threads of our own
+            Endpoint, SendTelemetry, SendScans = open_endpoint(peers)
+            print(f"\033[95m[LUNAR] Endpoint on UDP port {LUNAR_ENDPOINT_PORT} (commands, telemetry, scans)\033[0m")
+        else:
+            # UDP socket
+            SendTelemetry = MEUP_client(LUNAR_IP, LUNAR_SEND_PORT, EARTH_IP, EARTH_RECEIVE_PORT)
+            ReceiveCommands = MEUP_server(LUNAR_IP, LUNAR_RECEIVE_PORT)
+            ReceiveScans = MEUP_server(LUNAR_IP, LUNAR_SR_PORT, peer_directory=peers)
+            SendScans = MEUP_client(LUNAR_IP, LUNAR_SS_PORT, LUNAR_IP, LUNAR_SR_PORT, peer_directory=peers)
 
         # Create and start scanning threads
         ss_thread = threading.Thread(target=send_scanning_thread, args=(SendScans,), daemon=True) 
@@ -60,11 +91,12 @@ if __name__ == "__main__":
         # PRINT YELLOW
         print("\033[93m[LUNAR] SEND - scanning thread started.\033[0m")
 
-        sr_thread = threading.Thread(target=receive_scanning_thread, args=(ReceiveScans,), daemon=True) 
-        sr_thread.start()
-        threads.append(sr_thread)
-        # PRINT YELLOW
-        print("\033[93m[LUNAR] RECEIVE - scanning thread started.\033[0m")
+        if ReceiveScans is not None:
+            sr_thread = threading.Thread(target=receive_scanning_thread, args=(ReceiveScans,), daemon=True) 
+            sr_thread.start()
+            threads.append(sr_thread)
+            # PRINT YELLOW
+            print("\033[93m[LUNAR] RECEIVE - scanning thread started.\033[0m")
 
         # Create and start telemetry thread
         t_thread = threading.Thread(target=telemetry_thread, args=(SendTelemetry,), daemon=True)
@@ -74,11 +106,12 @@ if __name__ == "__main__":
         print("\033[38;5;214m[LUNAR] Telemetry thread started\033[0m")
 
         # Create and start the command thread
-        c_thread = threading.Thread(target=command_thread, args=(ReceiveCommands,), daemon=True)
-        c_thread.start()
-        threads.append(c_thread)
-        # PRINT PURPLE
-        print("\033[95m[LUNAR] Command thread started\033[0m")
+        if ReceiveCommands is not None:
+            c_thread = threading.Thread(target=command_thread, args=(ReceiveCommands,), daemon=True)
+            c_thread.start()
+            threads.append(c_thread)
+            # PRINT PURPLE
+            print("\033[95m[LUNAR] Command thread started\033[0m")
 
         # Keep the main thread alive to allow both threads to run
         while True:
@@ -1,69 +1,117 @@
 import struct
-import time
+import meup_clock
+
+try:
+    import numpy as np  # optional, only needed for LunarPacket.decode_many
+except ImportError:
+    np = None
+from meup_log import get_logger
+
+log = get_logger("SERVER")  # codec errors show up on the receive path
+
+PACKET_FORMAT = '!HHHH H B f Q'  # UDP-like header, packet_id, type, data, timestamp
+PACKET_STRUCT = struct.Struct(PACKET_FORMAT)  # compiled once, shared by every packet
+PACKET_SIZE = PACKET_STRUCT.size  # 23 bytes
+CHECKSUM_STRUCT = struct.Struct('!H')
+CHECKSUM_OFFSET = 6
+FRAME_BYTES_STRUCT = struct.Struct(f'{PACKET_SIZE}B')  # a frame's bytes as ints (checksums over a memoryview)
+
+# Same layout as PACKET_FORMAT, for decoding many frames at once without copying
+PACKET_DTYPE = None if np is None else np.dtype({
+    "names": ["src_port", "dest_port", "packet_len", "checksum", "packet_id", "packet_type", "data", "timestamp"],
+    "formats": [">u2", ">u2", ">u2", ">u2", ">u2", "u1", ">f4", ">u8"],
+    "offsets": [0, 2, 4, 6, 8, 10, 11, 15],
+    "itemsize": PACKET_SIZE,
+})
+
+
+def frame_checksum(frame):
+    """Checksum of a frame as if its checksum field were 0 (no re-pack needed)."""
+    return (sum(frame) - frame[CHECKSUM_OFFSET] - frame[CHECKSUM_OFFSET + 1]) % 65536
+
 
 class LunarPacket:
     """Class for constructing and parsing packets: data types into bytes."""
 
+    __slots__ = ("src_port", "dest_port", "packet_len", "checksum",
+                 "packet_id", "packet_type", "data", "timestamp")
+
     def __init__(self, src_port, dest_port, packet_id, packet_type, data):
         # UDP header
         self.src_port = src_port       
         self.dest_port = dest_port     
-        self.packet_len = 23         
+        self.packet_len = PACKET_SIZE
         self.checksum = 0              
         # Payload (Data)
         self.packet_id = packet_id     
         self.packet_type = packet_type # 1 Byte (0=temp, 1=system)
         self.data = float(data)     
-        self.timestamp = int(time.time()) 
+        self.timestamp = int(meup_clock.time()) 
+
+    def build_into(self, buffer, offset=0):
+        """Write the packet (with checksum) into a reusable buffer at offset, return bytes written."""
+        PACKET_STRUCT.pack_into(buffer, offset,
+                                self.src_port, self.dest_port,
+                                self.packet_len, 0,  # placeholder 0 for checksum
+                                self.packet_id, self.packet_type,
+                                self.data, self.timestamp)
+        # packed once: sum the frame as written, then patch the checksum field in place
+        self.checksum = sum(FRAME_BYTES_STRUCT.unpack_from(buffer, offset)) % 65536
+        CHECKSUM_STRUCT.pack_into(buffer, offset + CHECKSUM_OFFSET, self.checksum)
+        return PACKET_SIZE
 
     def build(self):
         """Create a binary representation of the packet, including the UDP-like header."""
-        packet_without_checksum = struct.pack('!HHHH H B f Q', 
-                                              self.src_port, self.dest_port, 
-                                              self.packet_len, 0,   # placeholder 0 for checksum 
-                                              self.packet_id, self.packet_type, 
-                                              self.data, self.timestamp)
-        self.checksum = self.compute_checksum(packet_without_checksum)
-        return struct.pack('!HHHH H B f Q', 
-                           self.src_port, self.dest_port, 
-                           self.packet_len, self.checksum,  # with computed checksum 
-                           self.packet_id, self.packet_type, 
-                           self.data, self.timestamp)
+        frame = bytearray(PACKET_STRUCT.pack(self.src_port, self.dest_port,
+                                             self.packet_len, 0,  # placeholder 0 for checksum
+                                             self.packet_id, self.packet_type,
+                                             self.data, self.timestamp))
+        self.checksum = sum(frame) % 65536
+        CHECKSUM_STRUCT.pack_into(frame, CHECKSUM_OFFSET, self.checksum)
+        return bytes(frame)
 
     def compute_checksum(self, packet_data=None):
         """Compute a simple checksum based on the packet content."""
         if packet_data is None:
-            packet_data = struct.pack('!HHHH H B f Q', 
-                                      self.src_port, self.dest_port, 
-                                      self.packet_len, 0,  # placeholder 0 for checksum 
-                                      self.packet_id, self.packet_type, 
-                                      self.data, self.timestamp)
+            packet_data = PACKET_STRUCT.pack(self.src_port, self.dest_port,
+                                             self.packet_len, 0,  # placeholder 0 for checksum
+                                             self.packet_id, self.packet_type,
+                                             self.data, self.timestamp)
         
         return sum(packet_data) % 65536  # 2 Bytes -> biggest 16-bit number = 65536, make sure checksum fits
 
+    @classmethod
+    def from_values(cls, values):
+        """LunarPacket from an unpacked PACKET_STRUCT tuple (no timestamp/float conversion)."""
+        packet = cls.__new__(cls)
+        (packet.src_port, packet.dest_port, packet.packet_len, packet.checksum,
+         packet.packet_id, packet.packet_type, packet.data, packet.timestamp) = values
+        return packet
+
+    @classmethod
+    def decode(cls, data, offset=0):
+        """Decode one frame from data at offset into a LunarPacket, None if checksum fails."""
+        if len(data) - offset < PACKET_SIZE:
+            return None
+        values = PACKET_STRUCT.unpack_from(data, offset)
+        frame = data if offset == 0 and len(data) == PACKET_SIZE else data[offset:offset + PACKET_SIZE]
+        if frame_checksum(frame) != values[3]:
+            return None
+        return cls.from_values(values)
+
     @staticmethod
     def parse(data):
         """Parse a received packet from binary format."""
-        unpacked_data = struct.unpack('!HHHH H B f Q', data)
-
-        src_port = unpacked_data[0]
-        dest_port = unpacked_data[1]
-        packet_len = unpacked_data[2]
-        checksum = unpacked_data[3]
-        packet_id = unpacked_data[4]
-        packet_type = unpacked_data[5]
-        data = unpacked_data[6]
-        timestamp = unpacked_data[7]
+        if len(data) != PACKET_SIZE:
+            log.debug("\n[LUNAR PACKET ERROR] Unexpected packet length %s", len(data))
+            return None
+        (src_port, dest_port, packet_len, checksum,
+         packet_id, packet_type, data_value, timestamp) = PACKET_STRUCT.unpack_from(data)
 
         # Recalculate checksum 
-        packet_data = struct.pack('!HHHH H B f Q', 
-                                  src_port, dest_port, 
-                                  packet_len, 0, # placeholder 0 for checksum 
-                                  packet_id, packet_type, 
-                                  data, timestamp)
-        calculated_checksum = sum(packet_data) % 65536
+        calculated_checksum = frame_checksum(data)
         if calculated_checksum != checksum:
-            print(f"\n[LUNAR PACKET ERROR] Checksum mismatch! Expected: {calculated_checksum}, Got: {checksum}")
+            log.debug("\n[LUNAR PACKET ERROR] Checksum mismatch! Expected: %s, Got: %s", calculated_checksum, checksum)
             return None  # Return None -> exceptoin will be raised in earth.py
 
         return {
@@ -73,6 +121,392 @@ class LunarPacket:
             "checksum": checksum,
             "packet_id": packet_id,
             "packet_type": packet_type,
-            "data": data,
+            "data": data_value,
             "timestamp": timestamp,
         }
+
+    @staticmethod
+    def build_many(packets, buffer=None):
+        """Encode packets back to back into one contiguous buffer (reused if given)."""
+        size = len(packets) * PACKET_SIZE
+        if buffer is None or len(buffer) < size:
+            buffer = bytearray(size)
+        offset = 0
+        for packet in packets:
+            offset += packet.build_into(buffer, offset)
+        return memoryview(buffer)[:size]
+
+    @classmethod
+    def iter_decode(cls, buffer):
+        """Yield a LunarPacket (or None if its checksum fails) for every frame in buffer."""
+        view = memoryview(buffer)  # no copy: fields and checksum bytes are unpacked straight from the buffer
+        view = view[:len(view) - len(view) % PACKET_SIZE]
+        for values, octets in zip(PACKET_STRUCT.iter_unpack(view), FRAME_BYTES_STRUCT.iter_unpack(view)):
+            checksum = (sum(octets) - octets[CHECKSUM_OFFSET] - octets[CHECKSUM_OFFSET + 1]) % 65536
+            yield cls.from_values(values) if checksum == values[3] else None
+
+    @staticmethod
+    def decode_many(buffer):
+        """Decode a contiguous buffer of frames into a NumPy structured array.
+
+            > The array is a view on buffer (no copy); returns (frames, valid) where valid is the checksum mask
+        """
+        if np is None:
+            raise ImportError("LunarPacket.decode_many needs numpy; use iter_decode instead")
+        count = len(buffer) // PACKET_SIZE
+        frames = np.frombuffer(buffer, dtype=PACKET_DTYPE, count=count)
+        raw = np.frombuffer(buffer, dtype=np.uint8, count=count * PACKET_SIZE).reshape(count, PACKET_SIZE)
+        sums = raw.sum(axis=1, dtype=np.uint32) - raw[:, CHECKSUM_OFFSET] - raw[:, CHECKSUM_OFFSET + 1]
+        valid = (sums % 65536) == frames["checksum"]
+        return frames, valid
+
+
+# System status in one float32 (single and batch packets): battery and system temperature at 0.1 resolution
+#   > value = battery_tenths * 2048 + (sys_temp + 40) tenths -> at most 2 049 200 < 2^24, exact in a float32
+STATUS_TEMP_OFFSET = 40
+STATUS_TEMP_STEPS = 2048
+
+
+def pack_system_status(battery, sys_temp):
+    """Battery % (0-100) and system temperature (-40..80 C) as one exactly representable float."""
+    battery_tenths = min(1000, max(0, round(battery * 10)))
+    temp_tenths = min(STATUS_TEMP_STEPS - 1, max(0, round((sys_temp + STATUS_TEMP_OFFSET) * 10)))
+    return float(battery_tenths * STATUS_TEMP_STEPS + temp_tenths)
+
+
+def unpack_system_status(value):
+    """Inverse of pack_system_status: (battery %, system temperature C)."""
+    battery_tenths, temp_tenths = divmod(int(round(value)), STATUS_TEMP_STEPS)
+    return battery_tenths / 10, temp_tenths / 10 - STATUS_TEMP_OFFSET
+
+
+BATCH_PACKET_TYPE = 3
+BATCH_HEADER_FORMAT = '!HHHH H B B Q'  # UDP-like header, packet_id, type, reading count, base timestamp
+BATCH_READING_FORMAT = '!B H f'        # reading type, seconds after base timestamp, value
+BATCH_HEADER_STRUCT = struct.Struct(BATCH_HEADER_FORMAT)
+BATCH_READING_STRUCT = struct.Struct(BATCH_READING_FORMAT)
+BATCH_HEADER_SIZE = BATCH_HEADER_STRUCT.size
+BATCH_READING_SIZE = BATCH_READING_STRUCT.size
+BATCH_MAX_OFFSET = 0xFFFF  # seconds a reading may lie after the base timestamp (16-bit offset)
+
+
+class LunarBatchPacket:
+    """Variable-length packet carrying many typed readings under one header and checksum."""
+
+    def __init__(self, src_port, dest_port, packet_id, readings=None, timestamp=None):
+        self.src_port = src_port
+        self.dest_port = dest_port
+        self.checksum = 0
+        self.packet_id = packet_id
+        self.packet_type = BATCH_PACKET_TYPE
+        self.timestamp = int(meup_clock.time()) if timestamp is None else int(timestamp)
+        self.readings = []  # (reading type, timestamp, value)
+        for reading in readings or []:
+            self.add_reading(*reading)
+
+    @staticmethod
+    def max_readings(size_limit):
+        """Number of readings that fit in a datagram of size_limit bytes."""
+        return min(255, (size_limit - BATCH_HEADER_SIZE) // BATCH_READING_SIZE)
+
+    @property
+    def packet_len(self):
+        return BATCH_HEADER_SIZE + len(self.readings) * BATCH_READING_SIZE
+
+    def is_full(self, size_limit):
+        return len(self.readings) >= self.max_readings(size_limit)
+
+    def covers(self, timestamp):
+        """True if a reading at timestamp is within BATCH_MAX_OFFSET of the base timestamp (else: new batch)."""
+        return int(timestamp) - self.timestamp <= BATCH_MAX_OFFSET
+
+    def add_reading(self, reading_type, value, timestamp=None):
+        """Append a reading (0=temp, 1=system), timestamp defaults to the packet timestamp."""
+        timestamp = self.timestamp if timestamp is None else int(timestamp)
+        if len(self.readings) >= 255:
+            raise ValueError("batch packet holds at most 255 readings")
+        if not self.covers(timestamp):
+            raise ValueError(f"reading {timestamp - self.timestamp}s after the batch timestamp, at most "
+                             f"{BATCH_MAX_OFFSET}s fit")
+        self.readings.append((reading_type, max(timestamp, self.timestamp), float(value)))
+
+    def build(self):
+        """Create a binary representation of the batch, including the UDP-like header."""
+        buffer = bytearray(self.packet_len)
+        BATCH_HEADER_STRUCT.pack_into(buffer, 0,
+                                      self.src_port, self.dest_port,
+                                      self.packet_len, 0,  # placeholder 0 for checksum
+                                      self.packet_id, self.packet_type,
+                                      len(self.readings), self.timestamp)
+        offset = BATCH_HEADER_SIZE
+        for reading_type, timestamp, value in self.readings:
+            BATCH_READING_STRUCT.pack_into(buffer, offset, reading_type, timestamp - self.timestamp, value)
+            offset += BATCH_READING_SIZE
+        self.checksum = sum(buffer) % 65536
+        CHECKSUM_STRUCT.pack_into(buffer, CHECKSUM_OFFSET, self.checksum)
+        return bytes(buffer)
+
+    @staticmethod
+    def parse(data):
+        """Parse a received batch packet from binary format, None if invalid."""
+        if len(data) < BATCH_HEADER_SIZE:
+            return None
+        (src_port, dest_port, packet_len, checksum,
+         packet_id, packet_type, count, timestamp) = BATCH_HEADER_STRUCT.unpack_from(data)
+        if packet_type != BATCH_PACKET_TYPE or packet_len != len(data) or \
+                packet_len != BATCH_HEADER_SIZE + count * BATCH_READING_SIZE:
+            log.debug("\n[LUNAR PACKET ERROR] Malformed batch packet (%s bytes)", len(data))
+            return None
+
+        # checksum covers the frame with the checksum field zeroed
+        calculated_checksum = frame_checksum(data)
+        if calculated_checksum != checksum:
+            log.debug("\n[LUNAR PACKET ERROR] Checksum mismatch! Expected: %s, Got: %s", calculated_checksum, checksum)
+            return None
+
+        readings = []
+        for reading_type, offset, value in BATCH_READING_STRUCT.iter_unpack(memoryview(data)[BATCH_HEADER_SIZE:]):
+            readings.append((reading_type, timestamp + offset, value))
+        return {
+            "src_port": src_port,
+            "dest_port": dest_port,
+            "packet_len": packet_len,
+            "checksum": checksum,
+            "packet_id": packet_id,
+            "packet_type": packet_type,
+            "timestamp": timestamp,
+            "readings": readings,
+        }
+
+
+def packet_type_of(data):
+    """Packet type byte of a raw LunarPacket / LunarBatchPacket frame, None if too short."""
+    if len(data) < 11:
+        return None
+    return data[10]
+
+
+PARITY_PACKET_TYPE = 4
+PARITY_HEADER_FORMAT = '!HHHH H B B H'  # UDP-like header, first packet_id of the group, type, group size, XOR of frame lengths
+PARITY_HEADER_STRUCT = struct.Struct(PARITY_HEADER_FORMAT)
+PARITY_HEADER_SIZE = PARITY_HEADER_STRUCT.size
+
+
+def xor_frames(frames, size):
+    """XOR of frames, each zero-padded to size bytes."""
+    accumulator = 0
+    for frame in frames:
+        accumulator ^= int.from_bytes(frame, "big") << ((size - len(frame)) * 8)
+    return accumulator.to_bytes(size, "big")
+
+
+class LunarParityPacket:
+    """XOR parity over `count` consecutive packet IDs (FEC): any one missing frame of the group can be rebuilt.
+
+        > payload = XOR of the member frames zero-padded to the longest one
+        > length_xor = XOR of the member frame lengths (recovers the missing frame's length)
+        > never ACKed or retransmitted
+    """
+
+    def __init__(self, src_port, dest_port, first_id, frames):
+        self.src_port = src_port
+        self.dest_port = dest_port
+        self.checksum = 0
+        self.packet_id = first_id
+        self.packet_type = PARITY_PACKET_TYPE
+        self.count = len(frames)
+        self.length_xor = 0
+        for frame in frames:
+            self.length_xor ^= len(frame)
+        self.payload = xor_frames(frames, max(len(frame) for frame in frames))
+
+    @property
+    def packet_len(self):
+        return PARITY_HEADER_SIZE + len(self.payload)
+
+    def build(self):
+        """Create a binary representation of the parity packet, including the UDP-like header."""
+        buffer = bytearray(self.packet_len)
+        PARITY_HEADER_STRUCT.pack_into(buffer, 0,
+                                       self.src_port, self.dest_port,
+                                       self.packet_len, 0,  # placeholder 0 for checksum
+                                       self.packet_id, self.packet_type,
+                                       self.count, self.length_xor)
+        buffer[PARITY_HEADER_SIZE:] = self.payload
+        self.checksum = sum(buffer) % 65536
+        CHECKSUM_STRUCT.pack_into(buffer, CHECKSUM_OFFSET, self.checksum)
+        return bytes(buffer)
+
+    @staticmethod
+    def parse(data):
+        """Parse a received parity packet from binary format, None if invalid."""
+        if len(data) < PARITY_HEADER_SIZE:
+            return None
+        (src_port, dest_port, packet_len, checksum,
+         first_id, packet_type, count, length_xor) = PARITY_HEADER_STRUCT.unpack_from(data)
+        if packet_type != PARITY_PACKET_TYPE or packet_len != len(data) or count == 0:
+            log.debug("\n[LUNAR PACKET ERROR] Malformed parity packet (%s bytes)", len(data))
+            return None
+        calculated_checksum = frame_checksum(data)
+        if calculated_checksum != checksum:
+            log.debug("\n[LUNAR PACKET ERROR] Checksum mismatch! Expected: %s, Got: %s", calculated_checksum, checksum)
+            return None
+        return {
+            "src_port": src_port,
+            "dest_port": dest_port,
+            "packet_len": packet_len,
+            "checksum": checksum,
+            "packet_id": first_id,
+            "packet_type": packet_type,
+            "count": count,
+            "length_xor": length_xor,
+            "payload": bytes(data[PARITY_HEADER_SIZE:]),
+        }
+
+
+# Reading types inside batch / compact packets (continue the packet type numbering so the two never clash)
+READING_TEMPERATURE = 0
+READING_SYSTEM_STATUS = 1  # pack_system_status float
+READING_BATTERY = 6  # percent
+READING_SYSTEM_TEMP = 7  # Celsius
+
+COMPACT_PACKET_TYPE = 5
+COMPACT_HEADER_FORMAT = '!HHHH H B B Q'  # UDP-like header, packet_id, type, reading count, keyframe timestamp (ms)
+COMPACT_HEADER_STRUCT = struct.Struct(COMPACT_HEADER_FORMAT)
+COMPACT_HEADER_SIZE = COMPACT_HEADER_STRUCT.size
+COMPACT_SCALE = 100  # values are sent as fixed point hundredths
+
+
+def zigzag(n):
+    """Signed -> unsigned so small negative numbers stay small (0, -1, 1, -2 ... -> 0, 1, 2, 3 ...)."""
+    return n << 1 if n >= 0 else ((-n) << 1) - 1
+
+
+def unzigzag(z):
+    return (z >> 1) ^ -(z & 1)
+
+
+def write_varint(buffer, n):
+    """Append unsigned n as a LEB128 varint (7 bits per byte, high bit = more)."""
+    while n >= 0x80:
+        buffer.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buffer.append(n)
+
+
+def read_varint(data, offset):
+    """Decode a varint at offset, returns (value, next offset); IndexError if truncated."""
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+        if shift > 63:
+            raise ValueError("varint too long")
+
+
+class LunarCompactPacket:
+    """Telemetry packet with delta-coded readings: most readings cost 3-4 bytes instead of 7.
+
+        > the header carries an absolute timestamp (ms) and every reading type starts from an absolute value,
+          so each packet is a keyframe: a lost packet never breaks the decoding of the next one
+        > per reading: type byte, zigzag varint delta-of-delta of the timestamp (ms),
+          zigzag varint delta of the fixed-point value against the previous reading of the same type
+    """
+
+    def __init__(self, src_port, dest_port, packet_id, timestamp=None):
+        self.src_port = src_port
+        self.dest_port = dest_port
+        self.checksum = 0
+        self.packet_id = packet_id
+        self.packet_type = COMPACT_PACKET_TYPE
+        self.timestamp_ms = int(round((meup_clock.time() if timestamp is None else timestamp) * 1000))
+        self.readings = []  # (reading type, timestamp, value) as they will decode
+        self.body = bytearray()
+        self.previous_ms = self.timestamp_ms
+        self.previous_delta = 0
+        self.previous_values = {}  # reading type -> last fixed-point value
+
+    @property
+    def packet_len(self):
+        return COMPACT_HEADER_SIZE + len(self.body)
+
+    def add_reading(self, reading_type, value, timestamp=None, size_limit=None):
+        """Append a reading; False (and nothing added) if it would not fit in size_limit bytes."""
+        if len(self.readings) >= 255:
+            return False
+        timestamp_ms = self.previous_ms if timestamp is None else int(round(timestamp * 1000))
+        fixed = int(round(value * COMPACT_SCALE))
+        delta = timestamp_ms - self.previous_ms
+        mark = len(self.body)
+        self.body.append(reading_type)
+        write_varint(self.body, zigzag(delta - self.previous_delta))
+        write_varint(self.body, zigzag(fixed - self.previous_values.get(reading_type, 0)))
+        if size_limit is not None and self.packet_len > size_limit:
+            del self.body[mark:]
+            return False
+        self.previous_ms, self.previous_delta = timestamp_ms, delta
+        self.previous_values[reading_type] = fixed
+        self.readings.append((reading_type, timestamp_ms / 1000, fixed / COMPACT_SCALE))
+        return True
+
+    def build(self):
+        """Create a binary representation of the packet, including the UDP-like header."""
+        buffer = bytearray(COMPACT_HEADER_SIZE)
+        COMPACT_HEADER_STRUCT.pack_into(buffer, 0,
+                                        self.src_port, self.dest_port,
+                                        self.packet_len, 0,  # placeholder 0 for checksum
+                                        self.packet_id, self.packet_type,
+                                        len(self.readings), self.timestamp_ms)
+        buffer += self.body
+        self.checksum = sum(buffer) % 65536
+        CHECKSUM_STRUCT.pack_into(buffer, CHECKSUM_OFFSET, self.checksum)
+        return bytes(buffer)
+
+    @staticmethod
+    def parse(data):
+        """Parse a received compact packet from binary format, None if invalid."""
+        if len(data) < COMPACT_HEADER_SIZE:
+            return None
+        (src_port, dest_port, packet_len, checksum,
+         packet_id, packet_type, count, timestamp_ms) = COMPACT_HEADER_STRUCT.unpack_from(data)
+        if packet_type != COMPACT_PACKET_TYPE or packet_len != len(data):
+            log.debug("\n[LUNAR PACKET ERROR] Malformed compact packet (%s bytes)", len(data))
+            return None
+        calculated_checksum = frame_checksum(data)
+        if calculated_checksum != checksum:
+            log.debug("\n[LUNAR PACKET ERROR] Checksum mismatch! Expected: %s, Got: %s", calculated_checksum, checksum)
+            return None
+
+        readings = []
+        previous_ms, previous_delta, previous_values = timestamp_ms, 0, {}
+        offset = COMPACT_HEADER_SIZE
+        try:
+            for _ in range(count):
+                reading_type = data[offset]
+                dod, offset = read_varint(data, offset + 1)
+                value_delta, offset = read_varint(data, offset)
+                previous_delta += unzigzag(dod)
+                previous_ms += previous_delta
+                fixed = previous_values.get(reading_type, 0) + unzigzag(value_delta)
+                previous_values[reading_type] = fixed
+                readings.append((reading_type, previous_ms / 1000, fixed / COMPACT_SCALE))
+        except (IndexError, ValueError):
+            log.debug("\n[LUNAR PACKET ERROR] Truncated compact packet (%s bytes)", len(data))
+            return None
+        if offset != len(data):
+            log.debug("\n[LUNAR PACKET ERROR] Trailing bytes in compact packet (%s bytes)", len(data))
+            return None
+        return {
+            "src_port": src_port,
+            "dest_port": dest_port,
+            "packet_len": packet_len,
+            "checksum": checksum,
+            "packet_id": packet_id,
+            "packet_type": packet_type,
+            "timestamp": timestamp_ms / 1000,
+            "readings": readings,
+        }
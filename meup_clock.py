@@ -0,0 +1,60 @@
+import time as _time
+import threading
+
+# Clock used by the protocol's timers, channel shaping and packet timestamps
+#   > RealClock by default: time() is wall-clock time (packet timestamps), monotonic() orders deadlines
+#   > simulation.py installs a VirtualClock, advanced by its event loop instead of by the passing of real time
+
+
+class RealClock:
+    """Wall-clock time, the default."""
+
+    def time(self):
+        return _time.time()
+
+    def monotonic(self):
+        return _time.monotonic()
+
+
+class VirtualClock:
+    """Clock that only moves when advanced: monotonic() starts at 0, time() at epoch."""
+
+    def __init__(self, epoch=1_700_000_000.0):
+        self.epoch = epoch
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def time(self):
+        return self.epoch + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        """Move the clock forward (never backwards), returns the new monotonic time."""
+        with self.lock:
+            self.now += max(0.0, seconds)
+            return self.now
+
+
+_clock = RealClock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    """Replace the process-wide clock (RealClock() restores the default)."""
+
+    global _clock
+    _clock = clock
+    return clock
+
+
+def time():
+    return _clock.time()
+
+
+def monotonic():
+    return _clock.monotonic()
@@ -0,0 +1,193 @@
+import socket
+import threading
+import meup_clock
+from collections import deque
+from concurrent.futures import Future
+from env_variables import MAX_RETRIES, COMMAND_WINDOW
+import channel_simulation as channel
+from meup_log import get_logger, PURPLE
+from meup_metrics import metrics
+
+log = get_logger("CLIENT")
+
+# Earth -> rover command protocol
+#   > "CMD <seq> <command>"  answered by  "ACK <seq> <command>"
+#   > seq is the sender's 16-bit packet ID sequence, so a late ACK can never be taken for another command's
+#   > bare "<command>" (old senders) is still accepted and answered with "ACK <command>"
+#   > once executed the rover reports "DONE <seq> <command> <status>" (OK, INTERRUPTED or CANCELLED)
+
+COMMANDS = ("FWD", "BACK", "LEFT", "RIGHT", "STOP")
+
+
+def encode_command(seq, command):
+    return f"CMD {seq} {command}".encode()
+
+
+def parse_command(data):
+    """(seq, command) of a command datagram; seq is None for the bare legacy form."""
+    parts = data.decode(errors="ignore").split()
+    if len(parts) == 3 and parts[0] == "CMD" and parts[1].isdigit():
+        return int(parts[1]), parts[2].upper()
+    if len(parts) == 1:
+        return None, parts[0].upper()
+    return None, None
+
+
+def encode_ack(seq, command):
+    return f"ACK {command}".encode() if seq is None else f"ACK {seq} {command}".encode()
+
+
+def parse_ack(data):
+    """(seq, command) of an "ACK <seq> <command>" datagram, None otherwise."""
+    parts = data.decode(errors="ignore").split()
+    if len(parts) == 3 and parts[0] == "ACK" and parts[1].isdigit():
+        return int(parts[1]), parts[2]
+    return None
+
+
+def encode_done(seq, command, status):
+    return f"DONE {'-' if seq is None else seq} {command} {status}".encode()
+
+
+def parse_done(data):
+    """(seq, command, status) of a "DONE <seq> <command> <status>" datagram (seq None if unnumbered), None otherwise."""
+    parts = data.decode(errors="ignore").split()
+    if len(parts) == 4 and parts[0] == "DONE" and (parts[1].isdigit() or parts[1] == "-"):
+        return (int(parts[1]) if parts[1].isdigit() else None), parts[2], parts[3]
+    return None
+
+
+class CommandSender:
+    """Pipelined, sequence-numbered commands over a MEUP_client's socket.
+
+        > submit() returns a Future (True once ACKed, False after MAX_RETRIES) and never waits for the rover
+        > up to `window` commands are in flight; the rest wait in order in a local queue
+        > one thread owns the socket's receive side: ACKs are matched by seq, timers follow the client's RTO
+        > the rover's completion reports are logged and passed to on_done(seq, command, status)
+    """
+
+    def __init__(self, client, address=None, window=COMMAND_WINDOW, on_done=None):
+        self.client = client
+        self.on_done = on_done
+        self.address = address or (client.server_ip, client.server_port)
+        self.window = window
+        self.waiting = deque()  # (seq, command, future) not sent yet
+        self.in_flight = {}  # seq -> [command, future, sent_at, attempt, timeout]
+        self.lock = threading.RLock()  # futures' callbacks may submit again
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="CommandSender", daemon=True)
+        self.thread.start()
+
+    def submit(self, command, callback=None):
+        """Queue one command; callback(future) runs when it is ACKed or given up."""
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        with self.lock:
+            self.waiting.append((self.client.next_packet_id(), command, future))
+            self._fill()
+        return future
+
+    def submit_plan(self, commands, callback=None):
+        """Queue a sequence of commands (e.g. a movement plan) without waiting between them."""
+        return [self.submit(command, callback) for command in commands]
+
+    def outstanding(self):
+        with self.lock:
+            return len(self.waiting) + len(self.in_flight)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        with self.lock:
+            for _, _, future in self.waiting:
+                future.set_result(False)
+            for entry in self.in_flight.values():
+                entry[1].set_result(False)
+            self.waiting.clear()
+            self.in_flight.clear()
+
+    def _transmit(self, seq, command):
+        try:
+            channel.send_w_delay_loss(self.client.UDP_SOCKET, encode_command(seq, command), self.address, seq)
+            metrics.inc("commands_sent")
+            return True
+        except channel.LinkBackpressure:
+            return False
+        except socket.error as e:
+            log.error("[ERROR] Command failed: %s", e, extra=PURPLE)
+            return False
+
+    def _fill(self):
+        """Move waiting commands into the window (lock held)."""
+        while self.waiting and len(self.in_flight) < self.window:
+            seq, command, future = self.waiting[0]
+            if not self._transmit(seq, command):
+                return  # link full -> the timer loop tries again
+            self.waiting.popleft()
+            self.in_flight[seq] = [command, future, meup_clock.monotonic(), 1, self.client.rtt.rto(self.address)]
+            log.info("[EARTH] Sent %s (seq %s)", command, seq, extra=PURPLE)
+
+    def _expire(self):
+        """Resend or give up on commands whose timer ran out (lock held)."""
+        now = meup_clock.monotonic()
+        for seq, entry in list(self.in_flight.items()):
+            command, future, sent_at, attempt, timeout = entry
+            if now - sent_at < timeout:
+                continue
+            if attempt >= MAX_RETRIES:
+                log.info("[EARTH] No ACK for %s (seq %s) - command may have been lost", command, seq, extra=PURPLE)
+                metrics.inc("ack_timeouts")
+                del self.in_flight[seq]
+                future.set_result(False)
+                continue
+            # a resend refused by backpressure is tried again on the next pass -> count the timeout once it leaves
+            if self._transmit(seq, command):
+                metrics.inc("ack_timeouts")
+                metrics.inc("retransmits")
+                rto = self.client.rtt.rto(self.address)
+                if timeout >= rto:
+                    rto = self.client.rtt.backoff(self.address)
+                entry[2:] = [meup_clock.monotonic(), attempt + 1, rto]
+
+    def _acked(self, seq, command):
+        with self.lock:
+            entry = self.in_flight.pop(seq, None)
+            if entry is not None:
+                if entry[3] == 1:
+                    self.client.rtt.sample(self.address, meup_clock.monotonic() - entry[2])  # Karn's rule
+                self._fill()
+        if entry is None:
+            return  # duplicate or late ACK for a command already settled
+        log.info("[ACK] Received: ACK %s %s", seq, command, extra=PURPLE)
+        entry[1].set_result(True)
+
+    def _done(self, seq, command, status):
+        log.info("[ROVER DONE] %s (seq %s) -> %s", command, seq, status, extra=PURPLE)
+        if self.on_done is not None:
+            self.on_done(seq, command, status)
+
+    def _run(self):
+        while self.running and self.client.UDP_SOCKET:
+            with self.lock:
+                self._expire()
+                self._fill()
+                deadlines = [entry[2] + entry[4] for entry in self.in_flight.values()]
+            # short poll while idle so close() and newly queued commands are noticed
+            timeout = min(deadlines) - meup_clock.monotonic() if deadlines else 0.1
+            try:
+                self.client.UDP_SOCKET.settimeout(min(0.1, max(0.01, timeout)))
+                data, _ = self.client.UDP_SOCKET.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break  # socket closed
+            ack = parse_ack(data)
+            if ack is None:
+                done = parse_done(data)
+                if done is not None:
+                    self._done(*done)
+                    continue
+                log.debug("[EARTH] Unexpected reply: %s", data, extra=PURPLE)
+                continue
+            self._acked(*ack)
@@ -0,0 +1,167 @@
+import sys
+import json
+import queue
+import struct
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from env_variables import LOG_LEVELS, LOG_OUTPUT, LOG_PATH, LOG_QUEUE_SIZE
+
+# Non-blocking logging for the MEUP hot paths
+#   > callers only build a LogRecord and put it on a bounded queue (full queue -> record dropped, counted)
+#   > one sink thread formats and writes: coloured console, JSON lines, or binary records
+#   > levels per subsystem: per-packet tracing is DEBUG, set a subsystem to INFO to switch it off
+
+SUBSYSTEMS = ("CHANNEL", "SERVER", "CLIENT", "ROVER", "SCANNER")
+
+# console colours, passed as extra=... so structured outputs stay clean
+ORANGE = {"color": "\033[38;5;214m"}  # telemetry
+PURPLE = {"color": "\033[95m"}  # commands / movement
+YELLOW = {"color": "\033[93m"}  # scanning
+BLUE = {"color": "\033[34m"}  # trading
+RESET = "\033[0m"
+
+BINARY_RECORD = struct.Struct('!dBBH')  # created, subsystem index, level, message length (+ utf-8 message)
+
+_listener = None
+_handler = None
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks and leaves formatting to the sink thread."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record  # args are merged on the sink thread, not the caller's
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Message as printed before, wrapped in its colour."""
+
+    def format(self, record):
+        message = record.getMessage()
+        color = getattr(record, "color", None)
+        return f"{color}{message}{RESET}" if color else message
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record):
+        return json.dumps({
+            "time": record.created,
+            "subsystem": record.name.rsplit(".", 1)[-1],
+            "level": record.levelname,
+            "message": record.getMessage().strip(),
+        })
+
+
+class BinaryHandler(logging.Handler):
+    """Compact fixed-header records: BINARY_RECORD followed by the utf-8 message."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.stream = open(path, "ab")
+
+    def emit(self, record):
+        try:
+            subsystem = record.name.rsplit(".", 1)[-1]
+            index = SUBSYSTEMS.index(subsystem) if subsystem in SUBSYSTEMS else 255
+            message = record.getMessage().strip().encode("utf-8")[:65535]
+            self.stream.write(BINARY_RECORD.pack(record.created, index, record.levelno, len(message)) + message)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+        super().close()
+
+
+def read_binary_log(path):
+    """Yield (created, subsystem, level, message) from a binary log file."""
+    with open(path, "rb") as stream:
+        data = stream.read()
+    offset = 0
+    while offset + BINARY_RECORD.size <= len(data):
+        created, index, level, length = BINARY_RECORD.unpack_from(data, offset)
+        offset += BINARY_RECORD.size
+        message = data[offset:offset + length].decode("utf-8", errors="replace")
+        offset += length
+        yield created, SUBSYSTEMS[index] if index < len(SUBSYSTEMS) else "?", logging.getLevelName(level), message
+
+
+def _sink(output, path):
+    if output == "jsonl":
+        handler = logging.FileHandler(path) if path else logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonLinesFormatter())
+    elif output == "binary":
+        handler = BinaryHandler(path or "meup_log.bin")
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(ConsoleFormatter())
+    return handler
+
+
+def setup(output=LOG_OUTPUT, path=LOG_PATH, levels=LOG_LEVELS, queue_size=LOG_QUEUE_SIZE):
+    """(Re)start the sink thread; output is "console", "jsonl" or "binary"."""
+    global _listener, _handler
+    shutdown()
+    root = logging.getLogger("meup")
+    root.propagate = False
+    root.setLevel(logging.DEBUG)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _handler = DroppingQueueHandler(queue.Queue(queue_size))
+    root.addHandler(_handler)
+    _listener = QueueListener(_handler.queue, _sink(output, path))
+    _listener.start()
+    for subsystem in SUBSYSTEMS:
+        set_level(subsystem, levels.get(subsystem, "DEBUG"))
+
+
+def shutdown():
+    """Flush queued records and stop the sink thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            try:
+                handler.flush()
+            except ValueError:
+                pass  # console stream already closed (e.g. replaced by a test runner's capture)
+            if not isinstance(handler, logging.StreamHandler) or isinstance(handler, logging.FileHandler):
+                handler.close()
+        _listener = None
+
+
+def set_level(subsystem, level):
+    """Change one subsystem's level at runtime ("DEBUG", "INFO", ..., or "OFF")."""
+    logger = logging.getLogger(f"meup.{subsystem}")
+    logger.setLevel(logging.CRITICAL + 1 if level == "OFF" else level)
+
+
+def dropped():
+    """Records discarded because the queue was full."""
+    return _handler.dropped if _handler is not None else 0
+
+
+def get_logger(subsystem):
+    """Logger for one subsystem (CHANNEL, SERVER, CLIENT, ROVER, SCANNER)."""
+    if _listener is None:
+        setup()
+    return logging.getLogger(f"meup.{subsystem}")
+
+
+atexit.register(shutdown)
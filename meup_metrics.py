@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from env_variables import METRICS_DUMP_INTERVAL
+
+# RTT buckets (seconds): sub-ms LAN peers up to the deep-space link and retries
+RTT_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 2.5, 3.0, 4.0, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram (counts per upper bound, last bucket = overflow)."""
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds=RTT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def state(self):
+        """(counts, count, total, max): raw state, e.g. to ship to another process's registry."""
+        return list(self.counts), self.count, self.total, self.max
+
+    def merge(self, counts, count, total, max_value):
+        """Add the samples of another histogram with the same bounds (a state() or a difference of two)."""
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, counts)]
+        self.count += count
+        self.total += total
+        self.max = max(self.max, max_value)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "buckets": {str(bound): count for bound, count in zip(self.bounds, self.counts) if count},
+            "overflow": self.counts[-1],
+        }
+
+
+class MetricsRegistry:
+    """Counters, labelled histograms and gauges updated on the MEUP hot paths."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}  # name -> int
+        self.histograms = {}  # name -> {label -> Histogram}
+        self.gauges = {}  # name -> value or zero-argument callable
+
+    def inc(self, name, amount=1):
+        """Add amount to counter name."""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value, label=""):
+        """Record value in histogram name (one histogram per label, e.g. per peer)."""
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(label)
+            if histogram is None:
+                histogram = series[label] = Histogram()
+            histogram.observe(value)
+
+    def histogram_states(self):
+        """{name: {label: Histogram.state()}} of every histogram."""
+        with self.lock:
+            return {name: {label: h.state() for label, h in series.items()} for name, series in self.histograms.items()}
+
+    def merge_histogram(self, name, label, counts, count, total, max_value):
+        """Add samples recorded elsewhere (e.g. by a ground station worker) to histogram name / label."""
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(label)
+            if histogram is None:
+                histogram = series[label] = Histogram()
+            histogram.merge(counts, count, total, max_value)
+
+    def set_gauge(self, name, value):
+        """Set gauge name to a value, or to a callable read at snapshot time."""
+        with self.lock:
+            self.gauges[name] = value
+
+    def counter(self, name):
+        with self.lock:
+            return self.counters.get(name, 0)
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """Plain-dict view of every metric (JSON serialisable)."""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {name: {label: h.snapshot() for label, h in series.items()}
+                          for name, series in self.histograms.items()}
+            gauges = dict(self.gauges)
+        for name, value in gauges.items():
+            try:
+                gauges[name] = value() if callable(value) else value
+            except Exception as e:
+                gauges[name] = f"error: {e}"
+        return {
+            "time": time.time(),
+            "uptime": time.time() - self.started,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+
+    def dump(self, path):
+        """Write a snapshot to path atomically."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as stream:
+            json.dump(self.snapshot(), stream, indent=2, sort_keys=True)
+        os.replace(temp_path, path)
+
+    def start_file_dump(self, path, interval=METRICS_DUMP_INTERVAL):
+        """Dump a snapshot to path every interval seconds (daemon thread)."""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump(path)
+                except OSError:
+                    pass
+        thread = threading.Thread(target=run, name="MetricsDump", daemon=True)
+        thread.start()
+        return thread
+
+    def start_http(self, port, host="127.0.0.1"):
+        """Serve snapshots as JSON on http://host:port/metrics (daemon thread)."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(registry.snapshot(), sort_keys=True).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep request logs off the console
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever, name="MetricsHTTP", daemon=True)
+        thread.start()
+        return server
+
+
+metrics = MetricsRegistry()
+
+
+def start(http_port=None, dump_path=None, interval=METRICS_DUMP_INTERVAL):
+    """Expose the process-wide registry over HTTP and/or a periodic file dump."""
+    server = metrics.start_http(http_port) if http_port else None
+    if dump_path:
+        metrics.start_file_dump(dump_path, interval)
+    return server
@@ -0,0 +1,117 @@
+import threading
+import meup_clock
+from collections import OrderedDict
+from env_variables import PEER_TTL, PEER_DEAD_TTL, PEER_TRADE_TTL, PEER_DIRECTORY_SIZE
+
+
+class PeerEntry:
+    """What we know about one (ip, port) scan target."""
+
+    __slots__ = ("alive", "checked_at", "rtt", "trade", "trade_at")
+
+    def __init__(self):
+        self.alive = False
+        self.checked_at = None  # monotonic time of the last probe result (or passive sighting)
+        self.rtt = None  # smoothed probe round trip, seconds
+        self.trade = None  # last trade answer: True (y), False (n), None (unknown)
+        self.trade_at = None
+
+
+class PeerDirectory:
+    """Reachable peers, their trade decisions and RTTs, with TTLs and LRU eviction.
+
+        > Only entries older than their TTL are re-probed / re-asked by the scanner
+        > Dead targets are cached for PEER_DEAD_TTL so they are not probed every cycle either
+        > Shared between a node's scanner (MEUP_client) and scan server (MEUP_server)
+    """
+
+    def __init__(self, ttl=PEER_TTL, dead_ttl=PEER_DEAD_TTL, trade_ttl=PEER_TRADE_TTL, max_peers=PEER_DIRECTORY_SIZE):
+        self.ttl = ttl
+        self.dead_ttl = dead_ttl
+        self.trade_ttl = trade_ttl
+        self.max_peers = max_peers
+        self.peers = OrderedDict()  # (ip, port) -> PeerEntry, least recently used first
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.peers)
+
+    def _entry(self, target):
+        entry = self.peers.get(target)
+        if entry is None:
+            entry = self.peers[target] = PeerEntry()
+            while len(self.peers) > self.max_peers:
+                self.peers.popitem(last=False)  # evict least recently used
+        else:
+            self.peers.move_to_end(target)
+        return entry
+
+    def stale(self, targets, now=None):
+        """Targets whose liveness is unknown or expired and should be probed."""
+        now = meup_clock.monotonic() if now is None else now
+        with self.lock:
+            result = []
+            for target in targets:
+                entry = self.peers.get(target)
+                if entry is None or entry.checked_at is None or \
+                        now - entry.checked_at >= (self.ttl if entry.alive else self.dead_ttl):
+                    result.append(target)
+            return result
+
+    def needs_trade_decision(self, targets, now=None):
+        """Live targets whose trade answer is unknown or expired."""
+        now = meup_clock.monotonic() if now is None else now
+        with self.lock:
+            return [target for target in targets
+                    if target in self.peers and (self.peers[target].trade is None
+                                                 or now - self.peers[target].trade_at >= self.trade_ttl)]
+
+    def record_probe(self, target, alive, rtt=None, now=None):
+        """Store a probe result (rtt in seconds when it answered)."""
+        now = meup_clock.monotonic() if now is None else now
+        with self.lock:
+            entry = self._entry(target)
+            entry.alive = alive
+            entry.checked_at = now
+            if not alive:
+                entry.trade = None
+            elif rtt is not None:
+                entry.rtt = rtt if entry.rtt is None else 0.875 * entry.rtt + 0.125 * rtt
+
+    def record_trade(self, target, accepted, now=None):
+        """Store a peer's answer to the trade question."""
+        now = meup_clock.monotonic() if now is None else now
+        with self.lock:
+            entry = self._entry(target)
+            entry.trade = accepted
+            entry.trade_at = now
+
+    def observe(self, ip, now=None):
+        """Passive sighting (a scan or trade from ip): refresh known live entries on that host."""
+        now = meup_clock.monotonic() if now is None else now
+        with self.lock:
+            for target, entry in self.peers.items():
+                if target[0] == ip and entry.alive:
+                    entry.checked_at = now
+
+    def invalidate(self, target):
+        """Forget a peer (e.g. a trade went unanswered) so the next scan re-probes it."""
+        with self.lock:
+            self.peers.pop(target, None)
+
+    def is_alive(self, target):
+        with self.lock:
+            entry = self.peers.get(target)
+            return entry is not None and entry.alive
+
+    def traders(self, targets):
+        """Live targets that last accepted a trade."""
+        with self.lock:
+            return [target for target in targets
+                    if target in self.peers and self.peers[target].alive and self.peers[target].trade]
+
+    def rtt(self, target):
+        """Smoothed probe RTT of target, None if never measured."""
+        with self.lock:
+            entry = self.peers.get(target)
+            return None if entry is None else entry.rtt
@@ -0,0 +1,144 @@
+import sys
+import socket
+import selectors
+import struct
+from env_variables import RECEIVE_BATCH, RECEIVE_BUFFER_SIZE, SOCKET_RCVBUF, SOCKET_SNDBUF
+from meup_log import get_logger
+from meup_metrics import metrics
+
+log = get_logger("SERVER")
+
+# High-rate receive path
+#   > one selector (epoll on Linux) waits on every registered socket
+#   > each wakeup drains up to `batch` datagrams per ready socket with recvmsg_into / recvfrom_into into
+#     preallocated buffers (no allocation per datagram until the handler gets its bytes), then dispatches them
+#   > on Linux SO_RXQ_OVFL makes the kernel attach its drop counter to datagrams -> metrics "kernel_drops"
+
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40)
+DROP_COUNTER = struct.Struct("=I")
+HAS_RXQ_OVFL = sys.platform.startswith("linux") and hasattr(socket.socket, "recvmsg_into")
+ANCILLARY_SIZE = socket.CMSG_SPACE(DROP_COUNTER.size) if HAS_RXQ_OVFL else 0
+
+
+def tune_socket(sock, rcvbuf=SOCKET_RCVBUF, sndbuf=SOCKET_SNDBUF):
+    """Request kernel buffer sizes (None = keep the default); the kernel may cap them (net.core.rmem_max)."""
+    for option, size in ((socket.SO_RCVBUF, rcvbuf), (socket.SO_SNDBUF, sndbuf)):
+        if size is None:
+            continue
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, option, size)
+        except OSError as e:
+            log.debug("[SERVER] Socket buffer %s not set: %s", size, e)
+    return sock
+
+
+class _Receiver:
+    """Preallocated buffers and drop counter of one registered socket."""
+
+    __slots__ = ("sock", "handler", "views", "overflow", "dropped")
+
+    def __init__(self, sock, handler, batch, buffer_size):
+        self.sock = sock
+        self.handler = handler
+        self.views = [memoryview(bytearray(buffer_size)) for _ in range(batch)]
+        self.overflow = False
+        self.dropped = 0  # kernel counter at the last datagram
+        if HAS_RXQ_OVFL:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self.overflow = True
+            except OSError:
+                pass
+
+    def drain(self):
+        """Read up to one batch of ready datagrams: [(view, address)], views into the preallocated buffers.
+
+            > recvmsg_into is several times slower than recvfrom_into, so only the first datagram of a wakeup
+              is read with it; the kernel's drop counter is cumulative, so once per wakeup loses nothing
+        """
+        received = []
+        views = self.views
+        if self.overflow:
+            try:
+                length, ancdata, _, address = self.sock.recvmsg_into([views[0]], ANCILLARY_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return received
+            except ConnectionResetError:
+                pass
+            else:
+                if ancdata:
+                    # only attached once the socket has dropped something
+                    self.count_drops(DROP_COUNTER.unpack_from(ancdata[-1][2])[0])
+                received.append((views[0][:length], address))
+            views = views[1:]
+        receive = self.sock.recvfrom_into
+        for view in views:
+            try:
+                length, address = receive(view)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                continue  # ICMP port unreachable from an earlier send on some platforms
+            received.append((view[:length], address))
+        return received
+
+    def count_drops(self, counter):
+        dropped = (counter - self.dropped) & 0xFFFFFFFF
+        if dropped:
+            self.dropped = counter
+            metrics.inc("kernel_drops", dropped)
+            log.debug("[SERVER] Kernel dropped %s datagram(s) (receive buffer full)", dropped)
+
+
+class ReceiveEngine:
+    """Selector-driven receive loop for one or more sockets: register(sock, handler) then run()."""
+
+    def __init__(self, batch=RECEIVE_BATCH, buffer_size=RECEIVE_BUFFER_SIZE, poll_interval=0.5):
+        self.batch = batch
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval  # how often closed sockets and stop() are noticed
+        self.selector = selectors.DefaultSelector()
+        self.running = False
+
+    def register(self, sock, handler):
+        """handler(data, address) is called for every datagram; data is bytes (the buffers are reused)."""
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ, _Receiver(sock, handler, self.batch, self.buffer_size))
+
+    def unregister(self, sock):
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+
+    def stop(self):
+        self.running = False
+
+    def poll(self, timeout=None):
+        """Wait once for readiness and process every drained datagram, returns how many were handled."""
+        handled = 0
+        for key, _ in self.selector.select(timeout):
+            receiver = key.data
+            handler = receiver.handler
+            received = receiver.drain()
+            for view, address in received:
+                try:
+                    handler(view.tobytes(), address)
+                except Exception as e:
+                    log.error("[ERROR] Failed to receive packet: %s", e)
+            handled += len(received)
+        return handled
+
+    def run(self):
+        """Poll until stop() or until every registered socket has been closed."""
+        self.running = True
+        try:
+            while self.running:
+                for key in list(self.selector.get_map().values()):
+                    if key.fileobj.fileno() == -1:
+                        self.unregister(key.fileobj)
+                if not self.selector.get_map():
+                    return
+                self.poll(self.poll_interval)
+        finally:
+            self.selector.close()
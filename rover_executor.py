@@ -0,0 +1,175 @@
+import meup_clock
+import threading
+from collections import deque
+from env_variables import COMMAND_QUEUE_LIMIT, COMMAND_REORDER_TIMEOUT, COMMAND_SETTLE
+from sequence_window import seq_diff, seq_next
+from meup_log import get_logger, PURPLE
+
+rover_log = get_logger("ROVER")
+
+# completion statuses reported to Earth as "DONE <seq> <command> <status>"
+DONE = "OK"
+INTERRUPTED = "INTERRUPTED"  # cut short by a STOP
+CANCELLED = "CANCELLED"  # still queued when a STOP arrived
+
+
+class CommandQueue:
+    """Bounded queue of ACKed commands, released in sequence order (no locking, no timers of its own).
+
+        > commands are (seq, command, address); seq None (legacy senders) runs in arrival order
+        > a gap (lost or reordered command) is waited for up to reorder_timeout, then skipped
+        > a sender's first command is held for `settle` seconds, as commands sent before it may still arrive
+        > STOP jumps the queue: put() returns the commands it cancelled, late ones issued before it are cancelled too
+    """
+
+    def __init__(self, limit=COMMAND_QUEUE_LIMIT, reorder_timeout=COMMAND_REORDER_TIMEOUT, settle=COMMAND_SETTLE):
+        self.limit = limit
+        self.reorder_timeout = reorder_timeout
+        self.settle = settle
+        self.pending = {}  # seq -> (command, address, arrived_at)
+        self.unordered = deque()  # (None, command, address)
+        self.urgent = deque()  # STOP commands
+        self.expected = None  # next seq to run
+        self.stop_seq = None
+        self.sender = None  # sequence numbers are per sender (Earth's command socket)
+
+    def __len__(self):
+        return len(self.pending) + len(self.unordered) + len(self.urgent)
+
+    def has_room(self):
+        return len(self.pending) + len(self.unordered) < self.limit
+
+    def put(self, seq, command, address=None):
+        """Queue a command, returns the (seq, command, address) entries cancelled by it (None if full)."""
+        if seq is not None and (address != self.sender or self._restarted(seq)):
+            self.sender, self.expected, self.stop_seq = address, None, None  # new sequence
+        if command == "STOP":
+            cancelled = [(s, c, a) for s, (c, a, _) in self.pending.items()] + list(self.unordered)
+            self.pending.clear()
+            self.unordered.clear()
+            if seq is not None:
+                self.stop_seq = seq
+                if self.expected is None or seq_diff(seq, self.expected) >= 0:
+                    self.expected = seq_next(seq)
+            self.urgent.append((seq, command, address))
+            return cancelled
+        if not self.has_room():
+            return None
+        if seq is None:
+            self.unordered.append((None, command, address))
+        elif self.stop_seq is not None and seq_diff(seq, self.stop_seq) < 0:
+            return [(seq, command, address)]  # overtaken by a STOP sent after it
+        else:
+            self.pending[seq] = (command, address, meup_clock.monotonic())
+        return []
+
+    def _restarted(self, seq):
+        """seq is further behind than any reordering allows: the sender restarted with a new random first seq."""
+        reference = self.expected if self.expected is not None else self.stop_seq
+        return reference is not None and seq_diff(seq, reference) < -self.limit
+
+    def get(self):
+        """(entry, wait): the next (seq, command, address) to run, or None and the seconds until one may be ready."""
+        if self.urgent:
+            return self.urgent.popleft(), None
+        if self.unordered:
+            return self.unordered.popleft(), None
+        if not self.pending:
+            return None, None
+        oldest = min(self.pending, key=lambda seq: seq_diff(seq, next(iter(self.pending))))
+        first_arrival = min(arrived for _, _, arrived in self.pending.values())
+        if self.expected is None:
+            wait = first_arrival + self.settle - meup_clock.monotonic()
+            if wait > 0:
+                return None, wait
+            self.expected = oldest
+        for seq in self.pending:
+            if seq == self.expected or seq_diff(seq, self.expected) < 0:  # next in line, or late and behind it
+                return self._take(seq), None
+        # gap: wait for the missing command, unless the oldest waiting one has waited long enough
+        wait = first_arrival + self.reorder_timeout - meup_clock.monotonic()
+        if wait > 0:
+            return None, wait
+        rover_log.info("[ROVER] Command(s) before seq %s never arrived -> skipped", oldest, extra=PURPLE)
+        return self._take(oldest), None
+
+    def _take(self, seq):
+        command, address, _ = self.pending.pop(seq)
+        if seq_diff(seq, self.expected) >= 0:
+            self.expected = seq_next(seq)
+        return seq, command, address
+
+
+class CommandExecutor:
+    """Runs rover commands on a worker thread so the receive loop only parses, ACKs and queues.
+
+        > execute(command, interrupt) does the work; it returns False if interrupt (an Event set by STOP) cut it short
+        > report(seq, command, status, address) is called once per command: OK, INTERRUPTED or CANCELLED
+        > waits out the queue's reorder / settle timers on a real-time condition: under a VirtualClock use
+          MEUP_async_server.run_commands instead (loop timers), as simulation.py does
+    """
+
+    def __init__(self, execute, report=None, queue=None):
+        self.execute = execute
+        self.report = report
+        self.queue = queue or CommandQueue()
+        self.interrupt = threading.Event()
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="CommandExecutor", daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        with self.condition:
+            return len(self.queue)
+
+    def has_room(self):
+        with self.condition:
+            return self.queue.has_room()
+
+    def submit(self, seq, command, address=None):
+        """Queue a command (seq None = run in arrival order), False if the queue is full."""
+        with self.condition:
+            cancelled = self.queue.put(seq, command, address)
+            if cancelled is None:
+                return False
+            if command == "STOP":
+                self.interrupt.set()
+            self.condition.notify()
+        for entry in cancelled:
+            self._report(*entry, CANCELLED)
+        return True
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.interrupt.set()
+            self.condition.notify()
+        self.thread.join()
+
+    def _report(self, seq, command, address, status):
+        rover_log.info("[ROVER] %s (seq %s) -> %s", command, seq, status, extra=PURPLE)
+        if self.report is not None:
+            try:
+                self.report(seq, command, status, address)
+            except Exception as e:
+                rover_log.error("[ROVER] Completion report failed: %s", e, extra=PURPLE)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if not self.running:
+                        return
+                    entry, wait = self.queue.get()
+                    if entry is not None:
+                        break
+                    self.condition.wait(wait)
+                self.interrupt.clear()  # the STOP that set it has already cut the previous command short
+            seq, command, address = entry
+            try:
+                completed = self.execute(command, self.interrupt)
+            except Exception as e:
+                rover_log.error("[ROVER] Command error: %s", e, extra=PURPLE)
+                continue
+            self._report(seq, command, address, DONE if completed is not False else INTERRUPTED)
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+from env_variables import ACK_TIMEOUT, RTO_MIN, RTO_MAX, PEER_DIRECTORY_SIZE
+
+# Jacobson/Karels gains (RFC 6298)
+RTT_ALPHA = 1 / 8
+RTT_BETA = 1 / 4
+RTT_K = 4
+CLOCK_GRANULARITY = 0.01  # seconds
+
+
+class RttEstimator:
+    """Smoothed RTT and retransmission timeout for one destination.
+
+        > sample() only takes RTTs of packets that were never retransmitted (Karn's rule)
+        > backoff() doubles the RTO after a timeout; it stays backed off until the next valid sample
+    """
+
+    __slots__ = ("srtt", "rttvar", "rto")
+
+    def __init__(self, initial_rto=ACK_TIMEOUT):
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial_rto
+
+    def sample(self, rtt):
+        """Fold one round trip (seconds) into SRTT/RTTVAR and recompute the RTO."""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * rtt
+        self.rto = min(RTO_MAX, max(RTO_MIN, self.srtt + max(CLOCK_GRANULARITY, RTT_K * self.rttvar)))
+        return self.rto
+
+    def backoff(self):
+        """Exponential backoff after a retransmission timeout."""
+        self.rto = min(RTO_MAX, self.rto * 2)
+        return self.rto
+
+
+class RttTable:
+    """One RttEstimator per destination address, least recently used destinations evicted."""
+
+    def __init__(self, initial_rto=ACK_TIMEOUT, max_destinations=PEER_DIRECTORY_SIZE):
+        self.initial_rto = initial_rto
+        self.max_destinations = max_destinations
+        self.estimators = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _estimator(self, address):
+        estimator = self.estimators.get(address)
+        if estimator is None:
+            # no seeding from the scanner's probe RTT: probes skip the simulated channel, trades do not
+            estimator = self.estimators[address] = RttEstimator(self.initial_rto)
+            while len(self.estimators) > self.max_destinations:
+                self.estimators.popitem(last=False)
+        else:
+            self.estimators.move_to_end(address)
+        return estimator
+
+    def rto(self, address):
+        """Current retransmission timeout (seconds) for address."""
+        with self.lock:
+            return self._estimator(address).rto
+
+    def sample(self, address, rtt):
+        """Record the RTT of a packet sent exactly once; returns the new RTO."""
+        with self.lock:
+            return self._estimator(address).sample(rtt)
+
+    def backoff(self, address):
+        """Double address's RTO after a timeout; returns the new RTO."""
+        with self.lock:
+            return self._estimator(address).backoff()
+
+    def srtt(self, address):
+        """Smoothed RTT of address, None before the first sample."""
+        with self.lock:
+            estimator = self.estimators.get(address)
+            return None if estimator is None else estimator.srtt
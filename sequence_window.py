@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+from env_variables import DUPLICATE_WINDOW, DUPLICATE_MAX_STREAMS, DUPLICATE_RESTART_RUN
+
+# packet_id is a 16-bit field -> serial number arithmetic mod 2^16 (RFC 1982)
+SEQUENCE_MODULO = 1 << 16
+SEQUENCE_HALF = SEQUENCE_MODULO >> 1
+
+
+def seq_next(seq):
+    """Sequence number after seq (wraps at 2^16)."""
+    return (seq + 1) % SEQUENCE_MODULO
+
+
+def seq_diff(a, b):
+    """Signed distance a - b in serial number arithmetic: > 0 if a is newer than b."""
+    return ((a - b + SEQUENCE_HALF) % SEQUENCE_MODULO) - SEQUENCE_HALF
+
+
+class DuplicateWindow:
+    """Bitmap of the last `size` sequence numbers seen on one stream.
+
+        > bit i set = highest - i already received
+        > O(1) check, constant memory, correct across wraparound
+        > like an RFC 4303 anti-replay window, a seq further back than the window is not accepted: it is a straggler,
+          or the first ID of a sender that restarted with a new random first ID. restart_run distinct, increasing IDs
+          back there in a row (nothing newer in between) are taken as the restarted run and the window starts over
+    """
+
+    __slots__ = ("size", "mask", "highest", "bitmap", "restart_run", "candidate", "run")
+
+    def __init__(self, size=DUPLICATE_WINDOW, restart_run=DUPLICATE_RESTART_RUN):
+        self.size = size
+        self.mask = (1 << size) - 1
+        self.highest = None
+        self.bitmap = 0
+        self.restart_run = restart_run
+        self.candidate = None  # highest ID of the run of IDs behind the window (a possible restart)
+        self.run = 0
+
+    def check_and_mark(self, seq):
+        """True if seq is new (and remember it), False if a duplicate, None if behind the window."""
+        if self.highest is None:
+            self.highest = seq
+            self.bitmap = 1
+            return True
+        distance = seq_diff(seq, self.highest)
+        if distance > 0:
+            # newer than anything seen -> slide the window forward
+            self.bitmap = ((self.bitmap << distance) | 1) & self.mask if distance < self.size else 1
+            self.highest = seq
+            self.candidate = None
+            return True
+        age = -distance
+        if age >= self.size:
+            return self._behind(seq, mark=True)
+        bit = 1 << age
+        if self.bitmap & bit:
+            return False
+        self.bitmap |= bit
+        return True
+
+    def seen(self, seq):
+        """Same answer as check_and_mark (True = already received here), without marking anything."""
+        if self.highest is None:
+            return False
+        age = -seq_diff(seq, self.highest)
+        if age < 0:
+            return False
+        if age >= self.size:
+            return None if self._behind(seq, mark=False) is None else False
+        return bool(self.bitmap >> age & 1)
+
+    def _behind(self, seq, mark):
+        """None for a seq behind the window, unless it completes a restarted run (-> start over, True)."""
+        candidate = self.candidate
+        if candidate is not None and -self.size < seq_diff(seq, candidate) <= 0:
+            return None  # straggler of the run, or a resend of one of its IDs
+        run = self.run + 1 if candidate is not None and seq_diff(seq, candidate) < self.size else 1
+        if run >= self.restart_run:
+            if mark:
+                self.resync(seq)
+            return True
+        if mark:
+            self.candidate, self.run = seq, run
+        return None
+
+    def resync(self, seq):
+        """Start the window over from seq (the sender restarted)."""
+        self.highest = seq
+        self.bitmap = 1
+        self.candidate = None
+        self.run = 0
+        return True
+
+
+class DuplicateFilter:
+    """One DuplicateWindow per stream (e.g. sender address + src_port), least recently used streams evicted."""
+
+    def __init__(self, window=DUPLICATE_WINDOW, max_streams=DUPLICATE_MAX_STREAMS):
+        self.window = window
+        self.max_streams = max_streams
+        self.streams = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.streams)
+
+    def seen(self, stream, seq):
+        """True if seq was already received on stream, None if it is behind the window (as for is_new).
+
+            > checks only: marks nothing and does not refresh the stream
+        """
+        with self.lock:
+            window = self.streams.get(stream)
+            return window is not None and window.seen(seq)
+
+    def is_new(self, stream, seq):
+        """True the first time seq is seen on stream, False for a duplicate, None if it is behind the window.
+
+            > None: do not ACK it; a restarted sender resends it, and the resend counts once its run is recognised
+        """
+        with self.lock:
+            window = self.streams.get(stream)
+            if window is None:
+                window = self.streams[stream] = DuplicateWindow(self.window)
+                if len(self.streams) > self.max_streams:
+                    self.streams.popitem(last=False)
+            else:
+                self.streams.move_to_end(stream)
+            return window.check_and_mark(seq)
@@ -0,0 +1,230 @@
+import sys
+import json
+import time
+import errno
+import random
+import asyncio
+import argparse
+import itertools
+import selectors
+from collections import Counter
+import meup_log
+import meup_clock
+import channel_simulation as channel
+from MEUP_async import open_server, open_client, run_lunar
+from meup_commands import COMMANDS
+from meup_metrics import metrics
+from env_variables import EARTH_IP, EARTH_RECEIVE_PORT, EARTH_COMMAND_PORT, LUNAR_IP, LUNAR_RECEIVE_PORT, \
+    LUNAR_FRIEND_IP, LUNAR_FRIEND_SCANNING_PORT, SIMULATION_SEED
+
+# Discrete-event simulation of the whole Earth / Moon topology
+#   > python simulation.py --hours 2 --commands 60:FWD,75:LEFT,80:STOP
+#   > earth (telemetry server + command client), lunar (run_lunar: telemetry, commands, scans) and the lunar friend's
+#     scan server run as their MEUP_async versions on one VirtualEventLoop
+#   > the loop never sleeps: when nothing is ready it moves the VirtualClock to its next timer, so channel latency,
+#     DATA_DELAY, SCANNING_DELAY, scan timeouts and movements take no real time
+#   > datagrams are handed between VirtualDatagramTransports in memory (unbound addresses -> metrics "sim_unreachable")
+#   > one thread, seeded channel and readings: the same seed gives the same run
+
+
+class VirtualDatagramTransport(asyncio.DatagramTransport):
+    """In-memory UDP transport bound to one address of a VirtualNetwork."""
+
+    def __init__(self, network, loop, protocol, address):
+        super().__init__({"sockname": address})
+        self.network = network
+        self.loop = loop
+        self.protocol = protocol
+        self.address = address
+        self.closing = False
+
+    def sendto(self, data, addr=None):
+        if not self.closing:
+            self.network.send(self.address, bytes(data), addr)
+
+    def receive(self, data, address):
+        if not self.closing:
+            self.protocol.datagram_received(data, address)
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def is_closing(self):
+        return self.closing
+
+    def close(self):
+        if not self.closing:
+            self.closing = True
+            self.network.unbind(self)
+            self.loop.call_soon(self.protocol.connection_lost, None)
+
+    def abort(self):
+        self.close()
+
+
+class VirtualNetwork:
+    """Address -> transport map delivering datagrams on the next loop iteration (the channel adds the delay)."""
+
+    def __init__(self):
+        self.transports = {}  # (ip, port) -> VirtualDatagramTransport
+        self.ephemeral = itertools.count(49152)
+
+    def bind(self, loop, protocol, address):
+        ip, port = address[:2]
+        if port == 0:
+            port = next(port for port in self.ephemeral if (ip, port) not in self.transports)
+        if (ip, port) in self.transports:
+            raise OSError(errno.EADDRINUSE, f"{ip}:{port} already in use")
+        transport = self.transports[(ip, port)] = VirtualDatagramTransport(self, loop, protocol, (ip, port))
+        return transport
+
+    def unbind(self, transport):
+        if self.transports.get(transport.address) is transport:
+            del self.transports[transport.address]
+
+    def send(self, source, data, destination):
+        transport = self.transports.get((destination[0], destination[1])) or \
+            self.transports.get(("0.0.0.0", destination[1]))
+        if transport is None:
+            metrics.inc("sim_unreachable")
+            return
+        metrics.inc("sim_delivered")
+        transport.loop.call_soon(transport.receive, data, source)
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """Selector that advances the clock by the loop's timeout instead of waiting for it."""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        ready = super().select(0)  # real descriptors (the loop's self-pipe) are still checked, without waiting
+        if ready:
+            return ready
+        if timeout is None:
+            return super().select(None)  # no timers left: only another thread can wake the loop
+        self.clock.advance(timeout)
+        return []
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """asyncio loop on a VirtualClock whose datagram endpoints live on a VirtualNetwork."""
+
+    def __init__(self, clock=None, network=None):
+        self.clock = clock or meup_clock.VirtualClock()
+        self.network = network or VirtualNetwork()
+        super().__init__(_VirtualSelector(self.clock))
+
+    def time(self):
+        return self.clock.monotonic()
+
+    async def create_datagram_endpoint(self, protocol_factory, local_addr=None, remote_addr=None, **kwargs):
+        if remote_addr is not None:
+            raise ValueError("VirtualEventLoop endpoints are unconnected: pass the address to sendto()")
+        protocol = protocol_factory()
+        transport = self.network.bind(self, protocol, local_addr or ("0.0.0.0", 0))
+        protocol.connection_made(transport)
+        return transport, protocol
+
+
+class _ReadingCounter:
+    """Stands in for Earth's TelemetryArchive: counts the readings that arrive."""
+
+    def __init__(self):
+        self.readings = Counter()  # reading type -> readings
+
+    def append(self, timestamp, reading_type, value, packet_id=0, src_port=0):
+        self.readings[reading_type] += 1
+
+
+def parse_commands(text):
+    """"60:FWD,75:LEFT" -> [(60.0, "FWD"), (75.0, "LEFT")], sorted by time (seconds into the run)."""
+    plan = []
+    for item in filter(None, text.split(",")):
+        at, command = item.split(":")
+        if command.upper() not in COMMANDS:
+            raise ValueError(f"unknown command {command!r}, expected one of {COMMANDS}")
+        plan.append((float(at), command.upper()))
+    return sorted(plan)
+
+
+async def run_topology(duration, commands=()):
+    """Earth, lunar and the lunar friend on the running loop for duration (virtual) seconds."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    archive = _ReadingCounter()
+    await open_server(EARTH_IP, EARTH_RECEIVE_PORT, "data", archive)
+    await open_server(LUNAR_FRIEND_IP, LUNAR_FRIEND_SCANNING_PORT, "scans")
+    earth_commands = await open_client(EARTH_IP, EARTH_COMMAND_PORT, LUNAR_IP, LUNAR_RECEIVE_PORT)
+    lunar = asyncio.ensure_future(run_lunar())
+
+    async def command_plan():
+        sent = []
+        for at, command in commands:
+            await asyncio.sleep(max(0.0, start + at - loop.time()))
+            sent.append(asyncio.ensure_future(earth_commands.send_command(command)))
+        return await asyncio.gather(*sent)
+
+    plan = asyncio.ensure_future(command_plan())
+    await asyncio.sleep(duration)
+    for task in (lunar, plan):
+        task.cancel()
+    await asyncio.gather(lunar, plan, return_exceptions=True)
+    return archive.readings
+
+
+def simulate(main, seed=SIMULATION_SEED):
+    """Run coroutine main to completion on a VirtualEventLoop, returns its result.
+
+        > installs a VirtualClock and a channel seeded with seed for the run, restores both afterwards
+    """
+    random.seed(seed)
+    clock = meup_clock.VirtualClock()
+    default_clock, default_channel = meup_clock.get_clock(), channel.get_channel()
+    meup_clock.set_clock(clock)
+    channel.set_channel(channel.open_channel(seed=seed))
+    loop = VirtualEventLoop(clock)
+    try:
+        return loop.run_until_complete(main)
+    finally:
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
+        meup_clock.set_clock(default_clock)
+        channel.set_channel(default_channel)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate Earth, lunar and the lunar friend on a virtual clock")
+    parser.add_argument("--hours", type=float, default=1, help="mission time to simulate")
+    parser.add_argument("--commands", default="", help="Earth command plan, e.g. 60:FWD,75:LEFT,80:STOP (seconds)")
+    parser.add_argument("--seed", type=int, default=SIMULATION_SEED)
+    parser.add_argument("--log-level", default="INFO", help="level for every subsystem (DEBUG traces each packet)")
+    parser.add_argument("-o", "--output", help="write the summary as JSON to this file")
+    args = parser.parse_args(argv)
+
+    for subsystem in meup_log.SUBSYSTEMS:
+        meup_log.set_level(subsystem, args.log_level)
+    duration = args.hours * 3600
+    started = time.perf_counter()
+    readings = simulate(run_topology(duration, parse_commands(args.commands)), args.seed)
+    elapsed = time.perf_counter() - started
+    meup_log.shutdown()
+    summary = {"seed": args.seed, "simulated_seconds": duration, "wall_seconds": elapsed,
+               "speedup": duration / elapsed, "readings": {str(kind): count for kind, count in sorted(readings.items())},
+               "counters": metrics.snapshot()["counters"]}
+    text = json.dumps(summary, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as stream:
+            stream.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
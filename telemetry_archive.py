@@ -0,0 +1,219 @@
+import os
+import mmap
+import glob
+import struct
+import threading
+from env_variables import ARCHIVE_SEGMENT_RECORDS, ARCHIVE_MAX_SEGMENTS, ARCHIVE_MAX_RUNS
+
+try:
+    import numpy as np  # required: records are read back as NumPy views of the mapped files
+except ImportError:
+    np = None
+
+# Telemetry archive on the Earth side
+#   > fixed-size records appended to memory-mapped segment files (segment_<n>.tlm), oldest deleted past max_segments
+#   > every segment header keeps its record count and time range -> sparse time index over segments
+#   > records are sorted by timestamp in place only before a query first exposes them, as new sorted runs of the
+#     segment: late retransmits are fine, and views already returned never see records move under them
+#   > past max_runs runs, and when it fills up, a segment is rewritten sorted into a new file that replaces it: views
+#     already returned keep the old (unlinked) mapping
+#   > query() returns NumPy views straight into the mapped files: no copies, no Python objects per reading
+
+RECORD_DTYPE = None if np is None else np.dtype({
+    "names": ["timestamp", "value", "packet_id", "src_port", "reading_type"],
+    "formats": ["<f8", "<f4", "<u2", "<u2", "u1"],
+    "offsets": [0, 8, 12, 14, 16],
+    "itemsize": 24,  # padded so float64 timestamps stay 8-byte aligned
+})
+
+SEGMENT_MAGIC = b"MEUPTLM1"
+SEGMENT_HEADER = struct.Struct('<8s I I Q d d B')  # magic, record size, capacity, count, min ts, max ts, sorted
+SEGMENT_HEADER_SIZE = 64
+
+
+class _Segment:
+    """One preallocated, memory-mapped segment file."""
+
+    def __init__(self, path, capacity=None, max_runs=ARCHIVE_MAX_RUNS):
+        create = not os.path.exists(path)
+        if create:
+            with open(path, "wb") as stream:
+                stream.truncate(SEGMENT_HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+        self.path = path
+        self.max_runs = max_runs
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        if create:
+            self.capacity, self.count = capacity, 0
+            self.min_ts, self.max_ts, self.sorted = float("inf"), float("-inf"), True
+            self.write_header()
+        else:
+            magic, record_size, self.capacity, self.count, self.min_ts, self.max_ts, is_sorted = \
+                SEGMENT_HEADER.unpack_from(self.map)
+            if magic != SEGMENT_MAGIC or record_size != RECORD_DTYPE.itemsize:
+                self.close()
+                raise ValueError(f"{path} is not a telemetry archive segment")
+            self.sorted = bool(is_sorted)
+        self.records = np.frombuffer(self.map, dtype=RECORD_DTYPE, count=self.capacity, offset=SEGMENT_HEADER_SIZE)
+        if not self.sorted:
+            # no view of this segment exists yet -> the one time it may be sorted as a whole
+            self.records[:self.count].sort(order="timestamp", kind="stable")
+            self.sorted = True
+            self.write_header()
+        self.exposed = self.count  # records [0, exposed) may be in returned views: never moved again
+        self.runs = [[0, self.count]] if self.count else []  # sorted [first, last) ranges of the exposed records
+
+    def write_header(self):
+        SEGMENT_HEADER.pack_into(self.map, 0, SEGMENT_MAGIC, RECORD_DTYPE.itemsize, self.capacity, self.count,
+                                 self.min_ts, self.max_ts, self.sorted)
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def append(self, timestamp, reading_type, value, packet_id, src_port):
+        if timestamp < self.max_ts:
+            self.sorted = False  # late arrival (e.g. a retransmit) -> sort before the next search
+        self.records[self.count] = (timestamp, value, packet_id, src_port, reading_type)
+        self.count += 1
+        self.min_ts = min(self.min_ts, timestamp)
+        self.max_ts = max(self.max_ts, timestamp)
+        self.write_header()  # count last, so a crash never exposes a half-written record
+
+    def expose(self):
+        """Sort the records appended since the last select (never seen by a caller) into a new sorted run.
+
+            > records already handed out are never moved, so earlier views keep their contents
+        """
+        if self.exposed == self.count:
+            return
+        tail = self.records[self.exposed:self.count]
+        tail.sort(order="timestamp", kind="stable")
+        if self.runs and self.records[self.runs[-1][1] - 1]["timestamp"] <= tail[0]["timestamp"]:
+            self.runs[-1][1] = self.count  # in-order appends just extend the last run
+        else:
+            self.runs.append([self.exposed, self.count])  # late arrivals start a new one
+        self.exposed = self.count
+        if len(self.runs) > self.max_runs:
+            self.compact()
+        elif len(self.runs) == 1 and not self.sorted:
+            self.sorted = True
+            self.write_header()
+
+    def compact(self):
+        """Merge the sorted runs into one by writing the records sorted to a new file that replaces this one."""
+        if len(self.runs) <= 1 or self.exposed != self.count:
+            return
+        records = np.sort(self.records[:self.count], order="timestamp", kind="stable")  # a copy
+        header = SEGMENT_HEADER.pack(SEGMENT_MAGIC, RECORD_DTYPE.itemsize, self.capacity, self.count,
+                                     self.min_ts, self.max_ts, True)
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "wb") as stream:
+                stream.write(header.ljust(SEGMENT_HEADER_SIZE, b"\0"))
+                stream.write(records.tobytes())
+                stream.truncate(SEGMENT_HEADER_SIZE + self.capacity * RECORD_DTYPE.itemsize)
+            os.replace(temp_path, self.path)
+        except OSError:
+            # e.g. the mapped file cannot be replaced on this platform -> keep the runs
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self.close()
+        self.file = open(self.path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.records = np.frombuffer(self.map, dtype=RECORD_DTYPE, count=self.capacity, offset=SEGMENT_HEADER_SIZE)
+        self.sorted = True
+        self.runs = [[0, self.count]]
+
+    def select(self, start, end):
+        """Views of the records with start <= timestamp < end, one per sorted run."""
+        self.expose()
+        views = []
+        for first, last in self.runs:
+            run = self.records[first:last]
+            timestamps = run["timestamp"]
+            view = run[np.searchsorted(timestamps, start, "left"):np.searchsorted(timestamps, end, "left")]
+            if len(view):
+                views.append(view)
+        return views
+
+    def close(self):
+        self.records = None
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # a caller still holds a view; the mapping is released with it
+        self.file.close()
+
+
+class TelemetryArchive:
+    """Append-only telemetry store: append() per reading, query(start, end) -> zero-copy NumPy views."""
+
+    def __init__(self, path, segment_records=ARCHIVE_SEGMENT_RECORDS, max_segments=ARCHIVE_MAX_SEGMENTS):
+        if np is None:
+            raise ImportError("TelemetryArchive needs numpy")
+        self.path = path
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.segments = [_Segment(segment_path) for segment_path in sorted(glob.glob(os.path.join(path, "segment_*.tlm")))]
+        self.next_number = self._number(self.segments[-1].path) + 1 if self.segments else 0
+        if not self.segments or self.segments[-1].is_full():
+            self._roll()
+
+    def __len__(self):
+        with self.lock:
+            return sum(segment.count for segment in self.segments)
+
+    @staticmethod
+    def _number(segment_path):
+        return int(os.path.basename(segment_path)[len("segment_"):-len(".tlm")])
+
+    def _roll(self):
+        """Open a new active segment, deleting the oldest ones past max_segments (ring)."""
+        self.segments.append(_Segment(os.path.join(self.path, f"segment_{self.next_number:06d}.tlm"),
+                                      self.segment_records))
+        self.next_number += 1
+        while self.max_segments and len(self.segments) > self.max_segments:
+            oldest = self.segments.pop(0)
+            oldest.close()
+            os.remove(oldest.path)
+
+    def append(self, timestamp, reading_type, value, packet_id=0, src_port=0):
+        """Store one reading (timestamp in Unix seconds)."""
+        with self.lock:
+            segment = self.segments[-1]
+            segment.append(timestamp, reading_type, value, packet_id, src_port)
+            if segment.is_full():
+                segment.expose()
+                segment.compact()  # read-only from now on: one run for every later query
+                self._roll()
+
+    def query(self, start=float("-inf"), end=float("inf"), reading_type=None):
+        """Records with start <= timestamp < end, oldest segment first.
+
+            > returns a list of NumPy views, one per sorted run of each overlapping segment; each view is in
+              timestamp order, late arrivals make extra runs (np.concatenate copies them into one)
+            > the views stay valid and unchanged: records are never moved once returned
+            > reading_type filters with a boolean mask, which copies
+        """
+        with self.lock:
+            views = [view for segment in self.segments
+                     if segment.count and segment.max_ts >= start and segment.min_ts < end
+                     for view in segment.select(start, end)]
+        if reading_type is not None:
+            views = [view[view["reading_type"] == reading_type] for view in views]
+        return views
+
+    def flush(self):
+        """Write mapped pages back to disk."""
+        with self.lock:
+            for segment in self.segments:
+                segment.map.flush()
+
+    def close(self):
+        with self.lock:
+            for segment in self.segments:
+                segment.close()
+            self.segments = []
@@ -0,0 +1,61 @@
+import pytest
+from channel_simulation import TokenBucket, LinkBackpressure, RecordingChannel, ReplayChannel, flip_bits
+
+
+def test_burst_leaves_immediately():
+    bucket = TokenBucket(rate=100, burst=200, max_queue=4)
+    start = bucket.last_refill
+    assert bucket.reserve(200, now=start) == start
+    assert bucket.queue_depth(now=start) == 0
+
+
+def test_shaped_departures_queue_up():
+    bucket = TokenBucket(rate=100, burst=100, max_queue=4)
+    start = bucket.last_refill
+    bucket.reserve(100, now=start)
+    assert bucket.reserve(50, now=start) - start == pytest.approx(0.5)
+    assert bucket.reserve(50, now=start) - start == pytest.approx(1.0)
+    assert bucket.queue_depth(now=start) == 2
+    assert bucket.queue_depth(now=start + 0.75) == 1
+
+
+def test_full_queue_raises_backpressure():
+    bucket = TokenBucket(rate=100, burst=0, max_queue=2)
+    start = bucket.last_refill
+    bucket.reserve(100, now=start)
+    bucket.reserve(100, now=start)
+    with pytest.raises(LinkBackpressure) as error:
+        bucket.reserve(100, ("moon", 1), now=start)
+    assert error.value.retry_after == pytest.approx(1.0)
+    assert error.value.target_address == ("moon", 1)
+    assert bucket.reserve(100, now=start + 1.0) - start == pytest.approx(3.0)
+
+
+def test_link_queue_must_hold_a_datagram():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=100, burst=100, max_queue=0)
+
+
+def test_replay_hands_out_the_recorded_decisions(tmp_path):
+    path = str(tmp_path / "channel.trace")
+    recording = RecordingChannel(path, latency=1.28, jitter=0.1, loss=0.2, loss_factor=0.1, ber=0.01, seed=5,
+                                 bandwidth=None)
+    recorded = [recording.impair(bytes([n]) * (20 + n % 7)) for n in range(150)]
+    recorded += recording.impair_batch([b"\x00" * 40] * 50)
+    recording.close()
+    assert any(not decision.not_dropped for decision in recorded)
+    assert any(decision.corrupted for decision in recorded)
+
+    # different payloads, and batches where the recording sent one by one
+    replay = ReplayChannel(path, bandwidth=None)
+    payloads = [bytes([255 - n]) * (20 + n % 7) for n in range(150)] + [b"\xff" * 40] * 50
+    replayed = replay.impair_batch(payloads[:120]) + [replay.impair(data) for data in payloads[120:]]
+    for data, old, new in zip(payloads, recorded, replayed):
+        assert new.not_dropped == old.not_dropped
+        assert new.corrupted == old.corrupted
+        assert new.latency == old.latency
+        assert new.loss_probability == pytest.approx(old.loss_probability)
+        assert new.flipped_bits == old.flipped_bits
+        if new.not_dropped:
+            assert new.send_data == flip_bits(data, new.flipped_bits)
+    assert replay.replayed == 200 and replay.exhausted == 0
@@ -0,0 +1,39 @@
+from fec import FecEncoder, FecDecoder
+from lunar_packet import LunarPacket, LunarParityPacket
+
+
+def group(first_id=100, size=4):
+    frames = {first_id + i: LunarPacket(5202, 5101, first_id + i, 0, float(i)).build() for i in range(size)}
+    encoder = FecEncoder(5202, 5101, group_size=size)
+    parity = [encoder.add(packet_id, frame) for packet_id, frame in frames.items()]
+    assert parity[:-1] == [None] * (size - 1) and parity[-1] is not None
+    return frames, LunarParityPacket.parse(parity[-1])
+
+
+def test_rebuilds_one_lost_frame_after_parity():
+    frames, parity = group()
+    decoder = FecDecoder()
+    for packet_id in (100, 101, 103):
+        assert decoder.add_frame("rover", packet_id, frames[packet_id]) == []
+    assert decoder.add_parity("rover", parity) == [(102, frames[102])]
+
+
+def test_rebuilds_when_parity_arrives_first():
+    frames, parity = group()
+    decoder = FecDecoder()
+    assert decoder.add_parity("rover", parity) == []
+    decoder.add_frame("rover", 100, frames[100])
+    decoder.add_frame("rover", 101, frames[101])
+    assert decoder.add_frame("rover", 103, frames[103]) == [(102, frames[102])]
+
+
+def test_two_losses_are_not_recoverable():
+    frames, parity = group()
+    decoder = FecDecoder()
+    decoder.add_frame("rover", 100, frames[100])
+    decoder.add_frame("rover", 101, frames[101])
+    assert decoder.add_parity("rover", parity) == []
+
+
+def test_group_size_below_two_disables_fec():
+    assert FecEncoder(5202, 5101, group_size=0).add(1, b"frame") is None
@@ -0,0 +1,32 @@
+import queue
+import pytest
+from ground_station import _ReadingBatch
+from meup_metrics import Histogram, metrics
+
+
+def test_worker_batches_ship_histogram_and_gauge_changes():
+    metrics.set_gauge("ground_test_depth", 3)
+    results = queue.Queue()
+    batch = _ReadingBatch()
+    metrics.observe("rtt", 0.3, "ground-test:1")
+    batch.flush(results, 2)
+    index, readings, counters, histograms, gauges = results.get_nowait()
+    assert index == 2 and gauges["ground_test_depth"] == 3
+    assert histograms["rtt"]["ground-test:1"][1:3] == (1, 0.3)
+
+    metrics.observe("rtt", 0.05, "ground-test:1")
+    batch.flush(results, 2)
+    _, _, _, histograms, gauges = results.get_nowait()
+    counts, count, total, _ = histograms["rtt"]["ground-test:1"]
+    assert (sum(counts), count) == (1, 1) and total == pytest.approx(0.05)  # only the new sample
+    assert "ground_test_depth" not in gauges  # unchanged
+
+
+def test_histogram_merge_adds_samples():
+    mine, theirs = Histogram(), Histogram()
+    mine.observe(0.1)
+    theirs.observe(2.0)
+    theirs.observe(0.1)
+    mine.merge(*theirs.state())
+    assert mine.count == 3 and mine.max == 2.0
+    assert mine.snapshot()["buckets"] == {"0.1": 2, "2.0": 1}
@@ -0,0 +1,97 @@
+import pytest
+from lunar_packet import LunarPacket, LunarBatchPacket, LunarCompactPacket, LunarParityPacket, PACKET_SIZE, \
+    BATCH_MAX_OFFSET, CHECKSUM_OFFSET, frame_checksum, pack_system_status, unpack_system_status, np
+
+
+def corrupt(frame, index=12):
+    frame = bytearray(frame)
+    frame[index] ^= 0x01
+    return bytes(frame)
+
+
+def test_packet_round_trip():
+    packet = LunarPacket(5202, 5101, 42, 0, 21.5)
+    frame = packet.build()
+    assert len(frame) == PACKET_SIZE
+    parsed = LunarPacket.parse(frame)
+    assert parsed["packet_id"] == 42 and parsed["packet_type"] == 0 and parsed["data"] == 21.5
+    assert parsed["checksum"] == packet.checksum == frame_checksum(frame)
+
+
+def test_packet_checksum_matches_zeroed_frame():
+    frame = bytearray(LunarPacket(1, 2, 3, 1, 4.0).build())
+    checksum = int.from_bytes(frame[CHECKSUM_OFFSET:CHECKSUM_OFFSET + 2], "big")
+    frame[CHECKSUM_OFFSET:CHECKSUM_OFFSET + 2] = b"\0\0"
+    assert checksum == sum(frame) % 65536
+
+
+def test_packet_corruption_detected():
+    frame = LunarPacket(5202, 5101, 7, 0, -12.25).build()
+    assert LunarPacket.parse(corrupt(frame)) is None
+    assert LunarPacket.decode(corrupt(frame)) is None
+    assert LunarPacket.parse(frame[:-1]) is None
+
+
+def test_build_into_matches_build():
+    packet = LunarPacket(5202, 5101, 9, 1, 3.0)
+    buffer = bytearray(PACKET_SIZE + 5)
+    assert packet.build_into(buffer, 5) == PACKET_SIZE
+    assert bytes(buffer[5:]) == packet.build()
+
+
+def test_build_many_and_iter_decode():
+    packets = [LunarPacket(5202, 5101, i, i & 1, i * 1.5) for i in range(10)]
+    buffer = bytearray(LunarPacket.build_many(packets))
+    buffer[3 * PACKET_SIZE + 12] ^= 0x01
+    decoded = list(LunarPacket.iter_decode(buffer))
+    assert len(decoded) == 10 and decoded[3] is None
+    assert [p.packet_id for p in decoded if p is not None] == [i for i in range(10) if i != 3]
+
+
+@pytest.mark.skipif(np is None, reason="numpy not installed")
+def test_decode_many_valid_mask():
+    packets = [LunarPacket(5202, 5101, i, 0, float(i)) for i in range(4)]
+    buffer = bytearray(LunarPacket.build_many(packets))
+    buffer[PACKET_SIZE + 12] ^= 0x01
+    frames, valid = LunarPacket.decode_many(bytes(buffer))
+    assert valid.tolist() == [True, False, True, True]
+    assert frames["packet_id"].tolist() == [0, 1, 2, 3]
+
+
+def test_system_status_round_trip():
+    assert unpack_system_status(pack_system_status(87.3, -12.4)) == pytest.approx((87.3, -12.4))
+
+
+def test_batch_round_trip():
+    batch = LunarBatchPacket(5202, 5101, 5, timestamp=1000)
+    batch.add_reading(0, 20.5, 1003)
+    batch.add_reading(1, pack_system_status(50, 20), 1006)
+    frame = batch.build()
+    parsed = LunarBatchPacket.parse(frame)
+    assert parsed["readings"] == [(0, 1003, 20.5), (1, 1006, pack_system_status(50, 20))]
+    assert parsed["checksum"] == frame_checksum(frame)
+    assert LunarBatchPacket.parse(corrupt(frame, 20)) is None
+
+
+def test_batch_refuses_readings_past_its_offset_range():
+    batch = LunarBatchPacket(5202, 5101, 5, timestamp=1000)
+    batch.add_reading(0, 20.5, 1000 + BATCH_MAX_OFFSET)
+    assert not batch.covers(1001 + BATCH_MAX_OFFSET)
+    with pytest.raises(ValueError):
+        batch.add_reading(0, 20.5, 1001 + BATCH_MAX_OFFSET)
+    assert LunarBatchPacket.parse(batch.build())["readings"] == [(0, 1000 + BATCH_MAX_OFFSET, 20.5)]
+
+
+def test_compact_round_trip():
+    compact = LunarCompactPacket(5202, 5101, 6, timestamp=1000.0)
+    for i, value in enumerate((20.0, 20.25, 19.5, -3.75)):
+        assert compact.add_reading(0, value, 1000.0 + i * 3)
+    parsed = LunarCompactPacket.parse(compact.build())
+    assert parsed["readings"] == compact.readings
+    assert LunarCompactPacket.parse(corrupt(compact.build(), 8)) is None
+
+
+def test_parity_round_trip():
+    frames = [LunarPacket(5202, 5101, i, 0, float(i)).build() for i in range(3)]
+    parsed = LunarParityPacket.parse(LunarParityPacket(5202, 5101, 0, frames).build())
+    assert parsed["packet_id"] == 0 and parsed["count"] == 3
@@ -0,0 +1,83 @@
+import asyncio
+import meup_clock
+import channel_simulation as channel
+from MEUP_async import MEUP_async_client, MEUP_async_server
+from meup_commands import encode_command, parse_ack
+from simulation import VirtualEventLoop
+from env_variables import MAX_RETRIES, EARTH_IP
+
+
+def run_virtual(coroutine):
+    clock = meup_clock.VirtualClock()
+    default_clock = meup_clock.get_clock()
+    meup_clock.set_clock(clock)
+    loop = VirtualEventLoop(clock)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+        meup_clock.set_clock(default_clock)
+
+
+def test_backpressure_does_not_use_up_attempts():
+    client = MEUP_async_client()
+    sends = []
+
+    def transmit():
+        sends.append(meup_clock.monotonic())
+        return 0.5 if len(sends) <= 3 else None  # link full for the first three tries
+
+    acked = run_virtual(client.send_reliable(1, ("moon", 1), asyncio.Semaphore(1), transmit))
+    assert acked is False
+    assert len(sends) == 3 + MAX_RETRIES
+    assert sends[1] - sends[0] == 0.5
+
+
+def test_ack_after_backpressure_is_sampled():
+    client = MEUP_async_client()
+    address = ("moon", 1)
+    sends = []
+
+    def transmit():
+        sends.append(meup_clock.monotonic())
+        if len(sends) == 1:
+            return 0.25
+        asyncio.get_running_loop().call_later(0.1, client.in_flight[1].set_result, True)
+
+    assert run_virtual(client.send_reliable(1, address, asyncio.Semaphore(1), transmit)) is True
+    assert abs(client.rtt.srtt(address) - 0.1) < 1e-9
+
+
+class RecordingTransport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr=None):
+        self.sent.append(data)
+
+    def is_closing(self):
+        return False
+
+
+def test_full_command_queue_still_acks_duplicates():
+    server = MEUP_async_server("commands")
+    server.transport = RecordingTransport()
+    server.commands.limit = 2
+    earth = (EARTH_IP, 5000)
+
+    async def deliver(*commands):
+        for seq, command in commands:
+            server.handle_command(encode_command(seq, command), earth)
+        await asyncio.sleep(1)
+        acks = [parse_ack(data)[0] for data in server.transport.sent]
+        server.transport.sent.clear()
+        return acks
+
+    default_channel = channel.get_channel()
+    channel.set_channel(channel.ChannelModel(latency=0, jitter=0, loss=0, ber=0, bandwidth=None))
+    try:
+        assert run_virtual(deliver((1, "FWD"), (2, "LEFT"), (3, "RIGHT"))) == [1, 2]  # 3 does not fit
+        assert run_virtual(deliver((1, "FWD"), (3, "RIGHT"))) == [1]  # lost ACK of 1 resent, 3 still refused
+    finally:
+        channel.set_channel(default_channel)
+    assert len(server.commands) == 2
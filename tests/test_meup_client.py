@@ -0,0 +1,108 @@
+import time
+import socket
+from MEUP_client import MEUP_client
+from lunar_packet import LunarPacket
+from rtt_estimator import RttTable
+from env_variables import WINDOW_SIZE
+
+
+class ScriptedSocket:
+    """Socket stand-in delivering one ACK at a fixed time."""
+
+    def __init__(self, ack, ack_at):
+        self.ack = ack
+        self.ack_at = ack_at
+        self.timeout = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def recvfrom(self, bufsize):
+        if self.ack is not None:
+            wait = self.ack_at - time.time()
+            if wait <= 0:
+                ack, self.ack = self.ack, None
+                return ack, ("earth", 1)
+            time.sleep(min(wait, self.timeout))
+            if time.time() >= self.ack_at:
+                return self.recvfrom(bufsize)
+        else:
+            time.sleep(self.timeout)
+        raise socket.timeout("timed out")
+
+    def close(self):
+        pass
+
+
+class BackpressuredClient(MEUP_client):
+    """First send goes out, every resend is refused by the link."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sends = 0
+
+    def send_packet(self, packet, address, sock=None):
+        self.sends += 1
+        return None if self.sends == 1 else 0.05
+
+
+def test_late_ack_after_refused_resend_samples_the_real_rtt():
+    start = time.time()
+    sock = ScriptedSocket(b"7", start + 0.12)
+    client = BackpressuredClient(sock=sock)
+    client.rtt = RttTable(initial_rto=0.05)
+    client.set_fec(("earth", 1), 0)
+    acked = client.send_window([LunarPacket(5202, 5101, 7, 0, 1.0)], ("earth", 1))
+    assert acked == {7}
+    assert client.sends >= 2
+    assert client.rtt.srtt(("earth", 1)) >= 0.11  # from the first (only) transmission, not the refused resend
+
+
+class AckSocket:
+    """Socket stand-in handing out queued ACKs, timing out when there are none."""
+
+    def __init__(self):
+        self.acks = []
+        self.timeout = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def recvfrom(self, bufsize):
+        if self.acks:
+            return self.acks.pop(0), ("earth", 1)
+        time.sleep(self.timeout)
+        raise socket.timeout("timed out")
+
+    def close(self):
+        pass
+
+
+class LossyClient(MEUP_client):
+    """ACKs every send at once, except the first transmission of the packets in `lose`."""
+
+    def __init__(self, lose, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lose = set(lose)
+        self.sent = []
+
+    def send_packet(self, packet, address, sock=None):
+        self.sent.append(packet.packet_id)
+        if packet.packet_id in self.lose:
+            self.lose.discard(packet.packet_id)
+        else:
+            self.UDP_SOCKET.acks.append(str(packet.packet_id).encode())
+        return None
+
+
+def test_send_window_only_resends_the_lost_packet():
+    client = LossyClient({2}, sock=AckSocket())
+    client.rtt = RttTable(initial_rto=0.05)
+    client.set_fec(("earth", 1), 0)
+    ids = list(range(WINDOW_SIZE + 4))
+    acked = client.send_window([LunarPacket(5202, 5101, packet_id, 0, 1.0) for packet_id in ids], ("earth", 1))
+    assert acked == set(ids)
+    assert client.sent[:WINDOW_SIZE] == ids[:WINDOW_SIZE]  # a full window leaves before any ACK is read
+    assert client.sent.count(2) == 2
+    assert sorted(client.sent) == sorted(ids + [2])
+    assert client.sent.index(2, 3) > client.sent.index(WINDOW_SIZE)  # the window moved on while 2 was missing
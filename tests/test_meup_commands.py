@@ -0,0 +1,84 @@
+import itertools
+import pytest
+import meup_clock
+from meup_commands import CommandSender
+from meup_metrics import metrics
+from rtt_estimator import RttTable
+
+
+class StubClient:
+    """What CommandSender needs of a MEUP_client; no socket, so its receive thread exits at once."""
+
+    def __init__(self):
+        self.UDP_SOCKET = None
+        self.server_ip, self.server_port = "moon", 1
+        self.rtt = RttTable(initial_rto=1.0)
+        self.ids = itertools.count(100)
+
+    def next_packet_id(self):
+        return next(self.ids)
+
+
+class RecordingSender(CommandSender):
+    def __init__(self, *args, **kwargs):
+        self.sent = []
+        self.refuse = False  # link pushing back
+        super().__init__(StubClient(), *args, **kwargs)
+        self.thread.join()
+
+    def _transmit(self, seq, command):
+        if self.refuse:
+            return False
+        self.sent.append(seq)
+        return True
+
+
+@pytest.fixture
+def clock():
+    default_clock = meup_clock.get_clock()
+    yield meup_clock.set_clock(meup_clock.VirtualClock())
+    meup_clock.set_clock(default_clock)
+
+
+def test_window_limits_commands_in_flight(clock):
+    sender = RecordingSender(window=2)
+    futures = sender.submit_plan(["FWD", "LEFT", "RIGHT"])
+    assert sender.sent == [100, 101]
+    sender._acked(100, "FWD")
+    assert futures[0].result(0) is True
+    assert sender.sent == [100, 101, 102]
+    assert sender.outstanding() == 2
+
+
+def test_karn_only_samples_first_transmissions(clock):
+    sender = RecordingSender()
+    sender.submit("FWD")
+    clock.advance(0.4)
+    sender._acked(100, "FWD")
+    assert sender.client.rtt.srtt(("moon", 1)) == 0.4
+    sender.submit("LEFT")
+    clock.advance(sender.client.rtt.rto(("moon", 1)))
+    with sender.lock:
+        sender._expire()  # resend
+    clock.advance(0.1)
+    sender._acked(101, "LEFT")
+    assert sender.sent == [100, 101, 101]
+    assert sender.client.rtt.srtt(("moon", 1)) == 0.4  # ambiguous ACK of a resent command: no sample
+
+
+def test_refused_resends_count_one_timeout(clock):
+    sender = RecordingSender()
+    sender.submit("FWD")
+    clock.advance(1.0)
+    before = metrics.counter("ack_timeouts")
+    sender.refuse = True
+    for _ in range(5):
+        with sender.lock:
+            sender._expire()
+        clock.advance(0.01)
+    assert metrics.counter("ack_timeouts") == before
+    sender.refuse = False
+    with sender.lock:
+        sender._expire()
+    assert metrics.counter("ack_timeouts") == before + 1
+    assert sender.sent == [100, 100]
@@ -0,0 +1,17 @@
+import socket
+from MEUP_endpoint import MEUP_endpoint
+
+
+def test_closed_peer_stream_still_sends_delayed_datagrams():
+    endpoint = MEUP_endpoint("127.0.0.1", 0)
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(2)
+    try:
+        peer = endpoint.open_peer(receiver.getsockname())
+        peer.close()  # e.g. the trade finished while a reply was still in the channel
+        assert peer.sendto(b"late reply", receiver.getsockname()) == len(b"late reply")
+        assert receiver.recvfrom(64)[0] == b"late reply"
+    finally:
+        receiver.close()
+        endpoint.UDP_SOCKET.close()
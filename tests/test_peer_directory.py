@@ -0,0 +1,30 @@
+import pytest
+import meup_clock
+from peer_directory import PeerDirectory
+
+
+@pytest.fixture
+def clock():
+    default_clock = meup_clock.get_clock()
+    yield meup_clock.set_clock(meup_clock.VirtualClock())
+    meup_clock.set_clock(default_clock)
+
+
+def test_ttls_follow_the_monotonic_clock(clock):
+    directory = PeerDirectory(ttl=300, dead_ttl=90, trade_ttl=300)
+    live, dead = ("10.0.0.1", 5302), ("10.0.0.2", 5302)
+    directory.record_probe(live, True, rtt=0.2)
+    directory.record_probe(dead, False)
+    assert directory.stale([live, dead]) == []
+    clock.advance(90)
+    assert directory.stale([live, dead]) == [dead]
+    clock.advance(210)
+    assert directory.stale([live, dead]) == [live, dead]
+
+
+def test_trade_answer_without_a_probe_is_still_probed(clock):
+    directory = PeerDirectory()
+    peer = ("10.0.0.1", 5302)
+    directory.record_trade(peer, True)
+    assert directory.stale([peer]) == [peer]
+    assert directory.needs_trade_decision([peer]) == []
@@ -0,0 +1,38 @@
+from rover_executor import CommandQueue
+
+
+def drain(queue):
+    taken = []
+    while True:
+        entry, _ = queue.get()
+        if entry is None:
+            return taken
+        taken.append(entry[:2])
+
+
+def test_commands_run_in_sequence_order():
+    queue = CommandQueue(settle=0)
+    earth = ("127.0.0.1", 5102)
+    for seq, command in ((11, "LEFT"), (10, "FWD"), (12, "RIGHT")):
+        queue.put(seq, command, earth)
+    assert drain(queue) == [(10, "FWD"), (11, "LEFT"), (12, "RIGHT")]
+
+
+def test_stop_cancels_queued_commands():
+    queue = CommandQueue(settle=0)
+    earth = ("127.0.0.1", 5102)
+    queue.put(10, "FWD", earth)
+    assert queue.put(11, "STOP", earth) == [(10, "FWD", earth)]
+    assert queue.put(9, "BACK", earth) == [(9, "BACK", earth)]  # sent before the STOP, arrived after it
+
+
+def test_restarted_sender_on_the_same_address():
+    queue = CommandQueue(settle=0)
+    earth = ("127.0.0.1", 5102)
+    queue.put(40000, "FWD", earth)
+    queue.put(40001, "STOP", earth)
+    drain(queue)
+    # Earth restarted: new random first seq far behind the old STOP
+    assert queue.put(30000, "LEFT", earth) == []
+    assert queue.put(30001, "RIGHT", earth) == []
+    assert drain(queue) == [(30000, "LEFT"), (30001, "RIGHT")]
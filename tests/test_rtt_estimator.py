@@ -0,0 +1,38 @@
+import pytest
+from rtt_estimator import RttEstimator, RttTable, RTT_ALPHA, RTT_BETA, RTT_K
+from env_variables import RTO_MIN, RTO_MAX
+
+
+def test_first_sample():
+    estimator = RttEstimator(initial_rto=5)
+    rto = estimator.sample(1.0)
+    assert estimator.srtt == 1.0 and estimator.rttvar == 0.5
+    assert rto == pytest.approx(1.0 + RTT_K * 0.5)
+
+
+def test_smoothing_follows_rfc_6298():
+    estimator = RttEstimator()
+    estimator.sample(1.0)
+    estimator.sample(2.0)
+    rttvar = (1 - RTT_BETA) * 0.5 + RTT_BETA * 1.0
+    srtt = (1 - RTT_ALPHA) * 1.0 + RTT_ALPHA * 2.0
+    assert estimator.rttvar == pytest.approx(rttvar)
+    assert estimator.srtt == pytest.approx(srtt)
+    assert estimator.rto == pytest.approx(srtt + RTT_K * rttvar)
+
+
+def test_rto_bounds_and_backoff():
+    estimator = RttEstimator()
+    assert estimator.sample(0.001) == RTO_MIN
+    assert estimator.backoff() == 2 * RTO_MIN
+    for _ in range(20):
+        estimator.backoff()
+    assert estimator.rto == RTO_MAX
+
+
+def test_table_per_destination():
+    table = RttTable(initial_rto=3, max_destinations=2)
+    table.sample(("a", 1), 1.0)
+    assert table.rto(("b", 1)) == 3
+    table.rto(("c", 1))
+    assert table.srtt(("a", 1)) is None  # least recently used destination evicted
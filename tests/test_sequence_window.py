@@ -0,0 +1,81 @@
+from sequence_window import DuplicateWindow, DuplicateFilter, SEQUENCE_MODULO, seq_diff, seq_next
+
+
+def test_seq_arithmetic_wraps():
+    assert seq_next(SEQUENCE_MODULO - 1) == 0
+    assert seq_diff(2, SEQUENCE_MODULO - 3) == 5
+    assert seq_diff(SEQUENCE_MODULO - 3, 2) == -5
+
+
+def test_duplicates_and_reordering():
+    window = DuplicateWindow(64)
+    assert [window.check_and_mark(seq) for seq in (10, 12, 11, 12, 10, 13)] == [True, True, True, False, False, True]
+
+
+def test_window_across_wraparound():
+    window = DuplicateWindow(64)
+    ids = [(SEQUENCE_MODULO - 5 + i) % SEQUENCE_MODULO for i in range(10)]
+    assert all(window.check_and_mark(seq) for seq in ids)
+    assert not any(window.check_and_mark(seq) for seq in ids)
+    assert window.check_and_mark(5)
+
+
+def test_far_behind_the_window_is_not_accepted():
+    window = DuplicateWindow(64)
+    window.check_and_mark(1000)
+    assert window.check_and_mark(1000 - 64) is None
+    assert window.check_and_mark(1000 - 64) is None
+    assert not window.check_and_mark(1000)
+
+
+def test_filter_keeps_streams_apart():
+    duplicates = DuplicateFilter(window=64)
+    assert duplicates.is_new(("a", 1), 7)
+    assert duplicates.is_new(("b", 1), 7)
+    assert not duplicates.is_new(("a", 1), 7)
+
+
+def test_sender_restart_behind_the_window():
+    duplicates = DuplicateFilter(window=1024)
+    stream = (("127.0.0.1", 5202), 5202)
+    assert all(duplicates.is_new(stream, seq) for seq in range(40000, 40010))
+    # restarted rover: new random first ID far behind the old run, recognised on its third ID
+    assert [duplicates.is_new(stream, seq) for seq in range(30000, 30005)] == [None, None, True, True, True]
+    # the first two were not ACKed -> their resends are new now, every other ID a duplicate
+    assert [duplicates.is_new(stream, seq) for seq in range(30000, 30005)] == [True, True, False, False, False]
+
+
+def test_straggler_does_not_reset_the_window():
+    window = DuplicateWindow(1024)
+    for seq in range(5000, 5100):
+        window.check_and_mark(seq)
+    assert window.check_and_mark(3000) is None  # late straggler
+    assert window.check_and_mark(5100)
+    assert window.check_and_mark(5095) is False
+    assert window.check_and_mark(5099) is False
+    assert window.check_and_mark(3000) is None
+
+
+def test_stragglers_between_live_packets_never_make_a_run():
+    window = DuplicateWindow(64)
+    window.check_and_mark(1000)
+    for seq in range(500, 510):
+        assert window.check_and_mark(seq) is None
+        assert window.check_and_mark(1001 + seq - 500)
+
+
+def test_seen_matches_check_and_mark_behind_the_window():
+    window = DuplicateWindow(64)
+    window.check_and_mark(1000)
+    assert window.seen(500) is None
+    window.check_and_mark(500)
+    window.check_and_mark(501)
+    assert window.seen(502) is False  # would complete the restart run
+    assert window.check_and_mark(502) and window.highest == 502
+
+
+def test_seen_does_not_mark():
+    window = DuplicateWindow(64)
+    window.check_and_mark(10)
+    assert window.seen(10) and not window.seen(11)
+    assert window.check_and_mark(11) and window.seen(11)
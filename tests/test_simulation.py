@@ -0,0 +1,12 @@
+from simulation import simulate, run_topology, parse_commands
+
+
+def test_same_seed_same_run():
+    plan = parse_commands("60:FWD,75:LEFT,80:STOP")
+    first = simulate(run_topology(900, plan), seed=7)
+    second = simulate(run_topology(900, plan), seed=7)
+    assert first and first == second
+
+
+def test_parse_commands_sorts_by_time():
+    assert parse_commands("75:left,60:FWD") == [(60.0, "FWD"), (75.0, "LEFT")]
@@ -0,0 +1,73 @@
+import pytest
+from telemetry_archive import TelemetryArchive, np
+
+pytestmark = pytest.mark.skipif(np is None, reason="numpy not installed")
+
+
+def timestamps(views):
+    return [float(t) for view in views for t in view["timestamp"]]
+
+
+def test_query_time_range(tmp_path):
+    archive = TelemetryArchive(str(tmp_path), segment_records=4)
+    for second in range(10):
+        archive.append(100.0 + second, 0, float(second))
+    assert timestamps(archive.query(103, 107)) == [103.0, 104.0, 105.0, 106.0]
+    assert len(archive) == 10
+    archive.close()
+
+
+def test_late_arrival_does_not_move_returned_views(tmp_path):
+    archive = TelemetryArchive(str(tmp_path), segment_records=64)
+    for second in (100.0, 101.0, 103.0):
+        archive.append(second, 0, second)
+    before = archive.query()
+    archive.append(102.0, 0, 102.0)  # late retransmit
+    archive.append(104.0, 0, 104.0)
+    assert timestamps(before) == [100.0, 101.0, 103.0]
+    after = archive.query(101, 104)
+    assert sorted(timestamps(after)) == [101.0, 102.0, 103.0]
+    assert all(list(view["timestamp"]) == sorted(view["timestamp"]) for view in after)
+    assert timestamps(before) == [100.0, 101.0, 103.0]
+    archive.close()
+
+
+def test_reopened_archive_is_sorted(tmp_path):
+    archive = TelemetryArchive(str(tmp_path), segment_records=64)
+    for second in (100.0, 103.0, 101.0, 102.0):
+        archive.append(second, 0, second)
+    archive.close()
+    archive = TelemetryArchive(str(tmp_path), segment_records=64)
+    views = archive.query()
+    assert len(views) == 1 and timestamps(views) == [100.0, 101.0, 102.0, 103.0]
+    archive.close()
+
+
+def test_interleaved_rovers_keep_few_runs(tmp_path):
+    archive = TelemetryArchive(str(tmp_path), segment_records=4096)
+    archive.segments[-1].max_runs = 4
+    first = None
+    for cycle in range(20):
+        for rover in range(3):  # each rover's batch arrives after the others' newer readings, queried in between
+            for second in range(10):
+                archive.append(1000.0 + cycle * 10 + second + rover * 0.1, rover, float(rover))
+            views = archive.query()
+            first = first if first is not None else (views, timestamps(views))
+            assert len(views) <= 4
+            assert all(list(view["timestamp"]) == sorted(view["timestamp"]) for view in views)
+            assert len(timestamps(views)) == cycle * 30 + (rover + 1) * 10
+    assert len(first[0]) == 1 and timestamps(first[0]) == first[1]  # rewritten segment: earlier views unchanged
+    archive.close()
+
+
+def test_full_segment_is_compacted_to_one_run(tmp_path):
+    archive = TelemetryArchive(str(tmp_path), segment_records=8)
+    for second in (5.0, 1.0, 6.0):
+        archive.append(second, 0, second)
+    archive.query()
+    for second in (2.0, 7.0, 3.0, 8.0, 4.0):
+        archive.append(second, 0, second)
+    full = archive.segments[0]
+    assert full.is_full() and len(full.runs) == 1
+    assert timestamps(archive.query()) == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0]
+    archive.close()